@@ -0,0 +1,52 @@
+"""
+Memory and time needed to turn dataset_lumis rows into dictionaries or records
+
+python -m benchmarks.records
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.server import dataset_lumis_row
+from runregistry.tracker.queries import DATASET_LUMIS_KEYS, DatasetLumis
+from runregistry.utilities import list_to_dict, list_to_records
+
+
+def build_rows(number_of_rows):
+    return [dataset_lumis_row(index) for index in range(number_of_rows)]
+
+
+def measure(convert, rows):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = convert(rows)
+    duration = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return duration, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", type=int, default=200000, help="number of rows")
+    args = parser.parse_args()
+
+    rows = build_rows(args.n)
+    candidates = [
+        ("list_to_dict", lambda items: list_to_dict(items, DATASET_LUMIS_KEYS)),
+        ("list_to_records", lambda items: list_to_records(items, DatasetLumis)),
+    ]
+
+    print("{} rows with {} keys".format(args.n, len(DATASET_LUMIS_KEYS)))
+    for name, convert in candidates:
+        duration, size = measure(convert, rows)
+        print(
+            "{:<16} {:8.3f} s {:10.1f} MiB {:8.0f} bytes/row".format(
+                name, duration, size / 2 ** 20, size / args.n
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
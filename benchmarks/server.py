@@ -0,0 +1,236 @@
+"""
+Local stand-in for the resthub service of the Run Registry
+
+Implements the resources used by the clients with generated rows:
+POST /query, GET /query/{qid}/count, /query/{qid}/data and
+/query/{qid}/page/{rows}/{page}/data, as JSON or text/csv.
+
+python -m benchmarks.server --rows 100000 --latency 0.05
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse
+
+PAGE_PATTERN = re.compile(r"^/query/(\w+)/page/(\d+)/(\d+)/data$")
+DATA_PATTERN = re.compile(r"^/query/(\w+)/data$")
+COUNT_PATTERN = re.compile(r"^/query/(\w+)/count$")
+
+
+def dataset_lumis_row(index):
+    return [
+        320000 + index // 20,
+        7000 + index // 200,
+        "/PromptReco/Collisions2018A/DQM",
+        index % 20 * 50 + 1,
+        index % 20 * 50 + 50,
+        50,
+        True,
+        True,
+        True,
+        True,
+        True,
+        True,
+        True,
+        True,
+        True,
+        index % 7 != 0,
+        True,
+    ]
+
+
+def dataset_runs_row(index):
+    return [
+        320000 + index,
+        "Collisions18",
+        "/PromptReco/Collisions2018A/DQM",
+        "COMPLETED",
+        "shifter",
+        "GOOD",
+        "GOOD",
+        "GOOD",
+        "LOW_STATS" if index % 5 == 0 else None,
+        None,
+        None,
+    ]
+
+
+def active_lumi_runs_row(index):
+    row = dataset_runs_row(index)
+    return row[:3] + [1000] + row[3:]
+
+
+def fill_numbers_row(index):
+    return [320000 + index, 7000 + index // 10]
+
+
+def generic_row(index, payload_size=16):
+    return [index, "x" * payload_size]
+
+
+def row_factory(query, payload_size=16):
+    """
+    :param query: SQL query string
+    :param payload_size: size of the text column of generic rows
+    :return: function building the row with the given index for the query
+    """
+    if "sum(l.rdr_section_count)" in query:
+        return active_lumi_runs_row
+    if "runreg_tracker.dataset_lumis" in query:
+        return dataset_lumis_row
+    if "runreg_tracker.datasets" in query:
+        return dataset_runs_row
+    if "r.lhcfill" in query and "runreg_tracker.runs" in query:
+        return fill_numbers_row
+    return lambda index: generic_row(index, payload_size)
+
+
+class FakeResthub(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTP server answering every registered query with generated rows
+
+    Example:
+    >>> from runregistry.client import RunRegistryClient
+    >>> with FakeResthub(rows=3) as server:
+    ...     client = RunRegistryClient(server.url)
+    ...     client.execute_query("select r.runnumber from runreg_tracker.runs r")
+    {'data': [[0, 'xxxxxxxxxxxxxxxx'], [1, 'xxxxxxxxxxxxxxxx'], [2, 'xxxxxxxxxxxxxxxx']]}
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, rows=1000, latency=0.0, payload_size=16, port=0, max_page_size=50000
+    ):
+        """
+        :param rows: amount of rows of every query, or function of the query
+        :param latency: delay of every response in seconds
+        :param payload_size: size of the text column of generic rows
+        :param port: port to listen on, any free port by default
+        :param max_page_size: larger pages are answered with a server error
+        """
+        self.rows = rows
+        self.latency = latency
+        self.payload_size = payload_size
+        self.max_page_size = max_page_size
+        self.queries = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        super().__init__(("127.0.0.1", port), FakeResthubHandler)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def register(self, query):
+        query_id = hashlib.sha1(query.encode("utf-8")).hexdigest()[:12]
+        with self._lock:
+            self.queries[query_id] = query
+        return query_id
+
+    def count(self, query):
+        return self.rows(query) if callable(self.rows) else self.rows
+
+    def generate(self, query, start, stop):
+        build_row = row_factory(query, self.payload_size)
+        return [
+            build_row(index) for index in range(start, min(stop, self.count(query)))
+        ]
+
+    def start(self):
+        thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class FakeResthubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, body, content_type="application/json", status=200):
+        with self.server._lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_rows(self, query, start, stop):
+        rows = self.server.generate(query, start, stop)
+        if "text/csv" in self.headers.get("Accept", ""):
+            text = io.StringIO()
+            writer = csv.writer(text, lineterminator="\n")
+            columns = len(rows[0]) if rows else 0
+            writer.writerow(["COLUMN_{}".format(index) for index in range(columns)])
+            writer.writerows(rows)
+            return self.send(text.getvalue(), "text/csv")
+        return self.send(json.dumps({"data": rows}))
+
+    def do_POST(self):
+        query = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        self.send(self.server.register(query), "text/plain")
+
+    def do_GET(self):
+        path = urlparse(self.path).path  # Query parameters do not change the rows
+        for pattern in [PAGE_PATTERN, DATA_PATTERN, COUNT_PATTERN]:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return self.send(json.dumps({"version": {"resthub": "fake"}}))
+
+        query = self.server.queries.get(match.group(1))
+        if query is None:
+            return self.send("Query not found", "text/plain", 404)
+        if pattern is COUNT_PATTERN:
+            return self.send(str(self.server.count(query)))
+        if pattern is DATA_PATTERN:
+            return self.send_rows(query, 0, self.server.count(query))
+        row_limit, page = int(match.group(2)), int(match.group(3))
+        if row_limit > self.server.max_page_size:
+            return self.send("Page size exceeds the limit", "text/plain", 500)
+        return self.send_rows(query, (page - 1) * row_limit, page * row_limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000, help="rows per query")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--payload", type=int, default=16, help="bytes per row")
+    parser.add_argument("--port", type=int, default=2113)
+    args = parser.parse_args()
+
+    server = FakeResthub(args.rows, args.latency, args.payload, args.port)
+    print("Serving on {}".format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
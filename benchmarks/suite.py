@@ -0,0 +1,162 @@
+"""
+Throughput and memory of the clients against a local fake resthub server
+
+python -m benchmarks.suite --rows 100000 --latency 0.01
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks.records import build_rows
+from benchmarks.server import FakeResthub, dataset_runs_row
+from runregistry.client import RunRegistryClient
+from runregistry.decoding import DECODERS
+from runregistry.paging import PageSizeController
+from runregistry.tracker.client import TrackerRunRegistryClient
+from runregistry.tracker.queries import DATASET_LUMIS_KEYS, DATASET_RUNS_KEYS
+from runregistry.tracker.utilities import transform_lowstat_to_boolean
+from runregistry.utilities import list_to_dict
+
+GENERIC_QUERY = "select r.runnumber, r.payload from runreg_global.runs r"
+
+
+class Result:
+    def __init__(self, name, seconds, rows, peak, requests):
+        self.name = name
+        self.seconds = seconds
+        self.rows = rows
+        self.peak = peak
+        self.requests = requests
+
+    def __str__(self):
+        return "{:<34} {:8.3f} s {:12.0f} rows/s {:9.1f} MiB {:6} requests".format(
+            self.name,
+            self.seconds,
+            self.rows / max(self.seconds, 1e-9),
+            self.peak / 2 ** 20,
+            self.requests,
+        )
+
+
+def measure(name, function, server=None, repeat=1):
+    """
+    Runs the function repeat times and keeps the fastest run
+
+    :param name: name of the benchmark
+    :param function: function without arguments returning the amount of rows
+    :param server: FakeResthub whose requests are counted
+    :param repeat: amount of runs
+    :return: Result
+    """
+    best = None
+    for _ in range(repeat):
+        requests = server.requests if server is not None else 0
+        tracemalloc.start()
+        start = time.perf_counter()
+        rows = function()
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        requests = server.requests - requests if server is not None else 0
+        if best is None or seconds < best.seconds:
+            best = Result(name, seconds, rows, peak, requests)
+    return best
+
+
+def client_benchmarks(server, rows, repeat):
+    client = RunRegistryClient(server.url)
+    adaptive = RunRegistryClient(server.url, client.transport)
+    adaptive.page_sizes = PageSizeController()
+    tracker = TrackerRunRegistryClient(server.url)
+    single_page = min(rows, client.row_limit)
+    run_numbers = list(range(320000, 320000 + rows // 20))
+
+    def execute_query(query, client=client):
+        client.query_ids.clear()
+        return len(client.execute_query(query)["data"])
+
+    def iter_query():
+        client.query_ids.clear()
+        return sum(1 for _ in client.iter_query(GENERIC_QUERY, read_ahead=8))
+
+    server.rows = lambda query: single_page if "where 1 = 1" in query else rows
+    benchmarks = [
+        (
+            "execute_query single page",
+            lambda: execute_query(GENERIC_QUERY + " where 1 = 1"),
+        ),
+        ("execute_query paged", lambda: execute_query(GENERIC_QUERY)),
+        (
+            "execute_query paged adaptive",
+            lambda: execute_query(GENERIC_QUERY, adaptive),
+        ),
+        ("iter_query paged", iter_query),
+        (
+            "get_lumi_sections_by_range",
+            lambda: len(tracker.get_lumi_sections_by_range(320000, 330000)),
+        ),
+        (
+            "get_lumi_sections_by_range compact",
+            lambda: len(
+                tracker.get_lumi_sections_by_range(320000, 330000, compact=True)
+            ),
+        ),
+        ("get_runs_by_list", lambda: len(tracker.get_runs_by_list(run_numbers))),
+        (
+            "get_active_lumi_runs_by_range",
+            lambda: len(tracker.get_active_lumi_runs_by_range(320000, 330000)),
+        ),
+    ]
+    for name, function in benchmarks:
+        yield measure(name, function, server, repeat)
+
+
+def local_benchmarks(rows, repeat):
+    lumis = build_rows(rows)
+    runs = [dataset_runs_row(index) for index in range(rows)]
+
+    def to_dict():
+        return len(list_to_dict(lumis, DATASET_LUMIS_KEYS))
+
+    page = json.dumps({"data": lumis[:1000]}).encode("utf-8")
+    number_of_pages = max(1, rows // 1000)
+    for name, decode in sorted(DECODERS.items()):
+
+        def decode_pages(decode=decode):
+            return sum(len(decode(page)["data"]) for _ in range(number_of_pages))
+
+        yield measure("decode pages ({})".format(name), decode_pages, repeat=repeat)
+
+    yield measure("list_to_dict", to_dict, repeat=repeat)
+    # Repeated runs transform the same dictionaries again, which is as much work
+    run_dicts = list_to_dict(runs, DATASET_RUNS_KEYS)
+    yield measure(
+        "transform_lowstat_to_boolean",
+        lambda: len(transform_lowstat_to_boolean(run_dicts)),
+        repeat=repeat,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000, help="rows per query")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--payload", type=int, default=16, help="bytes per row")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark")
+    args = parser.parse_args()
+
+    print(
+        "{} rows per query, {:.3f} s latency, {} bytes payload".format(
+            args.rows, args.latency, args.payload
+        )
+    )
+    with FakeResthub(args.rows, args.latency, args.payload) as server:
+        for result in client_benchmarks(server, args.rows, args.repeat):
+            print(result)
+    for result in local_benchmarks(args.rows, args.repeat):
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
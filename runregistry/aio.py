@@ -0,0 +1,255 @@
+"""
+Asynchronous RunRegistry Client
+
+Requires the optional aiohttp dependency:
+pip install python-runregistryclient[async]
+"""
+import asyncio
+import logging
+from math import ceil
+
+try:
+    import aiohttp
+
+    CONNECTION_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+except ImportError:  # pragma: no cover
+    aiohttp = None
+    CONNECTION_ERRORS = ()
+
+from runregistry.client import PageNotAvailable, QueryIdNotFound, RunRegistryClient
+from runregistry.decoding import get_decoder
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRunRegistryClient:
+    """
+    asyncio counterpart of the RunRegistryClient
+
+    All queries and pages of one client share a single aiohttp connection pool,
+    so that many of them can be in flight on the same event loop at once.
+
+    Example:
+    >>> async def main():
+    ...     async with AsyncRunRegistryClient() as client:
+    ...         return await client.execute_query(
+    ...             "select r.runnumber from runreg_global.runs r "
+    ...             "where r.run_class_name = 'Collisions15'"
+    ...             "and r.runnumber > 247070 and r.runnumber < 247081"
+    ...         )
+    >>> asyncio.new_event_loop().run_until_complete(main())
+    {'data': [[247073], [247076], [247077], [247078], [247079]]}
+    """
+
+    DEFAULT_URL = RunRegistryClient.DEFAULT_URL
+    ALTERNATIVE_URL = RunRegistryClient.ALTERNATIVE_URL
+
+    DEFAULT_NAMESPACE = RunRegistryClient.DEFAULT_NAMESPACE
+    DEFAULT_TABLE = RunRegistryClient.DEFAULT_TABLE
+
+    DEFAULT_POOL_SIZE = 100
+    DEFAULT_TIMEOUT = 300
+
+    def __init__(
+        self, url=DEFAULT_URL, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT
+    ):
+        """
+        :param url: url of the resthub service
+        :param pool_size: maximum number of simultaneously open connections
+        :param timeout: total timeout of a single request in seconds
+        """
+        self.url = url
+        self.row_limit = 1000
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session = None  # Lazy, has to be created within the event loop
+        self.decode_json = get_decoder()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_session(self):
+        if aiohttp is None:
+            raise ImportError("The asynchronous client requires aiohttp")
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Accept-Encoding": "gzip, deflate"},
+            )
+        return self._session
+
+    async def close(self):
+        """
+        Close the connection pool
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get_count(self, query_id):
+        """
+        :param query_id: query id
+        :return: amount of rows that the query_id contains
+        """
+        url = "{}/query/{}/count".format(self.url, query_id)
+        async with self._get_session().get(url) as response:
+            if response.status == 404:
+                raise QueryIdNotFound(query_id)
+            return await response.json(content_type=None)
+
+    async def _get_json_response(self, resource, media_type=None):
+        """
+        See RunRegistryClient._get_json_response
+
+        :param resource: requested resource
+        :param media_type: requested media type, JSON by default
+        :return: JSON dictionary or text in the media type,
+        empty dictionary if the request failed
+        """
+        session = self._get_session()
+        url = self.url + resource
+        try:
+            if media_type:
+                headers = {"Accept": media_type}
+                async with session.get(url, headers=headers) as response:
+                    text = (await response.read()).decode("utf-8")
+                    if response.status >= 400:
+                        logger.error("{} {}: {}".format(response.status, url, text))
+                        return {}
+                    return text
+
+            async with session.get(url) as response:
+                return self.decode_json(await response.read())
+        except CONNECTION_ERRORS as e:
+            logger.error("Connection to {} not possible: {}".format(self.url, e))
+            return {}
+        except ValueError as e:
+            logger.error(e)
+            return {}
+
+    async def _get_page(self, query_id, page):
+        """
+        GET: /query/{query_id}/page/{row_limit}/{page}/data
+
+        :param query_id: query id
+        :param page: page number, starting at 1
+        :return: list of rows contained in the page
+        :raises PageNotAvailable: if the response contains no rows
+        """
+        resource = "/query/{}/page/{}/{}/data".format(query_id, self.row_limit, page)
+        response = await self._get_json_response(resource)
+        if "data" not in response:
+            raise PageNotAvailable(query_id, page, self.row_limit)
+        return response["data"]
+
+    async def _get_paged_json_response(self, query_id, count=None):
+        """
+        Retrieves the response page-wise.
+
+        All pages are requested at once, the connection pool limits how many
+        of them are actually in flight.
+
+        :param query_id: query id
+        :param count: amount of rows, requested when not given
+        """
+        if count is None:
+            count = await self._get_count(query_id)
+        number_of_pages = int(ceil(count / self.row_limit))
+        pages = await asyncio.gather(
+            *[self._get_page(query_id, page) for page in range(1, number_of_pages + 1)]
+        )
+        return {"data": [row for rows in pages for row in rows]}
+
+    async def _get_query_id(self, query):
+        """
+        Converts a SQL query string into a query id (qid)
+
+        POST: /query
+
+        :param query: SQL query string
+        :return: query id
+        """
+        async with self._get_session().post(self.url + "/query?", data=query) as r:
+            text = await r.text()
+            if r.status == 400:
+                raise ValueError(text)
+            return text
+
+    async def execute_query(self, query, media_type=None):
+        """
+        Executes an arbitrary SQL query
+
+        See RunRegistryClient.execute_query
+
+        :param media_type: Desired media type, e.g. application/xml, text/json
+        :param query: SQL query string
+        :return: JSON dictionary, empty if the query failed
+        """
+        try:
+            return await self._execute_query(query, media_type)
+        except CONNECTION_ERRORS as e:
+            logger.error("Connection to {} not possible: {}".format(self.url, e))
+            return {}
+        except (PageNotAvailable, QueryIdNotFound) as e:
+            logger.error("{}: {}".format(e.__class__.__name__, e))
+            return {}
+
+    async def _execute_query(self, query, media_type=None):
+        """
+        Registers the query, again if the Run Registry does not know its query
+        id anymore, and retrieves its result
+        """
+        for attempt in range(2):
+            query_id = await self._get_query_id(query)
+            try:
+                count = await self._get_count(query_id)
+                break
+            except QueryIdNotFound:
+                if attempt:
+                    raise
+                logger.info("Query id {} is not known anymore".format(query_id))
+        if count > self.row_limit:
+            return await self._get_paged_json_response(query_id, count)
+        resource = "/query/" + query_id + "/data"
+        return await self._get_json_response(resource, media_type)
+
+    async def get_table_description(
+        self, namespace=DEFAULT_NAMESPACE, table=DEFAULT_TABLE
+    ):
+        """
+        Table description in JSON
+
+        :param namespace: runreg_{workspace}, e.g. runreg_tracker
+        :param table: runs, run_lumis, datasets, dataset_lumis
+        :return: json containing the table description
+        """
+        resource = "/table/{}/{}".format(namespace, table)
+        return await self._get_json_response(resource)
+
+    async def get_queries(self):
+        """
+        GET /queries/
+
+        :return: list of queries
+        """
+        return await self._get_json_response("/queries")
+
+    async def get_query_description(self, query_id):
+        """
+        GET /query/{query_id}
+
+        :return: json dictionary with query description
+        """
+        return await self._get_json_response("/query/{}".format(query_id))
+
+    async def get_info(self):
+        """
+        GET /info
+
+        :return json with general information about the service
+        """
+        return await self._get_json_response("/info")
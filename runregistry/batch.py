@@ -0,0 +1,164 @@
+"""
+Concurrent execution of many named queries
+"""
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from runregistry.output import Progress, stream_query
+
+NAME_COMMENT = re.compile(r"--\s*name:\s*(\S+)")
+
+
+class BatchQuery:
+    """
+    Named query of a batch and the outcome of its execution
+    """
+
+    def __init__(self, name, query):
+        self.name = name
+        self.query = query
+        self.path = None
+        self.rows = 0
+        self.seconds = 0.0
+        self.error = None
+
+    def __repr__(self):
+        return "BatchQuery(name={!r}, rows={}, seconds={:.2f}, error={!r})".format(
+            self.name, self.rows, self.seconds, self.error
+        )
+
+
+def _check_names(queries):
+    names = [query.name for query in queries]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError("Duplicate query names: {}".format(", ".join(duplicates)))
+    return queries
+
+
+def parse_sql_batch(text):
+    """
+    Splits SQL text into queries terminated by ";", optionally named by a
+    preceding "-- name: ..." comment
+
+    Example:
+    >>> text = "-- name: runs\\nselect r.runnumber\\nfrom runreg_tracker.runs r;\\nselect 1 from dual;"
+    >>> parse_sql_batch(text)
+    [BatchQuery(name='runs', rows=0, seconds=0.00, error=None), BatchQuery(name='query_2', rows=0, seconds=0.00, error=None)]
+    >>> parse_sql_batch(text)[0].query
+    'select r.runnumber from runreg_tracker.runs r'
+
+    :param text: SQL text
+    :return: list of BatchQuery
+    """
+    queries = []
+    name = None
+    lines = []
+    for line in text.splitlines() + [";"]:
+        line = line.strip()
+        match = NAME_COMMENT.match(line)
+        if match:
+            name = match.group(1)
+            continue
+        if not line or line.startswith("--"):
+            continue
+        lines.append(line)
+        if line.endswith(";"):
+            query = " ".join(lines)[:-1].strip()
+            if query:
+                name = name or "query_{}".format(len(queries) + 1)
+                queries.append(BatchQuery(name, query))
+            name = None
+            lines = []
+    return _check_names(queries)
+
+
+def parse_jsonl_batch(lines):
+    """
+    Example:
+    >>> parse_jsonl_batch(['{"name": "runs", "query": "select 1 from dual"}'])[0].query
+    'select 1 from dual'
+
+    :param lines: JSON lines containing name and query
+    :return: list of BatchQuery
+    """
+    queries = []
+    for line in lines:
+        if line.strip():
+            entry = json.loads(line)
+            name = entry.get("name") or "query_{}".format(len(queries) + 1)
+            queries.append(BatchQuery(name, entry["query"]))
+    return _check_names(queries)
+
+
+def file_name(name, output_format):
+    """
+    Example:
+    >>> file_name("runs 2018/A", "csv")
+    'runs_2018_A.csv'
+    """
+    return "{}.{}".format(re.sub(r"[^\w.-]", "_", name), output_format)
+
+
+def _execute(client, batch_query, output_format, directory, workers):
+    batch_query.path = os.path.join(
+        directory, file_name(batch_query.name, output_format)
+    )
+    progress = Progress(stream=None)
+    start = time.monotonic()
+    try:
+        with open(batch_query.path, "w", newline="") as output:
+            stream_query(
+                client, batch_query.query, output_format, output, workers, progress
+            )
+    except Exception as e:  # Reported in the summary, the other queries go on
+        batch_query.error = str(e) or e.__class__.__name__
+    batch_query.rows = progress.rows
+    batch_query.seconds = time.monotonic() - start
+    return batch_query
+
+
+def run_batch(
+    client, queries, output_format="csv", directory=".", parallel=4, workers=1
+):
+    """
+    Executes the queries concurrently over one client and writes each result
+    into its own file named after the query
+
+    :param client: RunRegistryClient
+    :param queries: list of BatchQuery
+    :param output_format: csv, jsonl or json
+    :param directory: output directory
+    :param parallel: amount of queries executed concurrently
+    :param workers: amount of pages downloaded concurrently per query
+    :return: list of BatchQuery with their outcome
+    """
+    os.makedirs(directory, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        futures = [
+            executor.submit(
+                _execute, client, batch_query, output_format, directory, workers
+            )
+            for batch_query in queries
+        ]
+        return [future.result() for future in futures]
+
+
+def summary(queries):
+    """
+    :param queries: executed BatchQuery list
+    :return: text table of rows, timings and failures
+    """
+    lines = ["{:<30} {:>10} {:>9}  {}".format("name", "rows", "seconds", "status")]
+    for query in queries:
+        lines.append(
+            "{:<30} {:>10} {:>9.2f}  {}".format(
+                query.name, query.rows, query.seconds, query.error or "ok"
+            )
+        )
+    failures = sum(query.error is not None for query in queries)
+    lines.append("{} queries, {} failed".format(len(queries), failures))
+    return "\n".join(lines)
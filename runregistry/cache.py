@@ -0,0 +1,180 @@
+"""
+Caches used by the Run Registry clients
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from runregistry.utilities import encode_parameters, normalize_query
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory cache holding at most maxsize entries
+
+    When the cache is full the least recently used entry is evicted.
+
+    Example:
+    >>> cache = LRUCache(maxsize=2)
+    >>> cache.set("a", 1)
+    >>> cache.set("b", 2)
+    >>> cache.get("a")
+    1
+    >>> cache.set("c", 3)
+    >>> "b" in cache
+    False
+    """
+
+    def __init__(self, maxsize=128):
+        """
+        :param maxsize: maximum number of cached entries
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        :param key: key of the entry
+        :param default: returned when the key is not cached
+        :return: cached value
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        """
+        Add or replace an entry, evicting the least recently used one when full
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """
+        Remove an entry from the cache
+
+        :return: the removed value or default if the key was not cached
+        """
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResultCache:
+    """
+    Persistent cache of query results stored in a SQLite database
+
+    Entries expire after their time to live, when more than max_entries results
+    are stored the least recently used ones are evicted.
+
+    Example:
+    >>> import tempfile
+    >>> cache = ResultCache(tempfile.mkdtemp(), ttl=7 * 24 * 3600)
+    >>> key = ResultCache.key("http://vocms00170:2113", "select 1 from dual")
+    >>> cache.set(key, {"data": [[1]]})
+    >>> cache.get(key)
+    {'data': [[1]]}
+    """
+
+    DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "runregistry")
+    DEFAULT_TTL = 24 * 3600
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, ttl=DEFAULT_TTL, max_entries=1000):
+        """
+        :param directory: directory containing the cache database
+        :param ttl: default time to live of an entry in seconds
+        :param max_entries: maximum number of cached results
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "results.sqlite")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "create table if not exists results ("
+                "key text primary key, value text, expires real, accessed real)"
+            )
+
+    @staticmethod
+    def key(url, query, media_type=None, parameters=None):
+        """
+        :param url: url of the Run Registry
+        :param query: SQL query string
+        :param media_type: requested media type
+        :param parameters: dictionary of the values of named query parameters
+        :return: key identifying the result of the query
+        """
+        text = "\n".join([url, normalize_query(query), media_type or ""])
+        text += encode_parameters(parameters)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        :param key: key of the result
+        :return: cached result or None if it is not cached or expired
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "select value, expires from results where key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._connection.execute("delete from results where key = ?", (key,))
+                return None
+            self._connection.execute(
+                "update results set accessed = ? where key = ?", (now, key)
+            )
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        """
+        :param key: key of the result
+        :param value: JSON serializable result
+        :param ttl: time to live in seconds, defaults to the ttl of the cache
+        """
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "insert or replace into results values (?, ?, ?, ?)",
+                (key, json.dumps(value), expires, now),
+            )
+            self._connection.execute(
+                "delete from results where key in (select key from results "
+                "order by accessed desc limit -1 offset ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("delete from results")
+
+    def close(self):
+        self._connection.close()
@@ -1,11 +1,15 @@
 import argparse
 import json
+import sys
 
-from runregistry.client import RunRegistryClient
+from runregistry.output import STREAM_WRITERS, stream_query
 from runregistry.utilities import media_type_dict
 
+# The client, and with it requests, is imported when it is needed,
+# so that queries forwarded to a running daemon start fast
 
-def parse_arguments():
+
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(
         description="Run Registry command line client.",
         formatter_class=lambda prog: argparse.HelpFormatter(prog, max_help_position=35),
@@ -29,23 +33,187 @@ def parse_arguments():
         default="csv",
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        "--format",
+        help="Stream the result page by page in this format, also used by "
+        "batch mode (xml and json2 pages are separate documents, use -f)",
+        choices=sorted(STREAM_WRITERS),
+    )
 
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Stream the result into this file instead of stdout",
+        metavar="file",
+    )
 
-def main():
-    args = parse_arguments()
-    run_reg = RunRegistryClient()
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Amount of pages downloaded concurrently while streaming "
+        "(default: 8, 1 per query in batch mode)",
+        metavar="workers",
+        type=int,
+    )
+
+    parser.add_argument(
+        "--batch",
+        help="Execute the named queries of a SQL file (or JSON lines, "
+        "'-' for stdin) concurrently, each into its own file",
+        metavar="file",
+    )
+
+    parser.add_argument(
+        "-p",
+        "--parallel",
+        help="Amount of queries executed concurrently in batch mode",
+        metavar="queries",
+        type=int,
+        default=4,
+    )
+
+    parser.add_argument(
+        "-d",
+        "--directory",
+        help="Output directory of batch mode",
+        metavar="directory",
+        default=".",
+    )
+
+    parser.add_argument(
+        "--daemon",
+        help="Keep connections and caches warm for following runreg calls, "
+        "which are forwarded to the daemon while it is running",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--socket",
+        help="Unix socket of the daemon (default: $RUNREG_SOCKET or "
+        "~/.cache/runregistry/runreg.sock)",
+        metavar="path",
+    )
+
+    parser.add_argument(
+        "--cache-ttl",
+        help="Seconds results are cached by the daemon (default: not cached)",
+        metavar="seconds",
+        type=float,
+    )
+
+    parser.add_argument(
+        "--no-daemon",
+        help="Execute the query in this process even if a daemon is running",
+        action="store_true",
+    )
+
+    return parser.parse_args(argv)
+
+
+def read_batch(path):
+    """
+    :param path: SQL file, JSON lines file or '-' for JSON lines on stdin
+    :return: list of BatchQuery
+    """
+    from runregistry.batch import parse_jsonl_batch, parse_sql_batch
+
+    if path == "-":
+        return parse_jsonl_batch(sys.stdin)
+    with open(path) as batch_file:
+        if path.endswith(".jsonl"):
+            return parse_jsonl_batch(batch_file)
+        return parse_sql_batch(batch_file.read())
+
+
+def main_batch(args):
+    from runregistry.batch import run_batch, summary
+    from runregistry.client import RunRegistryClient
+    from runregistry.transport import Transport
+
+    try:
+        queries = read_batch(args.batch)
+    except ValueError as e:
+        print("Error: {}".format(e), file=sys.stderr)
+        return 1
+
+    workers = args.workers or 1
+    transport = Transport(pool_size=args.parallel * (workers + 1) + 2)
+    run_reg = RunRegistryClient(transport=transport)
+    results = run_batch(
+        run_reg, queries, args.format or "csv", args.directory, args.parallel, workers
+    )
+    print(summary(results), file=sys.stderr)
+    return 1 if any(result.error for result in results) else 0
+
+
+def execute(run_reg, args, stdout, output=None, progress=None):
+    """
+    Executes the info and query arguments, in this process or in the daemon
+
+    :param run_reg: RunRegistryClient
+    :param args: parsed command line arguments
+    :param stdout: text output with a binary buffer
+    :param output: text output of streamed results, stdout by default
+    :param progress: Progress of streamed results, reported on stderr by default
+    """
     if args.info:
-        print(json.dumps(run_reg.get_info(), indent=2))
-    if args.q:
+        print(json.dumps(run_reg.get_info(), indent=2), file=stdout)
+    if args.q and (args.format or args.output):
+        output_format = args.format or "csv"
+        workers = args.workers or 8
+        try:
+            stream_query(
+                run_reg, args.q, output_format, output or stdout, workers, progress
+            )
+        except ValueError as e:
+            print("Error: Your SQL query is invalid", file=stdout)
+            print(e, file=stdout)
+    elif args.q:
         try:
             media_type = media_type_dict.get(args.f, None)
-            response = run_reg.execute_query(args.q, media_type)
-            print(response)
+            response = run_reg.execute_query(args.q, media_type, raw=True)
+            if isinstance(response, bytes):
+                # Written as received, without decoding
+                stdout.flush()
+                stdout.buffer.write(response)
+                stdout.buffer.write(b"\n")
+                stdout.buffer.flush()
+            else:
+                print(response, file=stdout)
         except ValueError as e:
-            print("Error: Your SQL query is invalid")
-            print(e)
+            print("Error: Your SQL query is invalid", file=stdout)
+            print(e, file=stdout)
+
+
+def main():
+    args = parse_arguments()
+    if args.daemon:
+        from runregistry.daemon import DEFAULT_SOCKET_PATH, serve
+
+        return serve(args.socket or DEFAULT_SOCKET_PATH, args.cache_ttl)
+    if args.batch:
+        return main_batch(args)
+
+    if not args.no_daemon and (args.q or args.info):
+        from runregistry.daemon import DEFAULT_SOCKET_PATH, forward
+
+        code = forward(args, args.socket or DEFAULT_SOCKET_PATH)
+        if code is not None:
+            return code
+
+    from runregistry.client import PageNotAvailable, RunRegistryClient
+
+    run_reg = RunRegistryClient()
+    try:
+        if args.q and args.output:
+            with open(args.output, "w", newline="") as output:
+                execute(run_reg, args, sys.stdout, output)
+        else:
+            execute(run_reg, args, sys.stdout)
+    except (OSError, PageNotAvailable) as e:  # requests.ConnectionError included
+        print("Error: {}".format(e), file=sys.stderr)
+        return 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
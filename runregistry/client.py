@@ -1,29 +1,113 @@
 """"
 RunRegistry Client
 """
+import inspect
 import logging
-from json import JSONDecodeError
-from math import ceil
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
 
 import requests
 
+from runregistry.cache import LRUCache, ResultCache
+from runregistry.decoding import get_decoder
+from runregistry.instrumentation import Instrumentation, query_id_of
+from runregistry.transport import Transport
+from runregistry.utilities import encode_parameters, normalize_query, query_parameters
+
 logger = logging.getLogger(__name__)
 
 
-class Singleton(type):
+class QueryIdNotFound(Exception):
     """
-    Allow only one instance of a class
+    The Run Registry does not know the query id (anymore)
     """
 
-    _instances = {}
 
-    def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
-        return cls._instances[cls]
+class PageNotAvailable(Exception):
+    """
+    The Run Registry did not answer a page of a result with rows
+    """
+
+    def __init__(self, query_id, page, page_size):
+        super().__init__(
+            "Page {} of {} rows of query id {} not available".format(
+                page, page_size, query_id
+            )
+        )
+
+
+class QueryPlan:
+    """
+    Requests sent by the RunRegistryClient to execute a single query
+    """
+
+    def __init__(
+        self, query, media_type=None, speculative=True, raw=False, parameters=None
+    ):
+        """
+        :param query: SQL query string
+        :param media_type: requested media type
+        :param speculative: fetch the first page of JSON results together with
+        the amount of rows
+        :param raw: keep the undecoded bytes of results in the media type
+        :param parameters: dictionary of the values of named query parameters
+        """
+        self.query = query
+        self.media_type = media_type
+        self.raw = raw
+        self.parameters = parameters
+        self.query_string = encode_parameters(parameters)
+        self.speculative = speculative and media_type is None
+        self.query_id = None
+        self.count = None
+        self.page_size = None
+        self.pages = 0
+        self.http_calls = 0
+        self.error = None  # Logged exception that stopped the execution
+
+    def __repr__(self):
+        return "QueryPlan(query_id={!r}, count={}, pages={}, http_calls={})".format(
+            self.query_id, self.count, self.pages, self.http_calls
+        )
+
+
+class ClientRegistry(type):
+    """
+    Shares one instance per class, endpoint and configuration
+
+    Clients created with the same arguments are the same object, clients of
+    different endpoints are isolated from each other. Creating the instances
+    is thread-safe.
+
+    An instance is shared only as long as it is referenced, so clients with
+    their own transport are released together with its connection pool.
+    Attributes set on a shared client, like result_cache, page_sizes, mirror
+    or fill_index, apply to everyone who uses it.
+    """
 
+    _instances = weakref.WeakValueDictionary()
+    _lock = threading.RLock()
 
-class RunRegistryClient(metaclass=Singleton):
+    def __call__(cls, *args, **kwargs):
+        arguments = inspect.signature(cls.__init__).bind(None, *args, **kwargs)
+        arguments.apply_defaults()
+        key = (cls,) + tuple(list(arguments.arguments.items())[1:])
+        instance = cls._instances.get(key)
+        if instance is None:
+            with cls._lock:
+                instance = cls._instances.get(key)
+                if instance is None:
+                    instance = super(ClientRegistry, cls).__call__(*args, **kwargs)
+                    cls._instances[key] = instance
+        return instance
+
+
+class RunRegistryClient(metaclass=ClientRegistry):
     """
     Implements a simple client that accesses the RunRegistry through the resthub API
 
@@ -38,14 +122,22 @@ class RunRegistryClient(metaclass=Singleton):
     DEFAULT_NAMESPACE = "runreg_tracker"
     DEFAULT_TABLE = "dataset_lumis"
 
-    def __init__(self, url=DEFAULT_URL):
+    def __init__(self, url=DEFAULT_URL, transport=None):
         self.url = url
         self._connection_successful = None  # Lazy
         self.row_limit = 1000
+        self.max_workers = 8
+        self.transport = transport or Transport(pool_size=self.max_workers + 2)
+        self.query_ids = LRUCache(maxsize=256)
+        self.result_cache = None  # Optional, e.g. runregistry.cache.ResultCache
+        self.instrumentation = Instrumentation()
+        self.decode_json = get_decoder()  # e.g. runregistry.decoding.stdlib_loads
+        self.page_sizes = None  # Optional, runregistry.paging.PageSizeController
+        self._local = threading.local()
 
     def _test_connection(self):
         try:
-            requests.get(self.url)
+            self.transport.get(self.url)
             return True
         except requests.ConnectionError:
             return False
@@ -72,48 +164,248 @@ class RunRegistryClient(metaclass=Singleton):
             self.retry_connection()
         return self._connection_successful
 
-    def _get_count(self, query_id):
+    @property
+    def last_query_plan(self):
+        """
+        QueryPlan of the last query executed by the current thread,
+        e.g. client.last_query_plan.http_calls
+        """
+        return getattr(self._local, "query_plan", None)
+
+    @property
+    def statistics(self):
+        """
+        Cumulative ClientStatistics of the client,
+        e.g. client.statistics.as_dict()
+        """
+        return self.instrumentation.statistics
+
+    def _request(self, method, url, **kwargs):
+        """
+        Sends a request through the transport.
+
+        A successful request marks the connection as possible, so that no
+        separate connection probe is needed once the Run Registry answered.
+        Failed requests do not keep later requests from being sent, only a
+        failed probe of connection_possible does. Every request is recorded
+        by the instrumentation.
+
+        :param method: transport method, e.g. self.transport.get
+        :param url: requested url
+        :return: response
+        """
+        method_name = getattr(method, "__name__", "get")
+        start = time.perf_counter()
+        try:
+            response = method(url, **kwargs)
+        except requests.RequestException as e:
+            self._local.connection_failed = isinstance(e, requests.ConnectionError)
+            self.instrumentation.record_request(method_name, url, start, error=e)
+            raise
+        self._local.connection_failed = False
+        self._connection_successful = True
+        self.instrumentation.record_request(method_name, url, start, response)
+        self._local.response_size = len(response.content)
+        return response
+
+    def _connection_error(self):
+        return requests.ConnectionError(
+            "Connection to {} not possible".format(self.url)
+        )
+
+    def _get_count(self, query_id, query_string=""):
         """
         :param query_id: query id
+        :param query_string: encoded parameters of the query
         :return: amount of rows that the query_id contains
         """
-        if not self.connection_possible():
+        if self._connection_successful is False:
             logger.error("Connection to {} not possible".format(self.url))
             return 0
-        return requests.get("{}/query/{}/count".format(self.url, query_id)).json()
+        url = "{}/query/{}/count{}".format(self.url, query_id, query_string)
+        response = self._request(self.transport.get, url)
+        if response.status_code == 404:
+            raise QueryIdNotFound(query_id)
+        return response.json()
 
-    def _get_json_response(self, resource, media_type=None):
-        if not self.connection_possible():
+    def _get_json_response(self, resource, media_type=None, raw=False):
+        """
+        JSON responses are decoded by decode_json. Responses in other media
+        types are only returned if the Run Registry answered successfully.
+
+        :param resource: requested resource
+        :param media_type: requested media type, JSON by default
+        :param raw: return the undecoded bytes of the media type
+        :return: JSON dictionary, text or bytes in the media type,
+        empty dictionary if the request failed
+        """
+        if self._connection_successful is False:
             logger.error("Connection to {} not possible".format(self.url))
             return {}
 
-        if media_type:
-            headers = {"Accept": media_type}
-            response = requests.get(self.url + resource, headers=headers)
-            return response.content.decode("utf-8")
-
         try:
-            response = requests.get(self.url + resource)
-            return response.json()
-        except JSONDecodeError as e:
+            if media_type:
+                headers = {"Accept": media_type}
+                url = self.url + resource
+                response = self._request(self.transport.get, url, headers=headers)
+                if not response.ok:
+                    logger.error(
+                        "{} {}: {}".format(response.status_code, url, response.text)
+                    )
+                    return {}
+                return response.content if raw else response.content.decode("utf-8")
+
+            response = self._request(self.transport.get, self.url + resource)
+            with self.instrumentation.stage("decode") as event:
+                result = self.decode_json(response.content)
+                if event:
+                    event.query_id = query_id_of(resource)
+                    if isinstance(result, dict):
+                        event.rows = len(result.get("data", []))
+            return result
+        except requests.ConnectionError:
+            logger.error("Connection to {} not possible".format(self.url))
+            return {}
+        except ValueError as e:
             logger.error(e)
             return {}
 
-    def _get_paged_json_response(self, query_id):
+    def _get_page(
+        self,
+        query_id,
+        page,
+        media_type=None,
+        raw=False,
+        page_size=None,
+        query_string="",
+    ):
         """
-        Retrieves the response page-wise.
+        GET: /query/{query_id}/page/{row_limit}/{page}/data
+
+        :param query_id: query id
+        :param page: page number, starting at 1
+        :param media_type: requested media type, JSON rows by default
+        :param raw: return the undecoded bytes of the media type
+        :param page_size: rows per page, row_limit by default
+        :param query_string: encoded parameters of the query
+        :return: list of rows contained in the page or the text of the page
+        :raises PageNotAvailable: if the response contains no rows
+        """
+        page_size = page_size or self.row_limit
+        resource = "/query/{}/page/{}/{}/data{}".format(
+            query_id, page_size, page, query_string
+        )
+        if media_type:
+            response = self._get_json_response(resource, media_type, raw)
+            if not isinstance(response, (str, bytes)):
+                raise PageNotAvailable(query_id, page, page_size)
+            return response
+        response = self._get_json_response(resource)
+        if "data" not in response:
+            raise PageNotAvailable(query_id, page, page_size)
+        return response["data"]
+
+    def _is_adaptive(self, plan):
+        """
+        :return: True if the page sizes of the plan are chosen by page_sizes
+        """
+        return (
+            self.page_sizes is not None
+            and plan.media_type is None
+            and plan.query is not None
+        )
 
-        Necessary when the response has more than 1000 rows.
+    def _get_plan_page(self, plan, offset, page_size):
         """
-        count = self._get_count(query_id)
-        number_of_pages = int(ceil(count / self.row_limit))
-        entries = {"data": []}
+        Downloads the page of page_size rows that starts at the offset.
+
+        The JSON pages of adaptive plans are measured by page_sizes. Pages that
+        fail with a timeout or server error are downloaded again as two pages
+        of half the size.
 
-        for page in range(0, number_of_pages):
-            resource = "/query/{}/page/{}/{}/data".format(query_id, self.row_limit, page + 1)
+        :param plan: QueryPlan with a registered query id
+        :param offset: number of rows preceding the page
+        :param page_size: rows per page, offset has to be a multiple of it
+        :return: list of rows contained in the page or the text of the page
+        :raises PageNotAvailable: if a page of min_size rows fails
+        """
+        page = offset // page_size + 1
+        if not self._is_adaptive(plan):
+            return self._get_page(
+                plan.query_id,
+                page,
+                plan.media_type,
+                plan.raw,
+                page_size,
+                plan.query_string,
+            )
+
+        half = page_size // 2
+        resource = "/query/{}/page/{}/{}/data{}".format(
+            plan.query_id, page_size, page, plan.query_string
+        )
+        start = time.perf_counter()
+        try:
             response = self._get_json_response(resource)
-            entries["data"].extend(response["data"])
+        except requests.Timeout:
+            if half < self.page_sizes.min_size:
+                raise
+            response = {}
+        if "data" in response:
+            seconds = time.perf_counter() - start
+            rows = len(response["data"])
+            size = getattr(self._local, "response_size", 0)
+            self.page_sizes.record(plan.query, page_size, rows, seconds, size)
+            return response["data"]
+
+        self.page_sizes.record_failure(plan.query, page_size)
+        connection_failed = getattr(self._local, "connection_failed", False)
+        if half < self.page_sizes.min_size or connection_failed:
+            raise PageNotAvailable(plan.query_id, page, page_size)
+        logger.info("Splitting page {} of query id {}".format(page, plan.query_id))
+        plan.http_calls += 2
+        return self._get_plan_page(plan, offset, half) + self._get_plan_page(
+            plan, offset + half, half
+        )
+
+    def _get_paged_json_response(
+        self, query_id, count=None, first_page=None, plan=None
+    ):
+        """
+        Retrieves the response page-wise.
 
+        Necessary when the response has more rows than fit into a page.
+        The pages are downloaded concurrently by at most max_workers threads
+        and reassembled in page order.
+
+        :param query_id: query id
+        :param count: amount of rows, requested when not given
+        :param first_page: rows of the first page, if already downloaded
+        :param plan: QueryPlan of the query, updated with the downloaded pages
+        """
+        json_plan = plan
+        if plan is None or plan.media_type is not None:
+            # Pages are always retrieved as JSON rows
+            json_plan = QueryPlan(
+                plan.query if plan else None,
+                parameters=plan.parameters if plan else None,
+            )
+            json_plan.query_id = query_id
+            json_plan.page_size = plan.page_size if plan else self.row_limit
+        if count is None:
+            count = self._get_count(query_id, json_plan.query_string)
+        json_plan.count = count
+        entries = {"data": list(first_page or [])}
+
+        first_offset = 0
+        if first_page is not None:
+            json_plan.pages, first_offset = 1, json_plan.page_size
+        for rows in self._iter_pages(json_plan, self.max_workers, first_offset):
+            entries["data"].extend(rows)
+
+        if plan is not None and plan is not json_plan:
+            plan.pages = json_plan.pages
+            plan.http_calls += json_plan.http_calls
         return entries
 
     def _get_query_id(self, query):
@@ -121,17 +413,77 @@ class RunRegistryClient(metaclass=Singleton):
         Converts a SQL query string into a query id (qid), that will be used to access
         the RunRegistry.
 
+        The query ids of recently used queries are cached,
+        so repeated queries do not have to be registered again.
+
         POST: /query
 
         :param query: SQL query string
         :return: query id
         """
-        response = requests.post(self.url + "/query?", data=query)
+        key = normalize_query(query)
+        query_id = self.query_ids.get(key)
+        if query_id is not None:
+            self.statistics.record_query_id_hit()
+            return query_id
+
+        response = self._request(self.transport.post, self.url + "/query?", data=query)
         if response.status_code == 400:
             raise ValueError(response.text)
+        self.query_ids.set(key, response.text)
         return response.text
 
-    def execute_query(self, query, media_type=None):
+    def _get_count_and_first_page(self, plan):
+        """
+        Retrieves the amount of rows of the planned query.
+
+        Speculative plans download the first page at the same time,
+        which already contains the whole result for small queries.
+
+        :param plan: QueryPlan with a registered query id
+        :return: rows of the first page or None if not speculative
+        """
+        if not plan.speculative:
+            plan.http_calls += 1
+            plan.count = self._get_count(plan.query_id, plan.query_string)
+            return None
+
+        plan.http_calls += 2
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            first_page = executor.submit(self._get_plan_page, plan, 0, plan.page_size)
+            plan.count = self._get_count(plan.query_id, plan.query_string)
+            return first_page.result()
+
+    def _register_query(self, plan):
+        """
+        Registers the query of the plan and retrieves its amount of rows.
+
+        A cached query id that was rejected by the Run Registry is discarded
+        and the query is registered again.
+
+        :param plan: QueryPlan
+        :return: rows of the first page or None if not speculative
+        """
+        if plan.page_size is None:
+            plan.page_size = self.row_limit
+            if self._is_adaptive(plan):
+                plan.page_size = self.page_sizes.page_size(plan.query)
+        key = normalize_query(plan.query)
+        for attempt in range(2):
+            if key not in self.query_ids:
+                plan.http_calls += 1
+            plan.query_id = self._get_query_id(plan.query)
+            try:
+                return self._get_count_and_first_page(plan)
+            except QueryIdNotFound:
+                if attempt:
+                    raise
+                logger.info("Query id {} is not known anymore".format(plan.query_id))
+                self.query_ids.pop(key)
+
+    def execute_query(
+        self, query, media_type=None, refresh=False, raw=False, parameters=None
+    ):
         """
         Executes an arbitrary SQL query
 
@@ -157,20 +509,255 @@ class RunRegistryClient(metaclass=Singleton):
         >>> client.execute_query(query)
         {'data': [[247073], [247076], [247077], [247078], [247079]]}
 
+        Results are served from the result_cache if one is configured,
+        unless refresh is set. Raw results are cached as text and encoded
+        again when they are served.
+
+        The values of named parameters are sent with every request, so that
+        the query is registered only once for all values, see prepare.
+
         :param media_type: Desired media type, e.g. application/xml, text/json
         :param query: SQL query string
+        :param refresh: bypass the result_cache and store the new result in it
+        :param raw: return the undecoded bytes of results in the media type
+        :param parameters: dictionary of the values of named query parameters
         :return: JSON dictionary
         """
-        if not self.connection_possible():
-            logger.error("Connection to {} not possible".format(self.url))
+        if self.result_cache is None:
+            return self._execute_query(query, media_type, raw, parameters)
+
+        key = ResultCache.key(self.url, query, media_type, parameters)
+        response = None
+        if not refresh:
+            response = self.result_cache.get(key)
+            self.statistics.record_cache(response is not None)
+        if response is None:
+            response = self._execute_query(query, media_type, parameters=parameters)
+            if response:
+                self.result_cache.set(key, response)
+        if raw and isinstance(response, str):
+            return response.encode("utf-8")
+        return response
+
+    def _execute_query(self, query, media_type=None, raw=False, parameters=None):
+        plan = QueryPlan(query, media_type, raw=raw, parameters=parameters)
+        self._local.query_plan = plan
+        if self._connection_successful is False:
+            plan.error = self._connection_error()
+            logger.error(plan.error)
             return {}
-        query_id = self._get_query_id(query)
-        count = self._get_count(query_id)
-        if count > self.row_limit:
-            return self._get_paged_json_response(query_id)
-        else:
-            resource = "/query/" + query_id + "/data"
-            return self._get_json_response(resource, media_type)
+        with self.instrumentation.stage("execute_query") as event:
+            try:
+                response = self._execute_plan(plan)
+            except requests.ConnectionError as e:
+                plan.error = e
+                logger.error("Connection to {} not possible".format(self.url))
+                response = {}
+            except (PageNotAvailable, QueryIdNotFound) as e:
+                plan.error = e
+                logger.error("{}: {}".format(e.__class__.__name__, e))
+                response = {}
+            if event:
+                event.query_id = plan.query_id
+                event.rows = plan.count
+        return response
+
+    def _execute_plan(self, plan):
+        """
+        Sends the requests needed to execute a query:
+
+         1. POST /query, skipped when the query id is cached
+         2. GET /query/{query_id}/count, for JSON results together with the
+            first page, which already is the whole result for small queries
+         3. GET the remaining pages or the unpaged result
+
+        :param plan: QueryPlan
+        :return: JSON dictionary
+        """
+        first_page = self._register_query(plan)
+        if plan.count > plan.page_size:
+            return self._get_paged_json_response(
+                plan.query_id, plan.count, first_page, plan
+            )
+        if first_page is not None:
+            plan.pages = 1
+            return {"data": first_page}
+
+        plan.http_calls += 1
+        resource = "/query/" + plan.query_id + "/data" + plan.query_string
+        return self._get_json_response(resource, plan.media_type, plan.raw)
+
+    def _iter_pages(self, plan, read_ahead=False, first_offset=0):
+        """
+        Yields the pages of a query one after the other
+
+        The page size of adaptive plans is chosen by page_sizes for every page,
+        the page sizes of other plans are fixed.
+
+        :param plan: QueryPlan with a registered query id and amount of rows
+        :param read_ahead: amount of pages downloaded concurrently while the
+        current one is consumed, True for one
+        :param first_offset: number of rows preceding the first page
+        """
+
+        def page_ranges():
+            offset = first_offset
+            while offset < plan.count:
+                page_size = plan.page_size
+                if self._is_adaptive(plan):
+                    page_size = self.page_sizes.aligned_page_size(plan.query, offset)
+                plan.pages += 1
+                plan.http_calls += 1
+                yield offset, page_size
+                offset += page_size
+
+        ranges = page_ranges()
+        if not read_ahead:
+            for offset, page_size in ranges:
+                yield self._get_plan_page(plan, offset, page_size)
+            return
+
+        get_page = partial(self._get_plan_page, plan)
+        with ThreadPoolExecutor(max_workers=int(read_ahead)) as executor:
+            futures = deque(
+                executor.submit(get_page, *page_range)
+                for page_range in islice(ranges, read_ahead)
+            )
+            while futures:
+                rows = futures.popleft().result()
+                for page_range in islice(ranges, 1):
+                    futures.append(executor.submit(get_page, *page_range))
+                yield rows
+
+    def iter_query(self, query, batch_size=None, read_ahead=False, parameters=None):
+        """
+        Executes an arbitrary SQL query and yields the resulting rows
+
+        In contrast to execute_query only one page of rows (two with read_ahead)
+        is held in memory at any time.
+
+        Example:
+        >>> client = RunRegistryClient()
+        >>> query = "select r.runnumber from runreg_global.runs r " \
+                    "where r.run_class_name = 'Collisions15'" \
+                    "and r.runnumber > 247070 and r.runnumber < 247081"
+        >>> list(client.iter_query(query, batch_size=2))
+        [[[247073], [247076]], [[247077], [247078]], [[247079]]]
+
+        :param query: SQL query string
+        :param batch_size: yield lists of at most batch_size rows instead of rows
+        :param read_ahead: download the next page while the current one is consumed
+        :param parameters: dictionary of the values of named query parameters
+        :return: generator of rows or batches of rows
+        """
+        pages = self.iter_query_pages(
+            query, read_ahead=read_ahead, parameters=parameters
+        )
+        rows = (row for page in pages for row in page)
+        if batch_size is None:
+            yield from rows
+            return
+
+        batch = list(islice(rows, batch_size))
+        while batch:
+            yield batch
+            batch = list(islice(rows, batch_size))
+
+    def iter_query_pages(
+        self, query, media_type=None, read_ahead=False, raw=False, parameters=None
+    ):
+        """
+        Executes an arbitrary SQL query and yields its result page by page
+
+        The pages are yielded in order as soon as they arrive. With read_ahead
+        the following pages are downloaded concurrently, the amount of rows is
+        available from last_query_plan.count after the first page.
+        The pages are never served from the result_cache.
+
+        Like execute_query, a failed connection is logged and ends the pages,
+        last_query_plan.error holds its exception then. Pages that are not
+        available raise PageNotAvailable.
+
+        :param query: SQL query string
+        :param media_type: Desired media type, e.g. text/csv,
+        lists of JSON rows by default
+        :param read_ahead: amount of pages downloaded concurrently while the
+        current one is consumed, True for one
+        :param raw: yield the undecoded bytes of pages in the media type
+        :param parameters: dictionary of the values of named query parameters
+        :return: generator of lists of rows or of texts in the media type
+        """
+        plan = QueryPlan(query, media_type, raw=raw, parameters=parameters)
+        self._local.query_plan = plan
+        if self._connection_successful is False:
+            plan.error = self._connection_error()
+            logger.error(plan.error)
+            return
+        try:
+            first_page = self._register_query(plan)
+        except requests.ConnectionError as e:
+            plan.error = e
+            logger.error("Connection to {} not possible".format(self.url))
+            return
+        except QueryIdNotFound as e:
+            plan.error = e
+            logger.error("Query id {} not found".format(e))
+            return
+        if first_page is None:
+            yield from self._iter_pages(plan, read_ahead)
+            return
+        plan.pages = 1
+        yield first_page
+        yield from self._iter_pages(plan, read_ahead, plan.page_size)
+
+    def execute_query_columnar(
+        self, query, keys, dtypes=None, as_frame=False, parameters=None
+    ):
+        """
+        Executes an arbitrary SQL query and decodes the rows page by page
+        into typed numpy arrays, one per column.
+
+        Requires numpy, as_frame requires pandas.
+
+        Example:
+        >>> client = RunRegistryClient()
+        >>> query = "select r.runnumber from runreg_global.runs r " \
+                    "where r.run_class_name = 'Collisions15'" \
+                    "and r.runnumber > 247070 and r.runnumber < 247081"
+        >>> client.execute_query_columnar(query, ["run_number"], {"run_number": int})
+        {'run_number': array([247073, 247076, 247077, 247078, 247079])}
+
+        :param query: SQL query string
+        :param keys: column names
+        :param dtypes: dictionary of column name to numpy dtype, object by default
+        :param as_frame: return a pandas.DataFrame
+        :param parameters: dictionary of the values of named query parameters
+        :return: dictionary of column name to numpy array or pandas.DataFrame
+        """
+        from runregistry.columnar import rows_to_columns, columns_to_frame
+
+        pages = self.iter_query_pages(query, parameters=parameters)
+        columns = rows_to_columns(pages, keys, dtypes)
+        return columns_to_frame(columns) if as_frame else columns
+
+    def prepare(self, query):
+        """
+        Registers a query with named parameters once, so that it can be
+        executed with different values without registering it again.
+
+        Example:
+        >>> client = RunRegistryClient()
+        >>> query = client.prepare(
+        ...     "select r.runnumber from runreg_global.runs r "
+        ...     "where r.runnumber >= :n__min and r.runnumber <= :n__max"
+        ... )
+        >>> query.execute(n__min=247073, n__max=247076)
+        {'data': [[247073], [247076]]}
+
+        :param query: SQL query string with named parameters, e.g. :n__min
+        :return: PreparedQuery
+        """
+        return PreparedQuery(self, query)
 
     def get_table_description(self, namespace=DEFAULT_NAMESPACE, table=DEFAULT_TABLE):
         """
@@ -218,3 +805,62 @@ class RunRegistryClient(metaclass=Singleton):
         :return json with general information about the service
         """
         return self._get_json_response("/info")
+
+
+class PreparedQuery:
+    """
+    SQL query with named parameters that is registered once by a
+    RunRegistryClient and executed with different parameter values
+
+    The query id is kept in the query_ids cache of the client, so that it is
+    registered again when the Run Registry does not know it anymore.
+    """
+
+    def __init__(self, client, query):
+        """
+        :param client: RunRegistryClient
+        :param query: SQL query string with named parameters
+        """
+        self.client = client
+        self.query = query
+        self.parameters = query_parameters(query)
+        self.query_id = client._get_query_id(query)
+
+    def __repr__(self):
+        return "PreparedQuery(query_id={!r}, parameters={})".format(
+            self.query_id, self.parameters
+        )
+
+    def _check_parameters(self, parameters):
+        missing = set(self.parameters) - set(parameters)
+        unknown = set(parameters) - set(self.parameters)
+        if missing or unknown:
+            raise ValueError(
+                "Parameters {} required, missing: {}, unknown: {}".format(
+                    ", ".join(self.parameters),
+                    ", ".join(sorted(missing)) or "none",
+                    ", ".join(sorted(unknown)) or "none",
+                )
+            )
+        return parameters
+
+    def execute(self, media_type=None, **parameters):
+        """
+        :param media_type: Desired media type, e.g. application/xml, text/json
+        :param parameters: values of all named parameters of the query
+        :return: JSON dictionary
+        """
+        parameters = self._check_parameters(parameters)
+        return self.client.execute_query(self.query, media_type, parameters=parameters)
+
+    def iter_query(self, batch_size=None, read_ahead=False, **parameters):
+        """
+        :param batch_size: yield lists of at most batch_size rows instead of rows
+        :param read_ahead: download the next page while the current one is consumed
+        :param parameters: values of all named parameters of the query
+        :return: generator of rows or batches of rows
+        """
+        parameters = self._check_parameters(parameters)
+        return self.client.iter_query(
+            self.query, batch_size, read_ahead, parameters=parameters
+        )
@@ -0,0 +1,104 @@
+"""
+Columnar query results
+
+Requires the optional numpy dependency, pandas for DataFrames:
+pip install python-runregistryclient[columnar]
+"""
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+MISSING_INTEGER = -1
+
+
+def require_numpy():
+    if numpy is None:
+        raise ImportError("Columnar results require numpy")
+
+
+def _missing_value(dtype):
+    if dtype.kind in "iu":
+        return MISSING_INTEGER
+    if dtype.kind == "b":
+        return False
+    if dtype.kind == "f":
+        return numpy.nan
+    return None
+
+
+def _page_to_column(page, index, dtype):
+    if dtype.kind == "O":
+        column = numpy.empty(len(page), dtype=object)
+        column[:] = [row[index] for row in page]
+        return column
+
+    missing = _missing_value(dtype)
+    values = (missing if row[index] is None else row[index] for row in page)
+    return numpy.fromiter(values, dtype, count=len(page))
+
+
+def rows_to_columns(pages, keys, dtypes=None):
+    """
+    Decodes pages of rows into one typed numpy array per column.
+
+    Only the rows of one page exist as Python objects at a time.
+    Missing values are stored as -1 in integer and as False in boolean columns.
+
+    Example:
+    >>> columns = rows_to_columns([[[1, "a"], [2, None]]], ["x", "y"], {"x": int})
+    >>> columns["x"]
+    array([1, 2])
+
+    :param pages: iterable of lists of rows
+    :param keys: column names
+    :param dtypes: dictionary of column name to numpy dtype, object by default
+    :return: dictionary of column name to numpy array
+    """
+    require_numpy()
+    dtypes = dtypes or {}
+    types = [numpy.dtype(dtypes.get(key, object)) for key in keys]
+    chunks = [[] for _ in keys]
+    for page in pages:
+        for index, dtype in enumerate(types):
+            chunks[index].append(_page_to_column(page, index, dtype))
+
+    return {
+        key: numpy.concatenate(chunk) if chunk else numpy.empty(0, dtype)
+        for key, chunk, dtype in zip(keys, chunks, types)
+    }
+
+
+def concatenate_columns(list_of_columns, sort_by=None):
+    """
+    Concatenates column dictionaries with the same keys
+
+    :param list_of_columns: list of dictionaries of column name to numpy array
+    :param sort_by: column by which the result is sorted (stable)
+    :return: dictionary of column name to numpy array
+    """
+    require_numpy()
+    if len(list_of_columns) == 1:
+        return list_of_columns[0]
+
+    keys = list(list_of_columns[0])
+    columns = {
+        key: numpy.concatenate([columns[key] for columns in list_of_columns])
+        for key in keys
+    }
+    if sort_by is not None:
+        order = numpy.argsort(columns[sort_by], kind="stable")
+        columns = {key: column[order] for key, column in columns.items()}
+    return columns
+
+
+def columns_to_frame(columns):
+    """
+    :param columns: dictionary of column name to numpy array
+    :return: pandas.DataFrame
+    """
+    try:
+        import pandas
+    except ImportError:
+        raise ImportError("DataFrame results require pandas")
+    return pandas.DataFrame(columns)
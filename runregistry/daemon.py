@@ -0,0 +1,313 @@
+"""
+Long-lived runreg process answering the command line client on a Unix socket
+
+The daemon keeps one RunRegistryClient with its pooled connections, query
+id cache and result cache alive across invocations of runreg. Only the
+standard library is imported until the daemon is started, so that the
+command line client can check for a running daemon without importing
+requests.
+"""
+import io
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+
+DEFAULT_SOCKET_PATH = os.environ.get(
+    "RUNREG_SOCKET",
+    os.path.join(os.path.expanduser("~"), ".cache", "runregistry", "runreg.sock"),
+)
+
+FRAME_HEADER = struct.Struct(">cI")
+STDOUT, STDERR, OUTPUT, EXIT = b"o", b"e", b"f", b"x"
+
+# Not available on Windows, where runreg always runs without daemon
+UnixStreamServer = getattr(socketserver, "UnixStreamServer", socketserver.TCPServer)
+
+
+class FrameWriter(io.RawIOBase):
+    """
+    Writes everything written to it as frames of one type into a socket file
+    """
+
+    def __init__(self, wfile, frame_type):
+        self.wfile = wfile
+        self.frame_type = frame_type
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.wfile.write(FRAME_HEADER.pack(self.frame_type, len(data)))
+        self.wfile.write(data)
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+
+def frame_stream(wfile, frame_type):
+    """
+    :return: text file writing frames of the type, with a binary buffer
+    """
+    buffer = io.BufferedWriter(FrameWriter(wfile, frame_type))
+    return io.TextIOWrapper(buffer, encoding="utf-8", newline="", write_through=True)
+
+
+def read_frames(rfile):
+    """
+    :param rfile: binary socket file
+    :return: generator of (frame type, payload) tuples
+    """
+    while True:
+        header = rfile.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return
+        frame_type, size = FRAME_HEADER.unpack(header)
+        yield frame_type, rfile.read(size)
+
+
+class OutputRecorder:
+    """
+    Text output that keeps a copy of everything written to it, until more
+    than max_size characters are written
+    """
+
+    def __init__(self, output, max_size):
+        self.output = output
+        self.max_size = max_size
+        self.size = 0
+        self._parts = []
+
+    @property
+    def text(self):
+        """
+        Recorded text, None if more than max_size characters were written
+        """
+        return "".join(self._parts) if self._parts is not None else None
+
+    def write(self, text):
+        self.size += len(text)
+        if self._parts is not None:
+            self._parts.append(text)
+            if self.size > self.max_size:
+                self._parts = None
+        return self.output.write(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        self.output.flush()
+
+
+def execute_cached(client, args, stdout, output, progress, max_size=2 ** 20):
+    """
+    Executes the arguments like runregistry.cli.execute, serving the output of
+    streamed queries from the result_cache of the client
+
+    Only the output of results that fit into a single page is cached, larger
+    results are streamed without being held in memory.
+
+    :param client: RunRegistryClient
+    :param args: parsed command line arguments
+    :param stdout: text output with a binary buffer
+    :param output: text output of streamed results, stdout if None
+    :param progress: Progress of streamed results
+    :param max_size: maximum amount of cached characters
+    :return: exit code
+    """
+    from runregistry.cache import ResultCache
+    from runregistry.cli import execute
+
+    cache = client.result_cache
+    streamed = args.q and (args.format or args.output) and not args.info
+    if cache is None or not streamed:
+        return execute(client, args, stdout, output, progress)
+
+    output_format = args.format or "csv"
+    key = ResultCache.key(client.url, args.q, "stream/" + output_format)
+    cached = cache.get(key)
+    client.statistics.record_cache(cached is not None)
+    if cached is not None:
+        (output or stdout).write(cached["text"])
+        progress.update(cached["rows"], cached["rows"])
+        progress.finish(cached["rows"])
+        return 0
+
+    recorder = OutputRecorder(output or stdout, max_size)
+    code = execute(client, args, stdout, recorder, progress)
+    plan = client.last_query_plan
+    if (
+        not code
+        and recorder.text is not None
+        and plan is not None
+        and plan.count is not None
+        and plan.count <= plan.page_size
+    ):
+        cache.set(key, {"text": recorder.text, "rows": plan.count})
+    return code
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Executes the command line arguments sent as one JSON line and answers
+    with frames of stdout, stderr and output file data, ended by the exit code
+    """
+
+    def handle(self):
+        from argparse import Namespace
+        from runregistry.output import Progress
+
+        line = self.rfile.readline()
+        if not line:
+            return  # Connection probe of is_running
+        args = Namespace(**json.loads(line.decode("utf-8")))
+        stdout = frame_stream(self.wfile, STDOUT)
+        stderr = frame_stream(self.wfile, STDERR)
+        output = frame_stream(self.wfile, OUTPUT) if args.output else None
+
+        code = 0
+        try:
+            progress = Progress(stderr)
+            client = self.server.client
+            code = execute_cached(client, args, stdout, output, progress) or 0
+        except Exception as e:
+            stderr.write("Error: {}\n".format(e))
+            code = 1
+        for stream in filter(None, [stdout, stderr, output]):
+            stream.flush()
+        exit_code = json.dumps({"code": code}).encode("utf-8")
+        self.wfile.write(FRAME_HEADER.pack(EXIT, len(exit_code)) + exit_code)
+
+
+class RunRegistryDaemon(socketserver.ThreadingMixIn, UnixStreamServer):
+    """
+    Unix socket server sharing one RunRegistryClient between all requests
+
+    The socket is only accessible by the user who started the daemon.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH, client=None):
+        """
+        :param path: path of the Unix socket
+        :param client: RunRegistryClient, the default client by default
+        """
+        if client is None:
+            from runregistry.client import RunRegistryClient
+
+            client = RunRegistryClient()
+        self.client = client
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path):
+            if is_running(path):
+                raise RuntimeError("runreg daemon already listening on " + path)
+            os.unlink(path)  # Left behind by a daemon that was killed
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, DaemonRequestHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def connect(path=DEFAULT_SOCKET_PATH):
+    """
+    :param path: path of the Unix socket
+    :return: socket connected to the daemon, None if no daemon is listening
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+def is_running(path=DEFAULT_SOCKET_PATH):
+    """
+    :param path: path of the Unix socket
+    :return: True if a daemon is listening on the socket
+    """
+    connection = connect(path)
+    if connection is None:
+        return False
+    connection.close()
+    return True
+
+
+def forward(args, path=DEFAULT_SOCKET_PATH, stdout=None, stderr=None):
+    """
+    Executes the command line arguments by the daemon listening on the socket
+
+    :param args: parsed command line arguments
+    :param path: path of the Unix socket
+    :param stdout: binary output, the buffer of sys.stdout by default
+    :param stderr: binary output, the buffer of sys.stderr by default
+    :return: exit code, None if no daemon is listening
+    """
+    connection = connect(path)
+    if connection is None:
+        return None
+
+    stdout = stdout or sys.stdout.buffer
+    stderr = stderr or sys.stderr.buffer
+    output = open(args.output, "wb") if args.q and args.output else None
+    code = 1
+    with connection, connection.makefile("rwb") as stream:
+        stream.write(json.dumps(vars(args)).encode("utf-8") + b"\n")
+        stream.flush()
+        try:
+            for frame_type, payload in read_frames(stream):
+                if frame_type == STDOUT:
+                    stdout.write(payload)
+                elif frame_type == STDERR:
+                    stderr.write(payload)
+                    stderr.flush()
+                elif frame_type == OUTPUT:
+                    output.write(payload)
+                elif frame_type == EXIT:
+                    code = json.loads(payload.decode("utf-8"))["code"]
+        finally:
+            if output is not None:
+                output.close()
+    stdout.flush()
+    return code
+
+
+def serve(path=DEFAULT_SOCKET_PATH, cache_ttl=None):
+    """
+    Runs the daemon until it is interrupted
+
+    :param path: path of the Unix socket
+    :param cache_ttl: seconds results are served from the result cache,
+    no result cache by default
+    """
+    from runregistry.client import RunRegistryClient
+
+    client = RunRegistryClient()
+    if cache_ttl is not None:
+        from runregistry.cache import ResultCache
+
+        client.result_cache = ResultCache(ttl=cache_ttl)
+    server = RunRegistryDaemon(path, client)
+    print("runreg daemon listening on {}".format(path), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
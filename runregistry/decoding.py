@@ -0,0 +1,63 @@
+"""
+JSON decoders of the Run Registry responses
+
+The fastest installed JSON library is used by default, orjson or ujson,
+otherwise the json module of the standard library.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+PREFERRED_DECODERS = ["orjson", "ujson", "json"]
+
+
+def stdlib_loads(content):
+    """
+    Example:
+    >>> stdlib_loads(b'{"data": [[247073]]}')
+    {'data': [[247073]]}
+
+    :param content: JSON document as bytes or str
+    :return: decoded document
+    """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8")
+    return json.loads(content)
+
+
+DECODERS = {"json": stdlib_loads}
+if ujson is not None:
+    DECODERS["ujson"] = ujson.loads
+if orjson is not None:
+    DECODERS["orjson"] = orjson.loads
+
+
+def get_decoder(name=None):
+    """
+    Decoders take the undecoded bytes of a response and raise a ValueError
+    on invalid documents.
+
+    Example:
+    >>> get_decoder("json")(b'{"data": [[247073]]}')
+    {'data': [[247073]]}
+
+    :param name: orjson, ujson or json, the fastest installed decoder by default
+    :return: function decoding a JSON document
+    """
+    if name is None:
+        name = next(name for name in PREFERRED_DECODERS if name in DECODERS)
+    if name not in DECODERS:
+        raise ValueError(
+            "JSON decoder {} is not installed, available: {}".format(
+                name, ", ".join(sorted(DECODERS))
+            )
+        )
+    return DECODERS[name]
@@ -0,0 +1,274 @@
+"""
+Timing events and cumulative statistics of the Run Registry clients
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+QUERY_ID_PATTERN = re.compile(r"/query/([^/?]+)")
+REQUEST_NAME_PATTERN = re.compile(
+    r"/query/[^/?]+/(?:(page)/[^?]*|(count)|(data))(?:\?.*)?$"
+)
+
+
+class Event:
+    """
+    One HTTP call or post-processing stage of a client
+
+    HTTP calls are named after the requested resource (query, count, page,
+    data or request), stages after the processing step, e.g. decode or
+    list_to_dict. Attributes that do not apply are None.
+    """
+
+    __slots__ = (
+        "name",
+        "query_id",
+        "timestamp",
+        "seconds",
+        "status",
+        "bytes",
+        "rows",
+        "error",
+    )
+
+    def __init__(self, name, query_id=None):
+        self.name = name
+        self.query_id = query_id
+        self.timestamp = time.time()
+        self.seconds = None
+        self.status = None
+        self.bytes = None
+        self.rows = None
+        self.error = None
+
+    def __repr__(self):
+        return (
+            "Event(name={!r}, query_id={!r}, seconds={:.6f}, status={}, "
+            "bytes={}, rows={}, error={!r})".format(
+                self.name,
+                self.query_id,
+                self.seconds or 0.0,
+                self.status,
+                self.bytes,
+                self.rows,
+                self.error,
+            )
+        )
+
+
+def request_name(method, url):
+    """
+    Example:
+    >>> request_name("post", "http://vocms00170:2113/query?")
+    'query'
+    >>> request_name("get", "http://vocms00170:2113/query/o1662d3e8bb1/page/1000/2/data")
+    'page'
+    >>> request_name("get", "http://vocms00170:2113/query/o1662d3e8bb1/count?n__min=1")
+    'count'
+    >>> request_name("get", "http://vocms00170:2113/info")
+    'request'
+
+    :param method: HTTP method name
+    :param url: requested url
+    :return: name of the HTTP call
+    """
+    if method == "post":
+        return "query"
+    match = REQUEST_NAME_PATTERN.search(url)
+    if match is None:
+        return "request"
+    return next(name for name in match.groups() if name)
+
+
+def query_id_of(url):
+    """
+    Example:
+    >>> query_id_of("http://vocms00170:2113/query/o1662d3e8bb1/count")
+    'o1662d3e8bb1'
+
+    :return: query id contained in the url or None
+    """
+    match = QUERY_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+class ClientStatistics:
+    """
+    Cumulative statistics of the HTTP calls and result cache of one client
+    """
+
+    def __init__(self, window=1000):
+        """
+        :param window: number of latencies kept for the percentiles
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.bytes = 0
+            self.cache_hits = 0
+            self.cache_misses = 0
+            self.query_id_hits = 0
+            self.latencies = deque(maxlen=self.window)
+
+    def record_request(self, seconds, size, failed=False):
+        with self._lock:
+            self.requests += 1
+            self.errors += failed
+            self.bytes += size
+            self.latencies.append(seconds)
+
+    def record_cache(self, hit):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def record_query_id_hit(self):
+        with self._lock:
+            self.query_id_hits += 1
+
+    def percentile(self, percent):
+        """
+        :param percent: percentile between 0 and 100
+        :return: latency percentile of the recent requests in seconds,
+        None without requests
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        index = max(0, math.ceil(percent / 100 * len(latencies)) - 1)
+        return latencies[index]
+
+    def as_dict(self):
+        """
+        :return: dictionary of requests, errors, bytes, cache_hits,
+        cache_misses, query_id_hits, p50 and p95 latency in seconds
+        """
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "query_id_hits": self.query_id_hits,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+        }
+
+
+class Instrumentation:
+    """
+    Hooks receiving an Event for every HTTP call and post-processing stage
+    of a client, and the cumulative ClientStatistics of the client
+
+    Hooks are callables taking the Event, e.g. to log the calls or to turn
+    them into tracing spans. Without hooks no events are created.
+
+    Example:
+    >>> instrumentation = Instrumentation()
+    >>> events = []
+    >>> hook = instrumentation.add_hook(events.append)
+    >>> with instrumentation.stage("list_to_dict", "o1662d3e8bb1") as event:
+    ...     event.rows = 5
+    >>> events[0].name, events[0].rows
+    ('list_to_dict', 5)
+    """
+
+    def __init__(self):
+        self.hooks = ()
+        self.statistics = ClientStatistics()
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """
+        :param hook: callable receiving every Event
+        :return: the hook
+        """
+        with self._lock:
+            self.hooks = self.hooks + (hook,)
+        return hook
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self.hooks = tuple(other for other in self.hooks if other is not hook)
+
+    def emit(self, event):
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception("Instrumentation hook {!r} failed".format(hook))
+
+    def record_request(self, method, url, start, response=None, error=None):
+        """
+        Updates the statistics and emits the event of an HTTP call
+
+        :param method: HTTP method name, get or post
+        :param url: requested url
+        :param start: time.perf_counter() before the call
+        :param response: requests.Response of the call
+        :param error: exception raised by the call
+        """
+        seconds = time.perf_counter() - start
+        size = len(response.content) if response is not None else 0
+        failed = error is not None or not response.ok
+        self.statistics.record_request(seconds, size, failed)
+        if not self.hooks:
+            return
+
+        event = Event(request_name(method, url), query_id_of(url))
+        event.timestamp -= seconds
+        event.seconds = seconds
+        event.bytes = size
+        if response is not None:
+            event.status = response.status_code
+            if method == "post" and response.status_code == 200:
+                event.query_id = response.text
+        if error is not None:
+            event.error = error.__class__.__name__
+        self.emit(event)
+
+    @contextmanager
+    def stage(self, name, query_id=None):
+        """
+        Times the enclosed post-processing stage.
+
+        Yields the Event to set its rows or query id, None without hooks.
+
+        :param name: name of the stage, e.g. decode or list_to_dict
+        :param query_id: query id the stage belongs to
+        """
+        if not self.hooks:
+            yield None
+            return
+
+        event = Event(name, query_id)
+        start = time.perf_counter()
+        try:
+            yield event
+        except Exception as e:
+            event.error = e.__class__.__name__
+            raise
+        finally:
+            event.seconds = time.perf_counter() - start
+            self.emit(event)
+
+
+def log_event(event):
+    """
+    Hook logging every event on the debug level
+    """
+    logger.debug(repr(event))
@@ -0,0 +1,144 @@
+"""
+Streaming output of query results
+"""
+import json
+import sys
+import time
+
+from runregistry.utilities import media_type_dict
+
+
+class Progress:
+    """
+    Reports the progress and throughput of a download on stderr
+
+    Only counts the rows when the stream is None.
+    """
+
+    def __init__(self, stream=sys.stderr, interval=0.5):
+        self.stream = stream
+        self.interval = interval
+        self.start = time.monotonic()
+        self.last_report = 0.0
+        self.rows = 0
+
+    def update(self, rows, total=None):
+        self.rows += rows
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self._report(now, total)
+
+    def finish(self, total=None):
+        self._report(time.monotonic(), total)
+        if self.stream is not None:
+            self.stream.write("\n")
+
+    def _report(self, now, total):
+        if self.stream is None:
+            return
+        elapsed = max(now - self.start, 1e-9)
+        of_total = "/{}".format(total) if total is not None else ""
+        self.stream.write(
+            "\r{}{} rows in {:.1f}s ({:.0f} rows/s)".format(
+                self.rows, of_total, elapsed, self.rows / elapsed
+            )
+        )
+        self.stream.flush()
+
+
+def _row_count(client):
+    plan = client.last_query_plan
+    return plan.count if plan is not None else None
+
+
+def _count_lines(page, start=0):
+    """
+    Example:
+    >>> _count_lines(b"RUNNUMBER\\n247073\\n247076"), _count_lines(b"RUNNUMBER\\n", 10)
+    (3, 0)
+
+    :param page: bytes
+    :param start: index of the first counted byte
+    :return: amount of lines in page[start:]
+    """
+    unterminated = len(page) > start and not page.endswith(b"\n")
+    return page.count(b"\n", start) + unterminated
+
+
+def write_csv(client, query, output, progress, workers):
+    """
+    Writes the CSV pages rendered by the Run Registry, keeping only the header
+    of the first page. A page not ending with a line break is separated from
+    the rows of the next page by one.
+
+    The pages are written without decoding them if the output has a binary
+    buffer, like files and sys.stdout.
+    """
+    binary = getattr(output, "buffer", None)
+    if binary is not None:
+        output.flush()
+    pages = client.iter_query_pages(query, media_type_dict["csv"], workers, raw=True)
+    terminated = True
+    for number, page in enumerate(pages):
+        start = 0
+        if number > 0:
+            start = page.find(b"\n") + 1 or len(page)
+        if start < len(page):
+            separator = b"" if terminated else b"\n"
+            terminated = page.endswith(b"\n")
+            if binary is not None:
+                binary.write(separator)
+                binary.write(memoryview(page)[start:])
+            else:
+                output.write((separator + page[start:]).decode("utf-8"))
+        rows = _count_lines(page, start) - (number == 0)
+        progress.update(max(rows, 0), _row_count(client))
+
+
+def write_jsonl(client, query, output, progress, workers):
+    """
+    Writes one JSON array per row
+    """
+    for page in client.iter_query_pages(query, read_ahead=workers):
+        output.writelines(json.dumps(row) + "\n" for row in page)
+        progress.update(len(page), _row_count(client))
+
+
+def write_json(client, query, output, progress, workers):
+    """
+    Writes the result as {"data": [...]}, like execute_query
+    """
+    output.write('{"data": [')
+    separator = "\n"
+    for page in client.iter_query_pages(query, read_ahead=workers):
+        for row in page:
+            output.write(separator + json.dumps(row))
+            separator = ",\n"
+        progress.update(len(page), _row_count(client))
+    output.write("\n]}\n")
+
+
+STREAM_WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "json": write_json}
+
+
+def stream_query(client, query, output_format, output, workers, progress=None):
+    """
+    Streams the result of a query into a file while its pages arrive,
+    so only a few pages are held in memory at any time
+
+    :param client: RunRegistryClient
+    :param query: SQL query string
+    :param output_format: csv, jsonl or json
+    :param output: writable text file
+    :param workers: amount of pages downloaded concurrently
+    :param progress: Progress reporting the amount of written rows
+    :raises requests.ConnectionError: if the result could not be downloaded
+    :raises runregistry.client.PageNotAvailable: if a page failed
+    """
+    progress = progress or Progress()
+    STREAM_WRITERS[output_format](client, query, output, progress, workers)
+    plan = client.last_query_plan
+    if plan is not None and plan.error is not None:
+        raise plan.error
+    progress.finish(_row_count(client))
@@ -0,0 +1,143 @@
+"""
+Adaptive page sizes of paged query downloads
+"""
+import re
+import threading
+
+from runregistry.cache import LRUCache
+from runregistry.utilities import normalize_query
+
+WHERE_PATTERN = re.compile(r"\bwhere\b", re.IGNORECASE)
+
+
+def query_shape(query):
+    """
+    Queries of the same shape select the same columns from the same tables,
+    so that their rows have about the same width
+
+    Example:
+    >>> query_shape("select r.runnumber, r.lhcfill from runreg_tracker.runs r where r.runnumber > 320000")
+    'select r.runnumber, r.lhcfill from runreg_tracker.runs r'
+
+    :param query: SQL query string
+    :return: query without its where clause
+    """
+    return WHERE_PATTERN.split(normalize_query(query), 1)[0].strip().lower()
+
+
+class PageSizeController:
+    """
+    Chooses the page size of paged JSON downloads per query shape
+
+    The size of every downloaded page is measured. Page sizes grow while full
+    pages arrive fast and stay small, they shrink when pages are slow, large
+    or fail. The best size of each query shape is remembered for the
+    following pages and queries, sizes that failed are not tried again.
+
+    All sizes are min_size multiplied by a power of two, so that a page can
+    always be split into two pages of the next smaller size.
+
+    Example:
+    >>> controller = PageSizeController(initial_size=1000, target_seconds=2.0)
+    >>> query = "select r.runnumber from runreg_tracker.runs r where r.runnumber > 1"
+    >>> controller.record(query, 1000, rows=1000, seconds=0.2, size=20000)
+    >>> controller.page_size(query)
+    2000
+    >>> controller.record_failure(query, 2000)
+    >>> controller.record(query, 1000, rows=1000, seconds=0.2, size=20000)
+    >>> controller.page_size(query)
+    1000
+    """
+
+    DEFAULT_MAX_BYTES = 16 * 2 ** 20
+
+    def __init__(
+        self,
+        initial_size=1000,
+        min_size=125,
+        max_size=64000,
+        target_seconds=2.0,
+        max_bytes=DEFAULT_MAX_BYTES,
+        maxsize=256,
+    ):
+        """
+        :param initial_size: page size of unknown query shapes
+        :param min_size: smallest page size
+        :param max_size: largest page size accepted by the Run Registry
+        :param target_seconds: download time of a page that is not exceeded
+        :param max_bytes: size of a page response that is not exceeded
+        :param maxsize: maximum number of remembered query shapes
+        """
+        self.min_size = min_size
+        self.max_size = max_size
+        self.initial_size = self._round(initial_size)
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.sizes = LRUCache(maxsize=maxsize)
+        self.limits = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def _round(self, size):
+        """
+        :return: largest valid page size not above size
+        """
+        rounded = self.min_size
+        while rounded * 2 <= min(size, self.max_size):
+            rounded *= 2
+        return rounded
+
+    def page_size(self, query):
+        """
+        :param query: SQL query string
+        :return: page size used for the next page of the query
+        """
+        return self.sizes.get(query_shape(query), self.initial_size)
+
+    def aligned_page_size(self, query, offset):
+        """
+        :param query: SQL query string
+        :param offset: number of rows preceding the page
+        :return: largest page size up to page_size(query) that starts a page
+        at the offset
+        """
+        size = self.page_size(query)
+        while offset % size and size > self.min_size:
+            size //= 2
+        return size
+
+    def record(self, query, page_size, rows, seconds, size):
+        """
+        Adapts the page size of the query shape to a downloaded page
+
+        :param query: SQL query string
+        :param page_size: requested page size
+        :param rows: amount of rows of the page
+        :param seconds: download and decoding time of the page
+        :param size: size of the page response in bytes
+        """
+        key = query_shape(query)
+        with self._lock:
+            current = self.sizes.get(key, self.initial_size)
+            if page_size != current:
+                return  # Measured with an outdated page size
+            if seconds > self.target_seconds or size > self.max_bytes:
+                self.sizes.set(key, max(self.min_size, current // 2))
+            elif (
+                rows == page_size
+                and seconds < self.target_seconds / 2
+                and size < self.max_bytes / 2
+            ):
+                limit = self.limits.get(key, self.max_size)
+                self.sizes.set(key, self._round(min(current * 2, limit)))
+
+    def record_failure(self, query, page_size):
+        """
+        Halves the page size of the query shape after a timeout or server
+        error and keeps it from growing to the failed size again
+        """
+        key = query_shape(query)
+        with self._lock:
+            limit = max(self.min_size, page_size // 2)
+            self.limits.set(key, min(limit, self.limits.get(key, self.max_size)))
+            current = self.sizes.get(key, self.initial_size)
+            self.sizes.set(key, min(current, limit))
@@ -1,8 +1,56 @@
+import asyncio
+import gc
+import io
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
 import unittest
+import weakref
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from unittest.mock import MagicMock
 
-from runregistry.client import RunRegistryClient
-from runregistry.utilities import list_as_comma_separated_string, list_to_dict
+import requests
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from benchmarks.server import FakeResthub
+from runregistry.aio import AsyncRunRegistryClient
+from runregistry.batch import parse_sql_batch, run_batch, summary
+from runregistry.cache import ResultCache
+from runregistry.cli import parse_arguments
+from runregistry.daemon import RunRegistryDaemon, forward, is_running
+from runregistry.output import Progress, stream_query
+from runregistry.paging import PageSizeController
+from runregistry.client import (
+    RunRegistryClient,
+    PageNotAvailable,
+    QueryIdNotFound,
+    QueryPlan,
+)
+from runregistry.decoding import DECODERS, get_decoder
+from runregistry.tracker.client import TrackerRunRegistryClient
+from runregistry.transport import HedgedTransport, Transport
+from runregistry.utilities import (
+    list_as_comma_separated_string,
+    list_to_dict,
+    list_to_records,
+    record_class,
+    build_chunked_where_clauses,
+    encode_parameters,
+    query_parameters,
+)
 
 
 class TestRunRegistryClient(unittest.TestCase):
@@ -29,9 +77,817 @@ class TestRunRegistryClient(unittest.TestCase):
         self.assertEqual(expected_response, response)
         runregistry._get_query_id.assert_called_with(query)
         runregistry._get_json_response.assert_called_with(
+            "/query/o1662d3e8bb1/page/1000/1/data"
+        )
+
+    def test_client_registry(self):
+        default = RunRegistryClient()
+        alternative = RunRegistryClient(RunRegistryClient.ALTERNATIVE_URL)
+        tracker = TrackerRunRegistryClient(RunRegistryClient.ALTERNATIVE_URL)
+
+        self.assertIs(default, RunRegistryClient(url=RunRegistryClient.DEFAULT_URL))
+        self.assertIs(alternative, RunRegistryClient(RunRegistryClient.ALTERNATIVE_URL))
+        self.assertEqual(RunRegistryClient.ALTERNATIVE_URL, alternative.url)
+        self.assertIsNot(default.transport, alternative.transport)
+        self.assertIsNot(default.query_ids, alternative.query_ids)
+        self.assertIs(alternative.transport, tracker.transport)
+        self.assertIsNot(alternative.query_ids, tracker.query_ids)
+
+    def test_client_registry_releases_clients(self):
+        client = RunRegistryClient("http://localhost:2113", Transport(pool_size=1))
+        tracker = TrackerRunRegistryClient("http://localhost:2113")
+        reference = weakref.ref(client)
+        transport = tracker.transport
+        del client
+        gc.collect()
+
+        self.assertIsNone(reference())
+        self.assertIs(transport, RunRegistryClient("http://localhost:2113").transport)
+
+    def test_client_registry_threads(self):
+        clients = []
+        barrier = threading.Barrier(8)
+
+        def create_client():
+            barrier.wait()
+            clients.append(RunRegistryClient("http://localhost:2113"))
+
+        threads = [threading.Thread(target=create_client) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len({id(client) for client in clients}))
+
+    def test_execute_query_request_plan(self):
+        runregistry = RunRegistryClient()
+        vars(runregistry).pop("_get_query_id", None)
+        runregistry.query_ids.clear()
+        transport = runregistry.transport
+        runregistry.transport = MagicMock()
+        runregistry.transport.post.return_value.status_code = 200
+        runregistry.transport.post.return_value.text = "o1662d3e8bb1"
+        runregistry._get_count = MagicMock(return_value=5)
+        runregistry._get_json_response = MagicMock(return_value={"data": [[1]] * 5})
+
+        json_response = runregistry.execute_query("select 1")
+        first_plan = runregistry.last_query_plan
+        runregistry.execute_query("select 1")
+        second_plan = runregistry.last_query_plan
+        csv_response = runregistry.execute_query("select 1", "text/csv")
+        csv_plan = runregistry.last_query_plan
+        runregistry.transport = transport
+
+        self.assertEqual({"data": [[1]] * 5}, json_response)
+        self.assertEqual(3, first_plan.http_calls)
+        self.assertEqual(2, second_plan.http_calls)
+        self.assertEqual(2, csv_plan.http_calls)
+        self.assertEqual({"data": [[1]] * 5}, csv_response)
+        runregistry._get_json_response.assert_called_with(
+            "/query/o1662d3e8bb1/data", "text/csv", False
+        )
+
+    def test_get_paged_json_response(self):
+        runregistry = RunRegistryClient()
+        runregistry.row_limit = 2
+        runregistry.max_workers = 3
+
+        def get_page(resource, media_type=None):
+            page = int(resource.split("/")[-2])
+            return {"data": [[page, 1], [page, 2]][: 5 - 2 * (page - 1)]}
+
+        runregistry._get_count = MagicMock(return_value=5)
+        runregistry._get_json_response = MagicMock(side_effect=get_page)
+
+        response = runregistry._get_paged_json_response("o1662d3e8bb1")
+        runregistry.row_limit = 1000
+
+        expected_response = {"data": [[1, 1], [1, 2], [2, 1], [2, 2], [3, 1]]}
+        self.assertEqual(expected_response, response)
+        self.assertEqual(3, runregistry._get_json_response.call_count)
+        runregistry._get_json_response.assert_any_call(
+            "/query/o1662d3e8bb1/page/2/3/data"
+        )
+
+    def test_execute_query_without_rows(self):
+        runregistry = RunRegistryClient()
+        runregistry._get_query_id = MagicMock(return_value="o1662d3e8bb1")
+        runregistry._get_count = MagicMock(return_value=5)
+        runregistry._get_json_response = MagicMock(return_value={})
+
+        with self.assertLogs("runregistry.client", "ERROR") as logs:
+            response = runregistry.execute_query("select 1")
+        del runregistry._get_query_id
+        del runregistry._get_count
+        del runregistry._get_json_response
+
+        self.assertEqual({}, response)
+        self.assertIn("Page 1 of 1000 rows of query id o1662d3e8bb1", logs.output[0])
+
+    def test_requests_use_transport(self):
+        runregistry = RunRegistryClient()
+        transport = runregistry.transport
+        runregistry.transport = MagicMock()
+        runregistry.transport.post.return_value.status_code = 200
+        runregistry.transport.post.return_value.text = "o1662d3e8bb1"
+        runregistry.transport.get.return_value.json.return_value = 5
+
+        query_id = RunRegistryClient._get_query_id(runregistry, "select 1")
+        count = RunRegistryClient._get_count(runregistry, query_id)
+        runregistry.transport = transport
+
+        self.assertEqual("o1662d3e8bb1", query_id)
+        self.assertEqual(5, count)
+
+    def test_decode_json(self):
+        runregistry = RunRegistryClient()
+        transport = runregistry.transport
+        runregistry.transport = MagicMock()
+        runregistry.transport.get.return_value.content = b'{"data": [[247073]]}'
+        decode_json = runregistry.decode_json
+
+        runregistry.decode_json = get_decoder("json")
+        decoded = runregistry._get_json_response("/query/o1662d3e8bb1/data")
+        raw = runregistry._get_json_response(
+            "/query/o1662d3e8bb1/data", "text/csv", True
+        )
+        runregistry.decode_json = MagicMock(side_effect=ValueError("invalid"))
+        invalid = runregistry._get_json_response("/query/o1662d3e8bb1/data")
+        runregistry.transport = transport
+        runregistry.decode_json = decode_json
+
+        self.assertEqual({"data": [[247073]]}, decoded)
+        self.assertEqual(b'{"data": [[247073]]}', raw)
+        self.assertEqual({}, invalid)
+        self.assertIn("json", DECODERS)
+        with self.assertRaises(ValueError):
+            get_decoder("unknown")
+
+    def test_transport_session(self):
+        transport = Transport(pool_size=4, timeout=5)
+        adapter = transport.session.get_adapter(RunRegistryClient.DEFAULT_URL)
+
+        self.assertEqual(4, adapter._pool_maxsize)
+        self.assertIn("gzip", transport.session.headers["Accept-Encoding"])
+        self.assertEqual("keep-alive", transport.session.headers["Connection"])
+        transport.close()
+
+    def test_iter_query(self):
+        runregistry = RunRegistryClient()
+        runregistry.row_limit = 2
+
+        def get_page(resource, media_type=None):
+            page = int(resource.split("/")[-2])
+            return {"data": [[page, 1], [page, 2]][: 5 - 2 * (page - 1)]}
+
+        runregistry.connection_possible = MagicMock(return_value=True)
+        runregistry._get_query_id = MagicMock(return_value="o1662d3e8bb1")
+        runregistry._get_count = MagicMock(return_value=5)
+        runregistry._get_json_response = MagicMock(side_effect=get_page)
+
+        rows = list(runregistry.iter_query("select 1", read_ahead=True))
+        batches = list(runregistry.iter_query("select 1", batch_size=3))
+        concurrent_rows = list(runregistry.iter_query("select 1", read_ahead=4))
+        runregistry.row_limit = 1000
+
+        expected_rows = [[1, 1], [1, 2], [2, 1], [2, 2], [3, 1]]
+        self.assertEqual(expected_rows, rows)
+        self.assertEqual([expected_rows[:3], expected_rows[3:]], batches)
+        self.assertEqual(expected_rows, concurrent_rows)
+        self.assertEqual(9, runregistry._get_json_response.call_count)
+
+    def test_query_id_cache(self):
+        runregistry = RunRegistryClient()
+        vars(runregistry).pop("_get_query_id", None)
+        runregistry.query_ids.clear()
+        transport = runregistry.transport
+        runregistry.transport = MagicMock()
+        runregistry.transport.post.return_value.status_code = 200
+        runregistry.transport.post.return_value.text = "o1662d3e8bb1"
+        runregistry._get_count = MagicMock(side_effect=[3, QueryIdNotFound(), 3])
+
+        first = QueryPlan("select  1", speculative=False)
+        second = QueryPlan("select 1 ", speculative=False)
+        runregistry._register_query(first)
+        runregistry._register_query(second)
+        post_count = runregistry.transport.post.call_count
+        runregistry.transport = transport
+
+        self.assertEqual(("o1662d3e8bb1", 3), (first.query_id, first.count))
+        self.assertEqual(("o1662d3e8bb1", 3), (second.query_id, second.count))
+        self.assertEqual(2, first.http_calls)
+        self.assertEqual(3, second.http_calls)
+        self.assertEqual(2, post_count)
+        self.assertEqual(3, runregistry._get_count.call_count)
+
+    def test_recover_from_connection_error(self):
+        server = StubRunRegistry()
+        transport = Transport(pool_size=1)
+        client = RunRegistryClient(server.url, transport)
+        transport.get = MagicMock(side_effect=requests.ConnectionError)
+
+        failed = client.execute_query("select 1 from dual")
+        del transport.get
+        recovered = client.execute_query("select 1 from dual")
+        server.stop()
+
+        self.assertEqual({}, failed)
+        self.assertEqual({"data": [[server.server_address[1]]]}, recovered)
+        self.assertTrue(client.connection_possible())
+
+    def test_prepared_query(self):
+        runregistry = RunRegistryClient()
+        vars(runregistry).pop("_get_query_id", None)
+        runregistry.query_ids.clear()
+        transport = runregistry.transport
+        runregistry.transport = MagicMock()
+        runregistry.transport.post.return_value.status_code = 200
+        runregistry.transport.post.return_value.text = "o1662d3e8bb1"
+        runregistry._get_count = MagicMock(return_value=1)
+        runregistry._get_json_response = MagicMock(return_value={"data": [[2]]})
+
+        query = runregistry.prepare(
+            "select r.runnumber from runreg_global.runs r "
+            "where r.runnumber >= :n__min and r.runnumber <= :n__max"
+        )
+        first = query.execute(n__min=1, n__max=2)
+        second = query.execute(n__min=2, n__max=3)
+        plan = runregistry.last_query_plan
+        post_count = runregistry.transport.post.call_count
+        count_call = runregistry._get_count.call_args
+        page_call = runregistry._get_json_response.call_args
+        runregistry.transport = transport
+        del runregistry._get_count
+        del runregistry._get_json_response
+
+        self.assertEqual(["n__max", "n__min"], query.parameters)
+        self.assertEqual({"data": [[2]]}, first)
+        self.assertEqual(first, second)
+        self.assertEqual(1, post_count)
+        self.assertEqual(2, plan.http_calls)
+        self.assertEqual(("o1662d3e8bb1", "?n__max=3&n__min=2"), count_call[0])
+        self.assertEqual(
+            "/query/o1662d3e8bb1/page/1000/1/data?n__max=3&n__min=2", page_call[0][0]
+        )
+        with self.assertRaises(ValueError):
+            query.execute(n__min=1)
+
+    def test_execute_query_result_cache(self):
+        runregistry = RunRegistryClient()
+        runregistry.result_cache = ResultCache(tempfile.mkdtemp())
+        runregistry._execute_query = MagicMock(return_value={"data": [[247073]]})
+
+        first = runregistry.execute_query("select 1")
+        second = runregistry.execute_query("select  1")
+        refreshed = runregistry.execute_query("select 1", refresh=True)
+        call_count = runregistry._execute_query.call_count
+        runregistry.result_cache.close()
+        runregistry.result_cache = None
+        del runregistry._execute_query
+
+        self.assertEqual({"data": [[247073]]}, first)
+        self.assertEqual(first, second)
+        self.assertEqual(first, refreshed)
+        self.assertEqual(2, call_count)
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_execute_query_columnar(self):
+        runregistry = RunRegistryClient()
+        pages = [[[1, 1, "a"], [2, None, None]], [[3, 0, "c"]]]
+        runregistry.iter_query_pages = MagicMock(return_value=iter(pages))
+
+        columns = runregistry.execute_query_columnar(
+            "select 1", ["x", "flag", "name"], {"x": "int64", "flag": "bool"}
+        )
+        del runregistry.iter_query_pages
+
+        self.assertEqual([1, 2, 3], columns["x"].tolist())
+        self.assertEqual("int64", columns["x"].dtype.name)
+        self.assertEqual([True, False, False], columns["flag"].tolist())
+        self.assertEqual(["a", None, "c"], columns["name"].tolist())
+
+
+class StubRunRegistry(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    Local resthub stub answering every query with one row after a delay
+    """
+
+    daemon_threads = True
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []
+        super().__init__(("127.0.0.1", 0), StubRunRegistryHandler)
+        threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        ).start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StubRunRegistryHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def answer(self, body):
+        self.server.requests.append(self.command + " " + self.path)
+        time.sleep(self.server.delay)
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.answer("qid1")
+
+    def do_GET(self):
+        if self.path.endswith("/count"):
+            self.answer("1")
+        else:
+            self.answer(json.dumps({"data": [[self.server.server_address[1]]]}))
+
+
+class TestHedgedTransport(unittest.TestCase):
+    def setUp(self):
+        self.slow = StubRunRegistry(delay=0.5)
+        self.fast = StubRunRegistry()
+
+    def tearDown(self):
+        self.slow.stop()
+        self.fast.stop()
+
+    def test_hedged_get(self):
+        transport = HedgedTransport([self.slow.url, self.fast.url], hedge_delay=0.05)
+
+        start = time.monotonic()
+        response = transport.get(self.slow.url + "/query/qid1/count")
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(1, response.json())
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(["GET /query/qid1/count"], self.fast.requests)
+        self.assertEqual(self.fast.url, transport.ranked_endpoints()[0].url)
+        transport.close()
+
+    def test_failover_and_deadline(self):
+        self.slow.stop()
+        dead_url = self.slow.url
+        transport = HedgedTransport(
+            [dead_url, self.fast.url], hedge_delay=10, backoff=0.01
+        )
+
+        response = transport.get(dead_url + "/query/qid1/count")
+
+        self.assertEqual(1, response.json())
+        self.assertEqual(self.fast.url, transport.ranked_endpoints()[0].url)
+        transport.close()
+
+        transport = HedgedTransport([dead_url], retries=10, backoff=0.1, deadline=0.5)
+        start = time.monotonic()
+        with self.assertRaises(requests.ConnectionError):
+            transport.get(dead_url + "/query/qid1/count")
+        self.assertLess(time.monotonic() - start, 1)
+        transport.close()
+
+    def test_execute_query(self):
+        transport = HedgedTransport([self.slow.url, self.fast.url], hedge_delay=0.05)
+        client = RunRegistryClient(self.slow.url, transport)
+
+        response = client.execute_query("select r.runnumber from runreg_global.runs r")
+
+        self.assertEqual({"data": [[self.fast.server_address[1]]]}, response)
+        self.assertIn("POST /query", self.slow.requests)
+        self.assertIn("POST /query", self.fast.requests)
+        transport.close()
+
+    def test_query_ids_per_endpoint(self):
+        first, second = FakeResthub(rows=3).start(), FakeResthub(rows=3).start()
+
+        def register(query):
+            query_id = FakeResthub.register(second, query)
+            second.queries["b" + query_id] = second.queries.pop(query_id)
+            return "b" + query_id
+
+        second.register = register
+        transport = HedgedTransport([first.url, second.url], hedge_delay=0.05)
+        client = RunRegistryClient(first.url, transport)
+        query = "select r.runnumber from runreg_global.runs r"
+
+        response = client.execute_query(query)
+        query_ids = transport.query_ids.get(client.query_ids.get(query))
+        while len(query_ids) < 2:
+            time.sleep(0.01)
+        issuer = first if client.query_ids.get(query) in first.queries else second
+        other = second if issuer is first else first
+        issuer.stop()
+        transport.session.close()  # Drops the kept alive connections to it
+        cached = client.execute_query(query)
+        plan = client.last_query_plan
+        other.stop()
+        transport.close()
+
+        self.assertEqual(3, len(response["data"]))
+        self.assertEqual(response, cached)
+        self.assertEqual(2, plan.http_calls)  # Not registered again
+        self.assertNotEqual(query_ids[first.url], query_ids[second.url])
+
+
+class TestPageSizeController(unittest.TestCase):
+    def setUp(self):
+        self.client = RunRegistryClient("http://127.0.0.1:2", Transport(pool_size=1))
+        self.client.page_sizes = PageSizeController(initial_size=1000, min_size=250)
+        self.client._get_query_id = MagicMock(return_value="o1662d3e8bb1")
+        self.client._get_count = MagicMock(return_value=10000)
+        self.page_sizes = []
+
+    def get_page(self, resource, media_type=None):
+        page_size, page = [int(part) for part in resource.split("/")[-3:-1]]
+        self.page_sizes.append(page_size)
+        if page_size > self.max_page_size:
+            return {}
+        start = (page - 1) * page_size
+        return {"data": [[row] for row in range(start, min(start + page_size, 10000))]}
+
+    def test_growing_page_size(self):
+        self.max_page_size = 64000
+        self.client._get_json_response = MagicMock(side_effect=self.get_page)
+
+        rows = list(self.client.iter_query("select r.runnumber from r where 1 = 1"))
+        plan = self.client.last_query_plan
+        response = self.client.execute_query("select r.runnumber from r where 2 = 2")
+
+        self.assertEqual([[row] for row in range(10000)], rows)
+        self.assertEqual(rows, response["data"])
+        self.assertEqual([1000, 1000, 2000, 4000, 8000], self.page_sizes[:5])
+        self.assertEqual(7, plan.http_calls)
+        self.assertEqual([8000, 8000], self.page_sizes[5:])
+
+    def test_splitting_failed_pages(self):
+        self.max_page_size = 500
+        self.client._get_json_response = MagicMock(side_effect=self.get_page)
+
+        rows = list(self.client.iter_query("select r.runnumber from r", read_ahead=2))
+
+        self.assertEqual([[row] for row in range(10000)], rows)
+        self.assertEqual([1000, 500, 500], self.page_sizes[:3])
+        self.assertEqual(
+            500, self.client.page_sizes.page_size("select r.runnumber from r")
+        )
+
+    def test_failing_min_size_page(self):
+        self.max_page_size = 100
+        self.client._get_json_response = MagicMock(side_effect=self.get_page)
+
+        with self.assertRaisesRegex(PageNotAvailable, "Page 1 of 250 rows"):
+            list(self.client.iter_query("select r.runnumber from r"))
+        with self.assertLogs("runregistry.client", "ERROR"):
+            self.assertEqual({}, self.client.execute_query("select r.runnumber from r"))
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_events_and_statistics(self):
+        server = StubRunRegistry()
+        client = RunRegistryClient(server.url, Transport(pool_size=2))
+        events = []
+        hook = client.instrumentation.add_hook(events.append)
+
+        client.execute_query("select r.runnumber from runreg_global.runs r")
+        client.execute_query("select r.runnumber from runreg_global.runs r")
+        client.instrumentation.remove_hook(hook)
+        client.execute_query("select r.runnumber from runreg_global.runs r")
+        statistics = client.statistics.as_dict()
+        server.stop()
+
+        names = sorted(event.name for event in events[:4])
+        self.assertEqual(["count", "decode", "page", "query"], names)
+        self.assertEqual("execute_query", events[4].name)
+        self.assertEqual(9, len(events))
+        self.assertEqual({"qid1"}, {event.query_id for event in events})
+        self.assertEqual(1, events[4].rows)
+        page = next(event for event in events if event.name == "page")
+        page_size = len(json.dumps({"data": [[server.server_address[1]]]}))
+        self.assertEqual((200, page_size), (page.status, page.bytes))
+        self.assertEqual(7, statistics["requests"])
+        self.assertEqual(2, statistics["query_id_hits"])
+        self.assertEqual(0, statistics["errors"])
+        self.assertLessEqual(statistics["p50"], statistics["p95"])
+
+    def test_failing_hook(self):
+        client = RunRegistryClient("http://127.0.0.1:1", Transport(pool_size=1))
+        client.instrumentation.add_hook(MagicMock(side_effect=RuntimeError))
+
+        with self.assertLogs("runregistry.instrumentation", "ERROR"):
+            self.assertEqual({}, client.execute_query("select 1 from dual"))
+        self.assertEqual(1, client.statistics.errors)
+
+
+class TestCli(unittest.TestCase):
+    def stream(self, output_format, pages, output=None):
+        client = RunRegistryClient()
+        client._local.query_plan = None
+        client.iter_query_pages = MagicMock(return_value=iter(pages))
+        output, stderr = output or io.StringIO(), io.StringIO()
+
+        stream_query(client, "select 1", output_format, output, 4, Progress(stderr))
+        del client.iter_query_pages
+
+        self.assertIn(" rows in ", stderr.getvalue())
+        return output
+
+    def test_stream_csv(self):
+        pages = [b"RUN,FILL\n1,7000\n2,7000\n", b"RUN,FILL\n3,7001"]
+        binary_output = io.TextIOWrapper(io.BytesIO(), newline="")
+
+        output = self.stream("csv", pages).getvalue()
+        self.stream("csv", pages, binary_output)
+
+        self.assertEqual("RUN,FILL\n1,7000\n2,7000\n3,7001", output)
+        self.assertEqual(output.encode(), binary_output.buffer.getvalue())
+
+    def test_stream_csv_unterminated_pages(self):
+        pages = [
+            b"RUN,FILL\n1,7000",
+            b"RUN,FILL\n2,7000\n",
+            b"RUN,FILL\n",
+            b"RUN,FILL\n3,7001",
+        ]
+        binary_output = io.TextIOWrapper(io.BytesIO(), newline="")
+
+        output = self.stream("csv", pages).getvalue()
+        self.stream("csv", pages, binary_output)
+
+        self.assertEqual("RUN,FILL\n1,7000\n2,7000\n3,7001", output)
+        self.assertEqual(output.encode(), binary_output.buffer.getvalue())
+
+    def test_stream_csv_with_result_cache(self):
+        output = io.StringIO()
+        with FakeResthub(rows=2500) as server:
+            client = RunRegistryClient(server.url, Transport(pool_size=2))
+            client.result_cache = ResultCache(tempfile.mkdtemp(), ttl=60)
+            stream_query(client, "select 1 from dual", "csv", output, 2, Progress(None))
+            client.result_cache.close()
+
+        self.assertEqual(1 + 2500, len(output.getvalue().splitlines()))
+        self.assertEqual(3, client.last_query_plan.pages)
+        self.assertEqual(0, client.statistics.cache_misses)
+
+    def test_stream_csv_error_pages(self):
+        output = io.StringIO()
+        with FakeResthub(rows=1500, max_page_size=500) as server:
+            client = RunRegistryClient(server.url, Transport(pool_size=2))
+            with self.assertRaises(PageNotAvailable):
+                stream_query(client, "select 1 from dual", "csv", output, 2)
+            missing = client._get_json_response("/query/unknown/data", "text/csv")
+
+        self.assertEqual("", output.getvalue())
+        self.assertEqual({}, missing)
+
+    def test_stream_json(self):
+        pages = [[[1, 7000], [2, 7000]], [[3, 7001]]]
+
+        self.assertEqual(
+            {"data": pages[0] + pages[1]},
+            json.loads(self.stream("json", pages).getvalue()),
+        )
+        self.assertEqual(
+            [[1, 7000], [2, 7000], [3, 7001]],
+            [
+                json.loads(line)
+                for line in self.stream("jsonl", pages).getvalue().splitlines()
+            ],
+        )
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "requires Unix sockets")
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.server = StubRunRegistry()
+        self.client = RunRegistryClient(self.server.url, Transport(pool_size=2))
+        self.path = os.path.join(tempfile.mkdtemp(), "runreg.sock")
+        self.daemon = RunRegistryDaemon(self.path, self.client)
+        threading.Thread(
+            target=self.daemon.serve_forever, kwargs={"poll_interval": 0.05}
+        ).start()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.daemon.server_close()
+        self.server.stop()
+
+    def forward(self, *argv):
+        stdout, stderr = io.BytesIO(), io.BytesIO()
+        code = forward(parse_arguments(list(argv)), self.path, stdout, stderr)
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_forward(self):
+        port = self.server.server_address[1]
+        output = os.path.join(tempfile.mkdtemp(), "runs.csv")
+
+        first = self.forward("-q", "select 1 from dual", "-f", "json")
+        second = self.forward("-q", "select 1 from dual", "--format", "jsonl")
+        third = self.forward("-q", "select  1 from dual", "-o", output)
+
+        self.assertEqual((0, '{{"data": [[{}]]}}\n'.format(port).encode()), first[:2])
+        self.assertEqual((0, "[{}]\n".format(port).encode()), second[:2])
+        self.assertIn(b"1/1 rows in ", second[2])
+        self.assertEqual((0, b""), third[:2])
+        with open(output) as csv:
+            self.assertEqual('{{"data": [[{}]]}}'.format(port), csv.read())
+        self.assertEqual(
+            1, sum(request.startswith("POST") for request in self.server.requests)
+        )
+        self.assertEqual(2, self.client.statistics.query_id_hits)
+
+    def test_result_cache(self):
+        self.client.result_cache = ResultCache(tempfile.mkdtemp(), ttl=60)
+
+        first = self.forward("-q", "select 1 from dual", "-f", "csv")
+        second = self.forward("-q", "select  1 from dual", "-f", "csv")
+        streamed = self.forward("-q", "select 1 from dual", "--format", "jsonl")
+        cached = self.forward("-q", "select  1 from dual", "--format", "jsonl")
+        statistics = self.client.statistics.as_dict()
+        self.client.result_cache.close()
+        self.client.result_cache = None
+
+        self.assertEqual(first[:2], second[:2])
+        self.assertEqual(streamed[:2], cached[:2])
+        self.assertIn(b"1/1 rows in ", cached[2])
+        self.assertEqual((2, 2), (statistics["cache_hits"], statistics["cache_misses"]))
+        self.assertEqual(3 + 2, len(self.server.requests))
+        self.assertEqual(
+            1, sum(request.startswith("POST") for request in self.server.requests)
+        )
+
+    def test_no_daemon(self):
+        path = os.path.join(tempfile.mkdtemp(), "runreg.sock")
+        arguments = parse_arguments(["-q", "select 1 from dual"])
+
+        self.assertTrue(is_running(self.path))
+        self.assertFalse(is_running(path))
+        self.assertIsNone(forward(arguments, path))
+        with self.assertRaises(RuntimeError):
+            RunRegistryDaemon(self.path, self.client)
+
+
+class TestBatch(unittest.TestCase):
+    def test_run_batch(self):
+        server = StubRunRegistry()
+        client = RunRegistryClient(server.url, Transport(pool_size=4))
+        queries = parse_sql_batch(
+            "-- name: runs\nselect r.runnumber from runreg_tracker.runs r;\n"
+            "-- name: fills\nselect r.lhcfill from runreg_tracker.runs r;\n"
+        )
+        directory = tempfile.mkdtemp()
+
+        results = run_batch(client, queries, "jsonl", directory, parallel=2)
+        server.stop()
+
+        self.assertEqual(["runs", "fills"], [result.name for result in results])
+        self.assertEqual([1, 1], [result.rows for result in results])
+        self.assertEqual([None, None], [result.error for result in results])
+        with open(os.path.join(directory, "fills.jsonl")) as output:
+            self.assertEqual([server.server_address[1]], json.loads(output.read()))
+        self.assertIn("2 queries, 0 failed", summary(results))
+
+    def test_failed_queries(self):
+        batch = "select 1 from dual;\nselect 2 from dual;"
+        directory = tempfile.mkdtemp()
+        with FakeResthub(rows=1500, max_page_size=500) as server:
+            client = RunRegistryClient(server.url, Transport(pool_size=4))
+            paged = run_batch(client, parse_sql_batch(batch), "jsonl", directory)
+        server = StubRunRegistry()
+        client = RunRegistryClient(server.url, Transport(pool_size=4))
+        connected = run_batch(client, parse_sql_batch(batch), "csv", directory)
+        server.stop()
+        stopped = run_batch(client, parse_sql_batch(batch), "csv", directory)
+
+        self.assertIn("not available", paged[0].error)
+        self.assertIn("2 queries, 2 failed", summary(paged))
+        self.assertEqual([None, None], [result.error for result in connected])
+        self.assertEqual([0, 0], [result.rows for result in stopped])
+        self.assertTrue(all(result.error for result in stopped))
+        self.assertIn("2 queries, 2 failed", summary(stopped))
+
+
+class TestResultCache(unittest.TestCase):
+    def test_expiry_and_eviction(self):
+        cache = ResultCache(tempfile.mkdtemp(), max_entries=2)
+
+        cache.set("expired", {"data": []}, ttl=-1)
+        cache.set("a", "a,b\n1,2")
+        cache.set("b", {"data": [[2]]})
+        cache.get("a")
+        cache.set("c", {"data": [[3]]})
+
+        self.assertIsNone(cache.get("expired"))
+        self.assertEqual("a,b\n1,2", cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual({"data": [[3]]}, cache.get("c"))
+        cache.close()
+
+
+def async_mock(return_value=None, side_effect=None):
+    """
+    MagicMock that has to be awaited, calls are recorded in the mock attribute
+    """
+    mock = MagicMock(return_value=return_value, side_effect=side_effect)
+
+    async def coroutine(*args, **kwargs):
+        return mock(*args, **kwargs)
+
+    coroutine.mock = mock
+    return coroutine
+
+
+def run_async(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncRunRegistryClient(unittest.TestCase):
+    def test_execute_query(self):
+        runregistry = AsyncRunRegistryClient()
+
+        runregistry._get_query_id = async_mock(return_value="o1662d3e8bb1")
+        runregistry._get_json_response = async_mock(
+            return_value={"data": [[247073], [247076], [247077], [247078], [247079]]}
+        )
+        runregistry._get_count = async_mock(return_value=1)
+
+        query = (
+            "select r.runnumber from runreg_global.runs r "
+            "where r.run_class_name = 'Collisions15' "
+            "and r.runnumber > 247070 and r.runnumber < 247081"
+        )
+
+        response = run_async(runregistry.execute_query(query))
+        expected_response = {"data": [[247073], [247076], [247077], [247078], [247079]]}
+
+        self.assertEqual(expected_response, response)
+        runregistry._get_query_id.mock.assert_called_with(query)
+        runregistry._get_json_response.mock.assert_called_with(
             "/query/o1662d3e8bb1/data", None
         )
 
+    def test_get_paged_json_response(self):
+        runregistry = AsyncRunRegistryClient()
+        runregistry.row_limit = 2
+
+        def get_page(resource, media_type=None):
+            page = int(resource.split("/")[-2])
+            return {"data": [[page, 1], [page, 2]][: 5 - 2 * (page - 1)]}
+
+        runregistry._get_count = async_mock(return_value=5)
+        runregistry._get_json_response = async_mock(side_effect=get_page)
+
+        response = run_async(runregistry._get_paged_json_response("o1662d3e8bb1"))
+
+        expected_response = {"data": [[1, 1], [1, 2], [2, 1], [2, 2], [3, 1]]}
+        self.assertEqual(expected_response, response)
+        self.assertEqual(3, runregistry._get_json_response.mock.call_count)
+
+    @unittest.skipIf(aiohttp is None, "requires aiohttp")
+    def test_fake_resthub(self):
+        query = "select r.runnumber from runreg_global.runs r"
+
+        def rows(query):
+            return 2 if "dual" in query else 2500
+
+        async def execute(url):
+            async with AsyncRunRegistryClient(url) as runregistry:
+                csv = await runregistry.execute_query("select 1 from dual", "text/csv")
+                failed = await runregistry.execute_query(query)
+                runregistry.row_limit = 500
+                paged = await runregistry.execute_query(query)
+                with self.assertRaises(QueryIdNotFound):
+                    await runregistry._get_count("unknown")
+                missing = await runregistry._get_json_response(
+                    "/query/unknown/data", "text/csv"
+                )
+                return csv, failed, paged, missing
+
+        with FakeResthub(rows=rows, max_page_size=500) as server:
+            csv, failed, paged, missing = run_async(execute(server.url))
+
+        self.assertEqual(
+            ["COLUMN_0,COLUMN_1", "0,x", "1,x"], csv.replace("x" * 16, "x").splitlines()
+        )
+        self.assertEqual({}, failed)
+        self.assertEqual(list(range(2500)), [row[0] for row in paged["data"]])
+        self.assertEqual({}, missing)
+
 
 class TestUtilities(unittest.TestCase):
     def test_list_as_comma_separated_string(self):
@@ -52,3 +908,42 @@ class TestUtilities(unittest.TestCase):
         ]
 
         self.assertEqual(expected_dict_list, list_of_dicts)
+
+    def test_build_chunked_where_clauses(self):
+        run_numbers = list(range(1000, 2000)) + [2005, "2007", 2009, 2011]
+
+        where_clauses = build_chunked_where_clauses(run_numbers, "r.x", chunk_size=3)
+
+        expected_where_clauses = [
+            "(r.x >= '1000' and r.x <= '1999' or r.x in ('2005', '2007', '2009'))",
+            "r.x in ('2011')",
+        ]
+        self.assertEqual(expected_where_clauses, where_clauses)
+        self.assertEqual([], build_chunked_where_clauses([], "r.x"))
+        self.assertEqual(
+            ["r.x in ('a', 'b')"], build_chunked_where_clauses(["a", "b", "a"], "r.x")
+        )
+
+    def test_query_parameters(self):
+        query = (
+            "select r.a from runreg_tracker.runs r where r.b = ':s__c' "
+            "and r.d >= :n__min and r.e = :name and r.f = :n__min"
+        )
+
+        self.assertEqual(["n__min", "name"], query_parameters(query))
+        self.assertEqual("?s__name=a+b%27", encode_parameters({"s__name": "a b'"}))
+
+    def test_list_to_records(self):
+        list_of_lists = [["a", "b", "c"], [None, 999, "f"]]
+        Record = record_class("Record", ["x", "y", "z"])
+
+        records = list_to_records(list_of_lists, Record)
+
+        self.assertEqual(999, records[1].y)
+        self.assertEqual(999, records[1]["y"])
+        self.assertEqual("c", records[0][2])
+        self.assertIsNone(records[0].get("missing"))
+        self.assertRaises(KeyError, lambda: records[0]["missing"])
+        self.assertEqual(
+            list_to_dict(list_of_lists, ["x", "y", "z"])[0], dict(records[0].items())
+        )
@@ -0,0 +1,145 @@
+"""
+Asynchronous RunRegistry Client for the Tracker Workspace
+"""
+from runregistry.aio import AsyncRunRegistryClient
+from runregistry.tracker.queries import (
+    DATASET_RUNS_KEYS,
+    DATASET_LUMIS_KEYS,
+    ACTIVE_LUMI_RUNS_KEYS,
+    FILL_NUMBER_KEYS,
+    dataset_runs_query,
+    dataset_lumis_query,
+    active_lumi_runs_query,
+    fill_numbers_query,
+    unique_fill_numbers_query,
+    grouped_fill_numbers_query,
+)
+from runregistry.tracker.utilities import (
+    transform_lowstat_to_boolean,
+    group_runs_by_fill_number,
+)
+from runregistry.utilities import (
+    list_to_dict,
+    build_range_where_clause,
+    build_list_where_clause,
+)
+
+
+class AsyncTrackerRunRegistryClient(AsyncRunRegistryClient):
+    """
+    asyncio counterpart of the TrackerRunRegistryClient
+
+    Example:
+    >>> import asyncio
+    >>> async def main():
+    ...     async with AsyncTrackerRunRegistryClient() as client:
+    ...         return await client.get_runs_by_list(["323423"])
+    >>> asyncio.new_event_loop().run_until_complete(main())[0]["state"]
+    'COMPLETED'
+    """
+
+    async def _get_dataset_runs(self, where_clause):
+        query = dataset_runs_query(where_clause)
+        run_list = (await self.execute_query(query)).get("data", [])
+        run_dicts = list_to_dict(run_list, DATASET_RUNS_KEYS)
+        transform_lowstat_to_boolean(run_dicts)
+        return run_dicts
+
+    async def _get_dataset_lumis_runs(self, where_clause):
+        query = dataset_lumis_query(where_clause)
+        run_list = (await self.execute_query(query)).get("data", [])
+        return list_to_dict(run_list, DATASET_LUMIS_KEYS)
+
+    async def _get_dataset_runs_with_active_lumis(self, where_clause):
+        query = active_lumi_runs_query(where_clause)
+        run_list = (await self.execute_query(query)).get("data", [])
+        run_dict = list_to_dict(run_list, ACTIVE_LUMI_RUNS_KEYS)
+        transform_lowstat_to_boolean(run_dict)
+        return run_dict
+
+    async def get_runs_by_list(self, list_of_run_numbers):
+        """
+        See TrackerRunRegistryClient.get_runs_by_list
+        """
+        if not list_of_run_numbers:
+            return []
+
+        where_clause = build_list_where_clause(list_of_run_numbers, "r.run_number")
+        return await self._get_dataset_runs(where_clause)
+
+    async def get_runs_by_range(self, min_run_number, max_run_number):
+        """
+        See TrackerRunRegistryClient.get_runs_by_range
+        """
+        where_clause = build_range_where_clause(
+            min_run_number, max_run_number, "r.run_number"
+        )
+        return await self._get_dataset_runs(where_clause)
+
+    async def get_lumi_sections_by_list(self, list_of_run_numbers):
+        """
+        See TrackerRunRegistryClient.get_lumi_sections_by_list
+        """
+        where_clause = build_list_where_clause(list_of_run_numbers, "r.rdr_run_number")
+        return await self._get_dataset_lumis_runs(where_clause)
+
+    async def get_lumi_sections_by_range(self, min_run_number, max_run_number):
+        """
+        See TrackerRunRegistryClient.get_lumi_sections_by_range
+        """
+        where_clause = build_range_where_clause(
+            min_run_number, max_run_number, "r.rdr_run_number"
+        )
+        return await self._get_dataset_lumis_runs(where_clause)
+
+    async def get_active_lumi_runs_by_list(self, list_of_run_numbers):
+        """
+        See TrackerRunRegistryClient.get_active_lumi_runs_by_list
+        """
+        where_clause = build_list_where_clause(list_of_run_numbers, "r.run_number")
+        return await self._get_dataset_runs_with_active_lumis(where_clause)
+
+    async def get_active_lumi_runs_by_range(self, min_run_number, max_run_number):
+        """
+        See TrackerRunRegistryClient.get_active_lumi_runs_by_range
+        """
+        where_clause = build_range_where_clause(
+            min_run_number, max_run_number, "r.run_number"
+        )
+        return await self._get_dataset_runs_with_active_lumis(where_clause)
+
+    async def get_fill_number_by_run_number(self, list_of_run_numbers):
+        """
+        See TrackerRunRegistryClient.get_fill_number_by_run_number
+        """
+        where_clause = build_list_where_clause(list_of_run_numbers, "r.runnumber")
+        query = fill_numbers_query(where_clause)
+        items = (await self.execute_query(query)).get("data", [])
+        return list_to_dict(items, FILL_NUMBER_KEYS)
+
+    async def get_unique_fill_numbers_by_run_number(self, list_of_run_numbers):
+        """
+        See TrackerRunRegistryClient.get_unique_fill_numbers_by_run_number
+        """
+        where_clause = build_list_where_clause(list_of_run_numbers, "r.runnumber")
+        query = unique_fill_numbers_query(where_clause)
+        response = (await self.execute_query(query)).get("data", [])
+        return sorted({item[0] for item in response})
+
+    async def get_run_numbers_by_fill_number(self, list_of_fill_numbers):
+        """
+        See TrackerRunRegistryClient.get_run_numbers_by_fill_number
+        """
+        where_clause = build_list_where_clause(list_of_fill_numbers, "r.lhcfill")
+        query = grouped_fill_numbers_query(where_clause)
+        response = (await self.execute_query(query)).get("data", [])
+        return group_runs_by_fill_number(response)
+
+    async def get_grouped_fill_numbers_by_run_number(self, list_of_run_numbers):
+        """
+        See TrackerRunRegistryClient.get_grouped_fill_numbers_by_run_number
+        """
+        where_clause = build_list_where_clause(list_of_run_numbers, "r.runnumber")
+        query = grouped_fill_numbers_query(where_clause)
+        response = (await self.execute_query(query)).get("data", [])
+        return group_runs_by_fill_number(response)
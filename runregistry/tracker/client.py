@@ -1,18 +1,42 @@
 """"
 RunRegistry Client
 """
-from itertools import groupby
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
 from operator import itemgetter
 
 from runregistry.client import RunRegistryClient
+from runregistry.tracker.queries import (
+    DATASET_RUNS_KEYS,
+    DATASET_LUMIS_KEYS,
+    ACTIVE_LUMI_RUNS_KEYS,
+    FILL_NUMBER_KEYS,
+    DATASET_LUMIS_DTYPES,
+    ACTIVE_LUMI_RUNS_DTYPES,
+    DatasetRun,
+    DatasetLumis,
+    ActiveLumiRun,
+    FillNumber,
+    dataset_runs_query,
+    dataset_lumis_query,
+    active_lumi_runs_query,
+    fill_numbers_query,
+    unique_fill_numbers_query,
+    grouped_fill_numbers_query,
+)
 from runregistry.tracker.utilities import (
     transform_lowstat_to_boolean,
-    build_dcs_query_string,
+    transform_lowstat_rows_to_boolean,
+    group_runs_by_fill_number,
+    join_run_report,
 )
 from runregistry.utilities import (
     list_to_dict,
-    build_range_where_clause,
-    build_list_where_clause,
+    list_to_records,
+    build_parameterized_range_where_clause,
+    build_chunked_where_clauses,
 )
 
 
@@ -20,127 +44,271 @@ class TrackerRunRegistryClient(RunRegistryClient):
     """
     Client to access the Tracker Workspace of the Run Registry
 
+    Long lists of run numbers are split into several bounded queries,
+    that are executed concurrently and merged in the order of the query.
+
     https://cmswbmoffshift.web.cern.ch/cmswbmoffshift/runregistry_offline/index.jsf
     """
 
-    def _get_dataset_runs(self, where_clause):
-        query = (
-            "select r.run_number, r.run_class_name, r.rda_name, r.rda_state, "
-            "r.rda_last_shifter, r.rda_cmp_pixel, r.rda_cmp_strip, "
-            "r.rda_cmp_tracking, r.rda_cmp_pixel_cause, r.rda_cmp_strip_cause, "
-            "r.rda_cmp_tracking_cause "
-            "from runreg_tracker.datasets r "
-            "where {} "
-            "and r.rda_name != '/Global/Online/ALL'".format(where_clause)
-        )
+    REPORT_VIEWS = ["runs", "active_lumis", "lumis", "fills"]
 
-        run_list = self.execute_query(query).get("data", [])
+    def __init__(self, url=RunRegistryClient.DEFAULT_URL, transport=None):
+        self._base_client = None
+        if transport is None:
+            # Share the connection pool of the base client of the same endpoint
+            self._base_client = RunRegistryClient(url)
+            transport = self._base_client.transport
+        super().__init__(url, transport)
+        self.mirror = None  # Optional, runregistry.tracker.mirror.TrackerMirror
+        self.fill_index = None  # Optional, runregistry.tracker.fills.FillRunIndex
 
-        keys = [
-            "run_number",
-            "run_class",
-            "dataset",
-            "state",
-            "shifter",
-            "pixel",
-            "sistrip",
-            "tracking",
-            "pixel_lowstat",
-            "sistrip_lowstat",
-            "tracking_lowstat",
-        ]
-
-        run_dicts = list_to_dict(run_list, keys)
-        transform_lowstat_to_boolean(run_dicts)
-
-        return run_dicts
-
-    def _get_dataset_lumis_runs(self, where_clause):
-        query = (
-            "select r.rdr_run_number, r.lhcfill, r.rdr_rda_name, r.rdr_section_from, "
-            "r.rdr_section_to, r.rdr_section_count, "
-            "r.cms_active, r.beam1_stable, r.beam2_stable, r.beam1_present, "
-            "r.beam2_present, r.tibtid_ready, r.tob_ready, r.tecp_ready, "
-            "r.tecm_ready, r.bpix_ready, r.fpix_ready "
-            "from runreg_tracker.dataset_lumis r "
-            "where r.rdr_rda_name != '/Global/Online/ALL' "
-            "and {} "
-            "order by r.rdr_run_number, r.rdr_rda_name, r.rdr_range".format(
-                where_clause
+    def _execute_rows(self, query, parameters=None):
+        """
+        :param parameters: dictionary of the values of named query parameters
+        :return: rows of the query, answered by the mirror if one is set
+        """
+        if self.mirror is not None:
+            return self.mirror.execute(query, parameters)
+        return self.execute_query(query, parameters=parameters).get("data", [])
+
+    def _get_rows(self, build_query, where_clauses, sort_key=None, parameters=None):
+        """
+        Executes one query per where clause concurrently and merges the rows
+
+        :param build_query: function turning a where clause into a SQL query
+        :param where_clauses: list of where clauses
+        :param sort_key: restores the order of the query across the merged rows
+        :param parameters: values of the named parameters of the where clauses
+        :return: list of rows
+        """
+
+        def execute(where_clause):
+            return self._execute_rows(build_query(where_clause), parameters)
+
+        if len(where_clauses) == 1:
+            return execute(where_clauses[0])
+
+        workers = max(1, min(self.max_workers, len(where_clauses)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(execute, where_clauses)
+            rows = [row for result in results for row in result]
+        if sort_key is not None:
+            rows.sort(key=sort_key)
+        return rows
+
+    def _get_columns(
+        self, build_query, where_clauses, keys, dtypes, sort_by=None, parameters=None
+    ):
+        """
+        Executes one query per where clause concurrently and merges the
+        typed numpy columns of their results
+
+        :param sort_by: restores the order of the query across the merged columns
+        :param parameters: values of the named parameters of the where clauses
+        :return: dictionary of column name to numpy array
+        """
+        from runregistry.columnar import rows_to_columns, concatenate_columns
+
+        if not where_clauses:
+            return rows_to_columns([], keys, dtypes)
+
+        def execute(where_clause):
+            query = build_query(where_clause)
+            if self.mirror is not None:
+                rows = self.mirror.execute(query, parameters)
+                return rows_to_columns([rows], keys, dtypes)
+            return self.execute_query_columnar(
+                query, keys, dtypes, parameters=parameters
             )
+
+        workers = max(1, min(self.max_workers, len(where_clauses)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(execute, where_clauses))
+        return concatenate_columns(results, sort_by)
+
+    def _get_frame(
+        self, build_query, where_clauses, keys, dtypes, sort_by=None, parameters=None
+    ):
+        """
+        See _get_columns
+
+        :return: pandas.DataFrame
+        """
+        from runregistry.columnar import columns_to_frame
+
+        columns = self._get_columns(
+            build_query, where_clauses, keys, dtypes, sort_by, parameters
         )
+        return columns_to_frame(columns)
 
-        run_list = self.execute_query(query).get("data", [])
+    def _get_lumi_flags(self, where_clauses, parameters=None):
+        from runregistry.tracker.flags import LumiFlags
 
-        keys = [
+        columns = self._get_columns(
+            dataset_lumis_query,
+            where_clauses,
+            DATASET_LUMIS_KEYS,
+            DATASET_LUMIS_DTYPES,
             "run_number",
-            "lhcfill",
-            "dataset",
-            "section_from",
-            "section_to",
-            "section_count",
-            "cms_active",
-            "beam1_stable",
-            "beam2_stable",
-            "beam1_present",
-            "beam2_present",
-            "tibtid",
-            "tob",
-            "tecp",
-            "tecm",
-            "bpix",
-            "fpix",
-        ]
-
-        return list_to_dict(run_list, keys)
-
-    def _get_dataset_runs_with_active_lumis(self, where_clause):
-        dcs_list = ["Tibtid", "TecM", "TecP", "Tob", "Bpix", "Fpix"]
-        query = (
-            "select r.run_number, r.run_class_name, r.rda_name, "
-            "sum(l.rdr_section_count) as lumi_sections, "
-            "r.rda_state, r.rda_last_shifter, r.rda_cmp_pixel, r.rda_cmp_strip, "
-            "r.rda_cmp_tracking, r.rda_cmp_pixel_cause, r.rda_cmp_strip_cause, "
-            "r.rda_cmp_tracking_cause "
-            "from runreg_tracker.dataset_lumis l, runreg_tracker.datasets r "
-            "where l.rdr_run_number = r.run_number "
-            "and l.rdr_rda_name = r.rda_name "
-            "and l.rdr_rda_name != '/Global/Online/ALL' "
-            "and l.cms_active = 1 "
-            "and (l.beam1_stable = 1 "
-            "and l.beam2_stable = 1 "
-            "or l.rdr_rda_name LIKE '%Cosmics%') "
-            "and ({}) ".format(build_dcs_query_string(dcs_list, "l", "or"))
-            + "and {} ".format(where_clause)
-            + "group by r.run_number, r.rda_name, r.run_class_name, "
-            "r.rda_state, r.rda_last_shifter, r.rda_cmp_pixel, r.rda_cmp_strip, "
-            "r.rda_cmp_tracking, r.rda_cmp_pixel_cause, r.rda_cmp_strip_cause, "
-            "r.rda_cmp_tracking_cause "
+            parameters,
         )
+        return LumiFlags(columns)
+
+    def _sync_fill_index(self, list_of_run_numbers=(), list_of_fill_numbers=()):
+        """
+        Loads the fill index when it is empty, does not know a requested
+        run number, which might be a new run, or a requested fill number is
+        not below the highest indexed fill, which might have new runs
+        """
+        high_water_mark = self.fill_index.high_water_mark()
+        max_fill_number = self.fill_index.max_fill_number()
+        if (
+            high_water_mark is None
+            or any(int(run) > high_water_mark for run in list_of_run_numbers)
+            or list_of_fill_numbers
+            and (
+                max_fill_number is None
+                or any(int(fill) >= max_fill_number for fill in list_of_fill_numbers)
+            )
+        ):
+            self.fill_index.sync(self)
+
+    def _get_fill_numbers(self, list_of_run_numbers):
+        """
+        :return: [run number, fill number] rows ordered by run number,
+        answered by the fill index if one is set
+        """
+        if self.fill_index is not None:
+            self._sync_fill_index(list_of_run_numbers)
+            return self.fill_index.fill_numbers(list_of_run_numbers)
+        where_clauses = build_chunked_where_clauses(list_of_run_numbers, "r.runnumber")
+        return self._get_rows(fill_numbers_query, where_clauses, itemgetter(0))
 
-        run_list = self.execute_query(query).get("data", [])
+    def _convert_rows(self, rows, keys, record_type=None, lowstat=False):
+        """
+        Converts rows into dictionaries, timed as instrumentation stage
 
-        keys = [
-            "run_number",
-            "run_class",
-            "dataset",
-            "lumi_sections",
-            "state",
-            "shifter",
-            "pixel",
-            "sistrip",
-            "tracking",
-            "pixel_lowstat",
-            "sistrip_lowstat",
-            "tracking_lowstat",
-        ]
-
-        run_dict = list_to_dict(run_list, keys)
-        transform_lowstat_to_boolean(run_dict)
-
-        return run_dict
-
-    def get_runs_by_list(self, list_of_run_numbers):
+        :param record_type: convert into compact records of this type instead
+        :param lowstat: transform the LOW_STATS columns to booleans
+        :return: list of dictionaries or records
+        """
+        name = "list_to_dict" if record_type is None else "list_to_records"
+        with self.instrumentation.stage(name) as event:
+            if event:
+                event.rows = len(rows)
+            if record_type is not None:
+                if lowstat:
+                    transform_lowstat_rows_to_boolean(rows, keys)
+                return list_to_records(rows, record_type)
+            dicts = list_to_dict(rows, keys)
+            if lowstat:
+                transform_lowstat_to_boolean(dicts)
+            return dicts
+
+    def _get_dataset_runs(self, where_clauses, compact=False, parameters=None):
+        run_list = self._get_rows(
+            dataset_runs_query, where_clauses, parameters=parameters
+        )
+        record_type = DatasetRun if compact else None
+        return self._convert_rows(run_list, DATASET_RUNS_KEYS, record_type, True)
+
+    def _get_dataset_lumis_runs(
+        self, where_clauses, compact=False, as_frame=False, parameters=None
+    ):
+        if as_frame:
+            return self._get_frame(
+                dataset_lumis_query,
+                where_clauses,
+                DATASET_LUMIS_KEYS,
+                DATASET_LUMIS_DTYPES,
+                "run_number",
+                parameters,
+            )
+        run_list = self._get_rows(
+            dataset_lumis_query, where_clauses, itemgetter(0), parameters
+        )
+        record_type = DatasetLumis if compact else None
+        return self._convert_rows(run_list, DATASET_LUMIS_KEYS, record_type)
+
+    def _get_dataset_runs_with_active_lumis(
+        self, where_clauses, compact=False, as_frame=False, parameters=None
+    ):
+        if as_frame:
+            frame = self._get_frame(
+                active_lumi_runs_query,
+                where_clauses,
+                ACTIVE_LUMI_RUNS_KEYS,
+                ACTIVE_LUMI_RUNS_DTYPES,
+                parameters=parameters,
+            )
+            for key in ["pixel_lowstat", "sistrip_lowstat", "tracking_lowstat"]:
+                frame[key] = frame[key] == "LOW_STATS"
+            return frame
+        run_list = self._get_rows(
+            active_lumi_runs_query, where_clauses, parameters=parameters
+        )
+        record_type = ActiveLumiRun if compact else None
+        return self._convert_rows(run_list, ACTIVE_LUMI_RUNS_KEYS, record_type, True)
+
+    def _iter_rows(
+        self,
+        build_query,
+        where_clauses,
+        read_ahead=False,
+        sort_key=None,
+        parameters=None,
+    ):
+        """
+        Streams the rows of one query per where clause
+
+        :param sort_key: merges the ordered rows of the queries in this order
+        :param parameters: values of the named parameters of the where clauses
+        """
+        if self.mirror is not None:
+            iterators = [
+                self.mirror.execute(build_query(where_clause), parameters)
+                for where_clause in where_clauses
+            ]
+        else:
+            iterators = [
+                self.iter_query(
+                    build_query(where_clause),
+                    read_ahead=read_ahead,
+                    parameters=parameters,
+                )
+                for where_clause in where_clauses
+            ]
+        if sort_key is None:
+            return chain.from_iterable(iterators)
+        return heapq.merge(*iterators, key=sort_key)
+
+    def _iter_dataset_runs(self, where_clauses, read_ahead=False, parameters=None):
+        rows = self._iter_rows(
+            dataset_runs_query, where_clauses, read_ahead, parameters=parameters
+        )
+        for row in rows:
+            yield transform_lowstat_to_boolean([dict(zip(DATASET_RUNS_KEYS, row))])[0]
+
+    def _iter_dataset_lumis_runs(
+        self, where_clauses, read_ahead=False, parameters=None
+    ):
+        rows = self._iter_rows(
+            dataset_lumis_query, where_clauses, read_ahead, itemgetter(0), parameters
+        )
+        for row in rows:
+            yield dict(zip(DATASET_LUMIS_KEYS, row))
+
+    def _iter_dataset_runs_with_active_lumis(
+        self, where_clauses, read_ahead=False, parameters=None
+    ):
+        rows = self._iter_rows(
+            active_lumi_runs_query, where_clauses, read_ahead, parameters=parameters
+        )
+        for row in rows:
+            run = dict(zip(ACTIVE_LUMI_RUNS_KEYS, row))
+            yield transform_lowstat_to_boolean([run])[0]
+
+    def get_runs_by_list(self, list_of_run_numbers, compact=False):
         """
         Get list of run dictionaries from the Tracker workspace in the Run Registry
 
@@ -151,15 +319,16 @@ class TrackerRunRegistryClient(RunRegistryClient):
         'COMPLETED'
 
         :param list_of_run_numbers: list of run numbers
+        :param compact: return compact records instead of dictionaries
         :return: dictionary containing the queryset
         """
         if not list_of_run_numbers:
             return []
 
-        where_clause = build_list_where_clause(list_of_run_numbers, "r.run_number")
-        return self._get_dataset_runs(where_clause)
+        where_clauses = build_chunked_where_clauses(list_of_run_numbers, "r.run_number")
+        return self._get_dataset_runs(where_clauses, compact)
 
-    def get_runs_by_range(self, min_run_number, max_run_number):
+    def get_runs_by_range(self, min_run_number, max_run_number, compact=False):
         """
         Get list of run dictionaries from the Tracker workspace in the Run Registry
 
@@ -171,14 +340,17 @@ class TrackerRunRegistryClient(RunRegistryClient):
 
         :param min_run_number: first run number
         :param max_run_number: last run number
+        :param compact: return compact records instead of dictionaries
         :return: dictionary containing the queryset
         """
-        where_clause = build_range_where_clause(
+        where_clause, parameters = build_parameterized_range_where_clause(
             min_run_number, max_run_number, "r.run_number"
         )
-        return self._get_dataset_runs(where_clause)
+        return self._get_dataset_runs([where_clause], compact, parameters=parameters)
 
-    def get_lumi_sections_by_list(self, list_of_run_numbers):
+    def get_lumi_sections_by_list(
+        self, list_of_run_numbers, compact=False, as_frame=False
+    ):
         """
         Get list of lumisections for the given run number list
 
@@ -189,12 +361,18 @@ class TrackerRunRegistryClient(RunRegistryClient):
         7217
 
         :param list_of_run_numbers:
+        :param compact: return compact records instead of dictionaries
+        :param as_frame: return a pandas.DataFrame with typed columns
         :return:
         """
-        where_clause = build_list_where_clause(list_of_run_numbers, "r.rdr_run_number")
-        return self._get_dataset_lumis_runs(where_clause)
+        where_clauses = build_chunked_where_clauses(
+            list_of_run_numbers, "r.rdr_run_number"
+        )
+        return self._get_dataset_lumis_runs(where_clauses, compact, as_frame)
 
-    def get_lumi_sections_by_range(self, min_run_number, max_run_number):
+    def get_lumi_sections_by_range(
+        self, min_run_number, max_run_number, compact=False, as_frame=False
+    ):
         """
         Get list of lumisections for the given run number range
 
@@ -206,14 +384,20 @@ class TrackerRunRegistryClient(RunRegistryClient):
 
         :param min_run_number: first run number
         :param max_run_number: last run number
+        :param compact: return compact records instead of dictionaries
+        :param as_frame: return a pandas.DataFrame with typed columns
         :return: dictionary containing the queryset
         """
-        where_clause = build_range_where_clause(
+        where_clause, parameters = build_parameterized_range_where_clause(
             min_run_number, max_run_number, "r.rdr_run_number"
         )
-        return self._get_dataset_lumis_runs(where_clause)
+        return self._get_dataset_lumis_runs(
+            [where_clause], compact, as_frame, parameters=parameters
+        )
 
-    def get_active_lumi_runs_by_list(self, list_of_run_numbers):
+    def get_active_lumi_runs_by_list(
+        self, list_of_run_numbers, compact=False, as_frame=False
+    ):
         """
         Get list of runs with certification status and active lumi sections
 
@@ -226,11 +410,18 @@ class TrackerRunRegistryClient(RunRegistryClient):
         777
         >>> client.get_active_lumi_runs_by_list(["323829"])[0]["lumi_sections"]
         456
+
+        :param compact: return compact records instead of dictionaries
+        :param as_frame: return a pandas.DataFrame with typed columns
         """
-        where_clause = build_list_where_clause(list_of_run_numbers, "r.run_number")
-        return self._get_dataset_runs_with_active_lumis(where_clause)
+        where_clauses = build_chunked_where_clauses(list_of_run_numbers, "r.run_number")
+        return self._get_dataset_runs_with_active_lumis(
+            where_clauses, compact, as_frame
+        )
 
-    def get_active_lumi_runs_by_range(self, min_run_number, max_run_number):
+    def get_active_lumi_runs_by_range(
+        self, min_run_number, max_run_number, compact=False, as_frame=False
+    ):
         """
         Get list of runs with certification status and active lumi sections
 
@@ -239,13 +430,18 @@ class TrackerRunRegistryClient(RunRegistryClient):
         >>> runs = client.get_active_lumi_runs_by_range("323472", "323485")
         >>> runs[0]["pixel"]
         'GOOD'
+
+        :param compact: return compact records instead of dictionaries
+        :param as_frame: return a pandas.DataFrame with typed columns
         """
-        where_clause = build_range_where_clause(
+        where_clause, parameters = build_parameterized_range_where_clause(
             min_run_number, max_run_number, "r.run_number"
         )
-        return self._get_dataset_runs_with_active_lumis(where_clause)
+        return self._get_dataset_runs_with_active_lumis(
+            [where_clause], compact, as_frame, parameters=parameters
+        )
 
-    def get_fill_number_by_run_number(self, list_of_run_numbers):
+    def get_fill_number_by_run_number(self, list_of_run_numbers, compact=False):
         """
         Retrieve a list of fill numbers by the given run numbers
 
@@ -255,18 +451,64 @@ class TrackerRunRegistryClient(RunRegistryClient):
         [{'run_number': 321177, 'fill_number': 7048}, {'run_number': 321178, 'fill_number': 7048}, {'run_number': 321218, 'fill_number': 7052}]
 
         :param list_of_run_numbers:
+        :param compact: return compact records instead of dictionaries
         :return: list of dictionaries containing run number and corresponding fill number
         """
-        where_clause = build_list_where_clause(list_of_run_numbers, "r.runnumber")
-        query = (
-            "select r.runnumber, r.lhcfill "
-            "from runreg_tracker.runs r "
-            "where {} "
-            "order by r.runnumber".format(where_clause)
-        )
-        items = self.execute_query(query).get("data", [])
-        keys = ["run_number", "fill_number"]
-        return list_to_dict(items, keys)
+        items = self._get_fill_numbers(list_of_run_numbers)
+        record_type = FillNumber if compact else None
+        return self._convert_rows(items, FILL_NUMBER_KEYS, record_type)
+
+    def get_run_report(self, list_of_run_numbers, views=REPORT_VIEWS):
+        """
+        Fetches several views of the given runs concurrently and joins them
+        per run and dataset, so that a report takes the time of its slowest view
+
+        Views:
+         - runs: certification of the datasets, see get_runs_by_list
+         - active_lumis: certification and amount of active lumi sections,
+           see get_active_lumi_runs_by_list
+         - lumis: list of lumi section dictionaries, see get_lumi_sections_by_list
+         - fills: fill number of the run, see get_fill_number_by_run_number
+
+        Example:
+        >>> client = TrackerRunRegistryClient()
+        >>> report = client.get_run_report(["321777"], ["active_lumis", "fills"])
+        >>> [run["lumi_sections"] for run in report.values()]
+        [279]
+
+        :param list_of_run_numbers: list of run numbers
+        :param views: names of the joined views
+        :return: dictionary of (run_number, dataset) to dictionary of the
+        joined views, ordered by run number and dataset
+        """
+        unknown = sorted(set(views) - set(self.REPORT_VIEWS))
+        if unknown:
+            raise ValueError(
+                "Unknown views {}, available: {}".format(
+                    ", ".join(unknown), ", ".join(self.REPORT_VIEWS)
+                )
+            )
+        run_numbers = sorted({int(run_number) for run_number in list_of_run_numbers})
+        if not run_numbers or not views:
+            return {}
+
+        run_where_clauses = build_chunked_where_clauses(run_numbers, "r.run_number")
+        getters = {
+            "runs": partial(self._get_dataset_runs, run_where_clauses),
+            "active_lumis": partial(
+                self._get_dataset_runs_with_active_lumis, run_where_clauses
+            ),
+            "lumis": partial(
+                self._get_dataset_lumis_runs,
+                build_chunked_where_clauses(run_numbers, "r.rdr_run_number"),
+            ),
+            "fills": partial(self.get_fill_number_by_run_number, run_numbers),
+        }
+        views = list(dict.fromkeys(views))
+        with ThreadPoolExecutor(max_workers=len(views)) as executor:
+            futures = {view: executor.submit(getters[view]) for view in views}
+            results = {view: future.result() for view, future in futures.items()}
+        return join_run_report(**results)
 
     def get_unique_fill_numbers_by_run_number(self, list_of_run_numbers):
         """
@@ -280,15 +522,13 @@ class TrackerRunRegistryClient(RunRegistryClient):
         :param list_of_run_numbers:
         :return: list of dictionaries containing run number and corresponding fill number
         """
+        if self.fill_index is not None:
+            items = self._get_fill_numbers(list_of_run_numbers)
+            return sorted({fill for _, fill in items if fill is not None})
 
-        where_clause = build_list_where_clause(list_of_run_numbers, "r.runnumber")
-        query = (
-            "select r.lhcfill "
-            "from runreg_tracker.runs r "
-            "where {} "
-            "order by r.runnumber".format(where_clause)
-        )
-        return sorted({item[0] for item in self.execute_query(query).get("data", [])})
+        where_clauses = build_chunked_where_clauses(list_of_run_numbers, "r.runnumber")
+        items = self._get_rows(unique_fill_numbers_query, where_clauses)
+        return sorted({item[0] for item in items})
 
     def get_run_numbers_by_fill_number(self, list_of_fill_numbers):
         """
@@ -303,18 +543,17 @@ class TrackerRunRegistryClient(RunRegistryClient):
         :return: list of dictionaries containing fill number and corresponding
         list of run numbers
         """
-        where_clause = build_list_where_clause(list_of_fill_numbers, "r.lhcfill")
-        query = (
-            "select r.lhcfill, r.runnumber "
-            "from runreg_tracker.runs r "
-            "where {} "
-            "order by r.runnumber".format(where_clause)
+        if self.fill_index is not None:
+            self._sync_fill_index(list_of_fill_numbers=list_of_fill_numbers)
+            return group_runs_by_fill_number(
+                self.fill_index.run_numbers(list_of_fill_numbers)
+            )
+
+        where_clauses = build_chunked_where_clauses(list_of_fill_numbers, "r.lhcfill")
+        response = self._get_rows(
+            grouped_fill_numbers_query, where_clauses, itemgetter(1)
         )
-        response = self.execute_query(query).get("data", [])
-        groups = groupby(response, itemgetter(0))
-        items = [(key, [item[1] for item in value]) for key, value in groups]
-        keys = ["fill_number", "run_number"]
-        return list_to_dict(items, keys)
+        return group_runs_by_fill_number(response)
 
     def get_grouped_fill_numbers_by_run_number(self, list_of_run_numbers):
         """
@@ -323,15 +562,142 @@ class TrackerRunRegistryClient(RunRegistryClient):
         >>> client.get_grouped_fill_numbers_by_run_number([321171, 321179, 321181, 321182, 321185])
         [{'fill_number': 7048, 'run_number': [321171, 321179, 321181]}, {'fill_number': 7049, 'run_number': [321182, 321185]}]
         """
-        where_clause = build_list_where_clause(list_of_run_numbers, "r.runnumber")
-        query = (
-            "select r.lhcfill, r.runnumber "
-            "from runreg_tracker.runs r "
-            "where {} "
-            "order by r.runnumber".format(where_clause)
+        if self.fill_index is not None:
+            items = self._get_fill_numbers(list_of_run_numbers)
+            return group_runs_by_fill_number([[fill, run] for run, fill in items])
+
+        where_clauses = build_chunked_where_clauses(list_of_run_numbers, "r.runnumber")
+        response = self._get_rows(
+            grouped_fill_numbers_query, where_clauses, itemgetter(1)
+        )
+        return group_runs_by_fill_number(response)
+
+    def iter_runs_by_list(self, list_of_run_numbers, read_ahead=False):
+        """
+        Streaming variant of get_runs_by_list
+
+        :param list_of_run_numbers: list of run numbers
+        :param read_ahead: download the next page while the current one is consumed
+        :return: generator of run dictionaries
+        """
+        if not list_of_run_numbers:
+            return iter([])
+
+        where_clauses = build_chunked_where_clauses(list_of_run_numbers, "r.run_number")
+        return self._iter_dataset_runs(where_clauses, read_ahead)
+
+    def iter_runs_by_range(self, min_run_number, max_run_number, read_ahead=False):
+        """
+        Streaming variant of get_runs_by_range
+
+        :param min_run_number: first run number
+        :param max_run_number: last run number
+        :param read_ahead: download the next page while the current one is consumed
+        :return: generator of run dictionaries
+        """
+        where_clause, parameters = build_parameterized_range_where_clause(
+            min_run_number, max_run_number, "r.run_number"
+        )
+        return self._iter_dataset_runs(
+            [where_clause], read_ahead, parameters=parameters
+        )
+
+    def iter_lumi_sections_by_list(self, list_of_run_numbers, read_ahead=False):
+        """
+        Streaming variant of get_lumi_sections_by_list
+
+        :param list_of_run_numbers: list of run numbers
+        :param read_ahead: download the next page while the current one is consumed
+        :return: generator of lumi section dictionaries
+        """
+        where_clauses = build_chunked_where_clauses(
+            list_of_run_numbers, "r.rdr_run_number"
+        )
+        return self._iter_dataset_lumis_runs(where_clauses, read_ahead)
+
+    def iter_lumi_sections_by_range(
+        self, min_run_number, max_run_number, read_ahead=False
+    ):
+        """
+        Streaming variant of get_lumi_sections_by_range
+
+        Example:
+        >>> client = TrackerRunRegistryClient()
+        >>> lumis = client.iter_lumi_sections_by_range("323472", "323485")
+        >>> next(lumis)["section_count"]
+        94
+
+        :param min_run_number: first run number
+        :param max_run_number: last run number
+        :param read_ahead: download the next page while the current one is consumed
+        :return: generator of lumi section dictionaries
+        """
+        where_clause, parameters = build_parameterized_range_where_clause(
+            min_run_number, max_run_number, "r.rdr_run_number"
+        )
+        return self._iter_dataset_lumis_runs(
+            [where_clause], read_ahead, parameters=parameters
+        )
+
+    def iter_active_lumi_runs_by_list(self, list_of_run_numbers, read_ahead=False):
+        """
+        Streaming variant of get_active_lumi_runs_by_list
+
+        :param list_of_run_numbers: list of run numbers
+        :param read_ahead: download the next page while the current one is consumed
+        :return: generator of run dictionaries
+        """
+        where_clauses = build_chunked_where_clauses(list_of_run_numbers, "r.run_number")
+        return self._iter_dataset_runs_with_active_lumis(where_clauses, read_ahead)
+
+    def iter_active_lumi_runs_by_range(
+        self, min_run_number, max_run_number, read_ahead=False
+    ):
+        """
+        Streaming variant of get_active_lumi_runs_by_range
+
+        :param min_run_number: first run number
+        :param max_run_number: last run number
+        :param read_ahead: download the next page while the current one is consumed
+        :return: generator of run dictionaries
+        """
+        where_clause, parameters = build_parameterized_range_where_clause(
+            min_run_number, max_run_number, "r.run_number"
+        )
+        return self._iter_dataset_runs_with_active_lumis(
+            [where_clause], read_ahead, parameters=parameters
+        )
+
+    def get_lumi_flags_by_list(self, list_of_run_numbers):
+        """
+        Lumi section ranges of the given runs with their beam, cms_active and
+        DCS flags encoded as bitmasks, to evaluate flag selections locally.
+        Requires numpy.
+
+        :param list_of_run_numbers: list of run numbers
+        :return: runregistry.tracker.flags.LumiFlags
+        """
+        where_clauses = build_chunked_where_clauses(
+            list_of_run_numbers, "r.rdr_run_number"
+        )
+        return self._get_lumi_flags(where_clauses)
+
+    def get_lumi_flags_by_range(self, min_run_number, max_run_number):
+        """
+        Lumi section ranges of the given run range with their beam, cms_active
+        and DCS flags encoded as bitmasks, to evaluate flag selections locally.
+        Requires numpy.
+
+        Example:
+        >>> client = TrackerRunRegistryClient()
+        >>> lumi_flags = client.get_lumi_flags_by_range("323472", "323485")
+        >>> active = lumi_flags.active_lumi_sections(lumi_flags.tracker_selection())
+
+        :param min_run_number: first run number
+        :param max_run_number: last run number
+        :return: runregistry.tracker.flags.LumiFlags
+        """
+        where_clause, parameters = build_parameterized_range_where_clause(
+            min_run_number, max_run_number, "r.rdr_run_number"
         )
-        response = self.execute_query(query).get("data", [])
-        groups = groupby(response, itemgetter(0))
-        items = [(key, [item[1] for item in value]) for key, value in groups]
-        keys = ["fill_number", "run_number"]
-        return list_to_dict(items, keys)
+        return self._get_lumi_flags([where_clause], parameters=parameters)
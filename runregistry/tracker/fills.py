@@ -0,0 +1,158 @@
+"""
+Index of the fill numbers of the runs
+"""
+import threading
+from array import array
+from bisect import bisect_left
+
+from runregistry.tracker.queries import fill_numbers_query
+from runregistry.utilities import build_chunked_where_clauses
+
+MISSING_FILL_NUMBER = -1
+
+
+class FillRunIndex:
+    """
+    Bidirectional run number <-> fill number lookup
+
+    The (run number, fill number) pairs of runreg_tracker.runs are loaded once
+    into sorted typed arrays, later syncs only load runs above the highest
+    indexed run and runs without fill number yet. Runs without fill number
+    below a run with fill number, e.g. cosmics runs, are not loaded again.
+
+    Example:
+    >>> index = FillRunIndex([[321171, 7048], [321182, 7049], [321179, 7048]])
+    >>> index.fill_numbers([321179, 321182, 1])
+    [[321179, 7048], [321182, 7049]]
+    >>> index.run_numbers([7048])
+    [[7048, 321171], [7048, 321179]]
+    """
+
+    def __init__(self, pairs=None):
+        """
+        :param pairs: list of [run number, fill number] pairs
+        """
+        self._lock = threading.Lock()
+        # Sorted run numbers, their fill numbers and the runs of every fill,
+        # replaced as a whole so that every lookup reads one consistent index
+        self._index = (array("q"), array("q"), {})
+        self.update(pairs or [])
+
+    def update(self, pairs):
+        """
+        Adds or replaces run number, fill number pairs
+
+        :param pairs: list of [run number, fill number] pairs, the fill number
+        can be None
+        """
+        with self._lock:
+            runs, fills, _ = self._index
+            mapping = dict(zip(runs, fills))
+            for run_number, fill_number in pairs:
+                if fill_number is None:
+                    fill_number = MISSING_FILL_NUMBER
+                mapping[int(run_number)] = int(fill_number)
+            run_numbers = sorted(mapping)
+            runs_by_fill = {}
+            for run_number in run_numbers:
+                runs_by_fill.setdefault(mapping[run_number], []).append(run_number)
+            runs_by_fill.pop(MISSING_FILL_NUMBER, None)
+
+            self._index = (
+                array("q", run_numbers),
+                array("q", (mapping[run_number] for run_number in run_numbers)),
+                runs_by_fill,
+            )
+
+    def high_water_mark(self):
+        """
+        :return: highest indexed run number or None if the index is empty
+        """
+        runs = self._index[0]
+        return runs[-1] if runs else None
+
+    def max_fill_number(self):
+        """
+        :return: highest indexed fill number or None if no run has one
+        """
+        runs_by_fill = self._index[2]
+        return max(runs_by_fill) if runs_by_fill else None
+
+    def pending_runs(self):
+        """
+        Example:
+        >>> FillRunIndex([[1, None], [2, 7048], [3, None], [4, None]]).pending_runs()
+        [3, 4]
+
+        :return: indexed run numbers without fill number above the highest
+        run with fill number, which might still get one
+        """
+        runs, fills, _ = self._index
+        pending = []
+        for index in reversed(range(len(runs))):
+            if fills[index] != MISSING_FILL_NUMBER:
+                break
+            pending.append(runs[index])
+        return pending[::-1]
+
+    def sync(self, client, min_run_number=0):
+        """
+        Loads the fill numbers of new runs and of runs without fill number
+
+        :param client: RunRegistryClient used to download the fill numbers
+        :param min_run_number: first run number loaded into an empty index
+        :return: amount of loaded runs
+        """
+        high_water_mark = self.high_water_mark()
+        if high_water_mark is None:
+            where_clauses = ["r.runnumber >= '{}'".format(min_run_number)]
+        else:
+            where_clauses = ["r.runnumber > '{}'".format(high_water_mark)]
+        where_clauses += build_chunked_where_clauses(self.pending_runs(), "r.runnumber")
+
+        pairs = []
+        for where_clause in where_clauses:
+            query = fill_numbers_query(where_clause)
+            pairs.extend(client.execute_query(query, refresh=True).get("data", []))
+        self.update(pairs)
+        return len(pairs)
+
+    def __contains__(self, run_number):
+        runs = self._index[0]
+        index = bisect_left(runs, int(run_number))
+        return index < len(runs) and runs[index] == int(run_number)
+
+    def __len__(self):
+        return len(self._index[0])
+
+    def fill_numbers(self, list_of_run_numbers):
+        """
+        :param list_of_run_numbers: list of run numbers
+        :return: [run number, fill number] of the indexed runs, ordered by run
+        number, the fill number is None if the run has none
+        """
+        runs, fills, _ = self._index
+        rows = []
+        for run_number in sorted({int(run) for run in list_of_run_numbers}):
+            index = bisect_left(runs, run_number)
+            if index < len(runs) and runs[index] == run_number:
+                fill_number = fills[index]
+                if fill_number == MISSING_FILL_NUMBER:
+                    fill_number = None
+                rows.append([run_number, fill_number])
+        return rows
+
+    def run_numbers(self, list_of_fill_numbers):
+        """
+        :param list_of_fill_numbers: list of fill numbers
+        :return: [fill number, run number] of the runs of the fills,
+        ordered by run number
+        """
+        runs_by_fill = self._index[2]
+        rows = [
+            [fill_number, run_number]
+            for fill_number in {int(fill) for fill in list_of_fill_numbers}
+            for run_number in runs_by_fill.get(fill_number, [])
+        ]
+        rows.sort(key=lambda row: row[1])
+        return rows
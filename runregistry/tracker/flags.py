@@ -0,0 +1,158 @@
+"""
+Client-side evaluation of lumi section flags
+
+The beam, cms_active and DCS flags of every lumi section range are packed into
+one bitmask, so that arbitrary flag selections can be evaluated locally with
+vectorized operations instead of a new server-side query per selection.
+
+Requires the optional numpy dependency.
+"""
+from runregistry.columnar import require_numpy
+from runregistry.tracker.queries import TRACKER_DCS_LIST
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+FLAGS = [
+    "cms_active",
+    "beam1_stable",
+    "beam2_stable",
+    "beam1_present",
+    "beam2_present",
+    "tibtid",
+    "tob",
+    "tecp",
+    "tecm",
+    "bpix",
+    "fpix",
+]
+
+FLAG_BITS = {flag: 1 << bit for bit, flag in enumerate(FLAGS)}
+
+
+def flag_mask(flags):
+    """
+    Example:
+    >>> flag_mask(["cms_active", "Tob"])
+    65
+
+    :param flags: list of flag names, DCS names are case insensitive
+    :return: bitmask with the bits of the given flags set
+    """
+    mask = 0
+    for flag in flags:
+        mask |= FLAG_BITS[flag.lower()]
+    return mask
+
+
+def encode_flags(columns):
+    """
+    :param columns: dictionary of flag name to boolean numpy array
+    :return: numpy array of bitmasks
+    """
+    require_numpy()
+    masks = numpy.zeros(len(columns[FLAGS[0]]), dtype=numpy.uint16)
+    for flag in FLAGS:
+        masks |= columns[flag].astype(numpy.uint16) * numpy.uint16(FLAG_BITS[flag])
+    return masks
+
+
+class LumiFlags:
+    """
+    Lumi section ranges with their flags encoded as bitmasks
+
+    Example:
+    >>> from runregistry.tracker.client import TrackerRunRegistryClient
+    >>> client = TrackerRunRegistryClient()
+    >>> lumi_flags = client.get_lumi_flags_by_range("323472", "323485")
+    >>> pixel_only = lumi_flags.tracker_selection(["Bpix", "Fpix"], "and")
+    >>> len(lumi_flags.active_lumi_sections(pixel_only)) > 0
+    True
+    """
+
+    def __init__(self, columns):
+        """
+        :param columns: dictionary of column name to numpy array,
+        e.g. the typed columns of the dataset_lumis table
+        """
+        require_numpy()
+        self.run_numbers = columns["run_number"]
+        self.section_counts = columns["section_count"]
+        self.section_from = columns["section_from"]
+        self.section_to = columns["section_to"]
+        self.dataset_names, self.dataset_codes = numpy.unique(
+            columns["dataset"].astype(str), return_inverse=True
+        )
+        self.masks = encode_flags(columns)
+
+    def __len__(self):
+        return len(self.masks)
+
+    def all_of(self, flags):
+        """
+        :return: boolean array, True where all flags are set
+        """
+        mask = numpy.uint16(flag_mask(flags))
+        return (self.masks & mask) == mask
+
+    def any_of(self, flags):
+        """
+        :return: boolean array, True where at least one of the flags is set
+        """
+        return (self.masks & numpy.uint16(flag_mask(flags))) != 0
+
+    def none_of(self, flags):
+        """
+        :return: boolean array, True where none of the flags is set
+        """
+        return ~self.any_of(flags)
+
+    def dataset_contains(self, text):
+        """
+        :return: boolean array, True where the dataset name contains the text
+        """
+        names = numpy.array([text in name for name in self.dataset_names], bool)
+        return names[self.dataset_codes]
+
+    def tracker_selection(self, dcs_list=TRACKER_DCS_LIST, logical_connector="or"):
+        """
+        Selection of the active lumi sections of the Tracker:
+        cms_active, both beams stable (or a Cosmics dataset) and the
+        DCS of the given partitions ready.
+
+        :param dcs_list: list of Detector Control Systems which should be ready
+        :param logical_connector: How the dcs should be connected ("and"/"or")
+        :return: boolean array
+        """
+        if logical_connector.lower() == "and":
+            dcs_ready = self.all_of(dcs_list)
+        else:
+            dcs_ready = self.any_of(dcs_list)
+        beams = self.all_of(["beam1_stable", "beam2_stable"])
+        beams |= self.dataset_contains("Cosmics")
+        return self.all_of(["cms_active"]) & beams & dcs_ready
+
+    def active_lumi_sections(self, selection):
+        """
+        Sums the lumi sections of the selected ranges per run and dataset
+
+        :param selection: boolean array, e.g. from tracker_selection
+        :return: list of dictionaries containing run_number, dataset and
+        lumi_sections, sorted by run number and dataset
+        """
+        runs = self.run_numbers[selection]
+        codes = self.dataset_codes[selection]
+        counts = self.section_counts[selection]
+        keys = runs.astype(numpy.int64) * len(self.dataset_names) + codes
+        unique_keys, inverse = numpy.unique(keys, return_inverse=True)
+        sums = numpy.bincount(inverse, weights=counts).astype(numpy.int64)
+        return [
+            {
+                "run_number": int(key // len(self.dataset_names)),
+                "dataset": str(self.dataset_names[key % len(self.dataset_names)]),
+                "lumi_sections": int(total),
+            }
+            for key, total in zip(unique_keys, sums)
+        ]
@@ -0,0 +1,220 @@
+"""
+Lumi section interval index
+"""
+from array import array
+from bisect import bisect_right
+
+
+def merge_ranges(ranges):
+    """
+    Sorts lumi section ranges and coalesces overlapping and adjacent ones
+
+    Example:
+    >>> merge_ranges([[11, 20], [1, 10], [30, 40], [35, 36]])
+    [(1, 20), (30, 40)]
+
+    :param ranges: list of (first, last) lumi section ranges
+    :return: sorted list of disjoint (first, last) ranges
+    """
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def _intersect(left, right):
+    result = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        first = max(left[i][0], right[j][0])
+        last = min(left[i][1], right[j][1])
+        if first <= last:
+            result.append((first, last))
+        if left[i][1] < right[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def _subtract(left, right):
+    result = []
+    j = 0
+    for first, last in left:
+        while j < len(right) and right[j][1] < first:
+            j += 1
+        k = j
+        while k < len(right) and right[k][0] <= last:
+            if right[k][0] > first:
+                result.append((first, right[k][0] - 1))
+            first = max(first, right[k][1] + 1)
+            k += 1
+        if first <= last:
+            result.append((first, last))
+    return result
+
+
+class LumiIndex:
+    """
+    Sorted, disjoint lumi section ranges per run
+
+    Ranges are stored in typed arrays, so the index needs no Python object per
+    lumi section. Point and range lookups take O(log n) per run.
+
+    Example:
+    >>> good = LumiIndex({323472: [[1, 10], [11, 94]], 323475: [[5, 8]]})
+    >>> (323472, 50) in good
+    True
+    >>> bad = LumiIndex({323472: [[20, 30]]})
+    >>> (good - bad).to_json()
+    {'323472': [[1, 19], [31, 94]], '323475': [[5, 8]]}
+    """
+
+    def __init__(self, ranges=None):
+        """
+        :param ranges: dictionary of run number to list of [first, last] ranges
+        """
+        self._runs = {}
+        for run_number, run_ranges in (ranges or {}).items():
+            self._set_ranges(int(run_number), merge_ranges(run_ranges))
+
+    @classmethod
+    def from_records(cls, records, datasets=None, flags=None):
+        """
+        Builds the index from lumi section records, e.g. the result of
+        TrackerRunRegistryClient.get_lumi_sections_by_range
+
+        Example:
+        >>> lumis = [
+        ...     {"run_number": 1, "dataset": "/A", "section_from": 1, "section_to": 5, "tob": True},
+        ...     {"run_number": 1, "dataset": "/A", "section_from": 6, "section_to": 9, "tob": False},
+        ...     {"run_number": 1, "dataset": "/B", "section_from": 1, "section_to": 9, "tob": True},
+        ... ]
+        >>> LumiIndex.from_records(lumis, datasets=["/A"], flags=["tob"]).to_json()
+        {'1': [[1, 5]]}
+
+        :param records: iterable of lumi section dictionaries or records
+        :param datasets: only use records of these datasets
+        :param flags: only use records where all of these flags are set
+        :return: LumiIndex
+        """
+        datasets = set(datasets) if datasets is not None else None
+        flags = list(flags or [])
+        ranges = {}
+        for record in records:
+            if datasets is not None and record["dataset"] not in datasets:
+                continue
+            if not all(record[flag] for flag in flags):
+                continue
+            ranges.setdefault(record["run_number"], []).append(
+                (record["section_from"], record["section_to"])
+            )
+        return cls(ranges)
+
+    def _set_ranges(self, run_number, ranges):
+        if ranges:
+            self._runs[run_number] = (
+                array("q", [first for first, _ in ranges]),
+                array("q", [last for _, last in ranges]),
+            )
+        else:
+            self._runs.pop(run_number, None)
+
+    def ranges(self, run_number):
+        """
+        :param run_number: run number
+        :return: sorted list of disjoint (first, last) ranges of the run
+        """
+        firsts, lasts = self._runs.get(run_number, ((), ()))
+        return list(zip(firsts, lasts))
+
+    def runs(self):
+        """
+        :return: sorted list of run numbers contained in the index
+        """
+        return sorted(self._runs)
+
+    def contains(self, run_number, lumi_section):
+        """
+        :return: True if the lumi section of the run is in the index
+        """
+        if run_number not in self._runs:
+            return False
+        firsts, lasts = self._runs[run_number]
+        index = bisect_right(firsts, lumi_section) - 1
+        return index >= 0 and lasts[index] >= lumi_section
+
+    def __contains__(self, item):
+        run_number, lumi_section = item
+        return self.contains(run_number, lumi_section)
+
+    def lookup(self, run_number, first, last):
+        """
+        Ranges of the index within [first, last] of the given run
+
+        :return: sorted list of (first, last) ranges clipped to [first, last]
+        """
+        if run_number not in self._runs:
+            return []
+        firsts, lasts = self._runs[run_number]
+        start = max(bisect_right(firsts, first) - 1, 0)
+        stop = bisect_right(firsts, last)
+        return _intersect(
+            list(zip(firsts[start:stop], lasts[start:stop])), [(first, last)]
+        )
+
+    def count(self, run_number=None):
+        """
+        :param run_number: count only the lumi sections of this run
+        :return: amount of lumi sections in the index
+        """
+        run_numbers = self._runs if run_number is None else [run_number]
+        return sum(
+            sum(lasts) - sum(firsts) + len(firsts)
+            for firsts, lasts in (self._runs.get(run, ((), ())) for run in run_numbers)
+        )
+
+    def _combine(self, other, operation, run_numbers):
+        result = LumiIndex()
+        for run_number in run_numbers:
+            ranges = operation(self.ranges(run_number), other.ranges(run_number))
+            result._set_ranges(run_number, ranges)
+        return result
+
+    def union(self, other):
+        return self._combine(
+            other,
+            lambda left, right: merge_ranges(left + right),
+            set(self._runs) | set(other._runs),
+        )
+
+    def intersection(self, other):
+        return self._combine(other, _intersect, set(self._runs) & set(other._runs))
+
+    def difference(self, other):
+        return self._combine(other, _subtract, set(self._runs))
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def __eq__(self, other):
+        return isinstance(other, LumiIndex) and self._runs == other._runs
+
+    def __len__(self):
+        return len(self._runs)
+
+    def to_json(self):
+        """
+        Golden JSON style dictionary of run number to merged lumi section ranges
+
+        :return: dictionary of run number (as string) to list of [first, last]
+        """
+        return {
+            str(run_number): [[first, last] for first, last in self.ranges(run_number)]
+            for run_number in self.runs()
+        }
@@ -0,0 +1,263 @@
+"""
+Local mirror of the runreg_tracker tables
+
+The mirror is a SQLite database attached as runreg_tracker, containing the
+columns of the runs, datasets and dataset_lumis tables used by the
+TrackerRunRegistryClient, so that the SQL queries of its getters can be
+answered locally without changes.
+"""
+import os
+import sqlite3
+import threading
+
+from runregistry.utilities import build_chunked_where_clauses
+
+TABLES = {
+    "runs": ["runnumber", "lhcfill"],
+    "datasets": [
+        "run_number",
+        "run_class_name",
+        "rda_name",
+        "rda_state",
+        "rda_last_shifter",
+        "rda_cmp_pixel",
+        "rda_cmp_strip",
+        "rda_cmp_tracking",
+        "rda_cmp_pixel_cause",
+        "rda_cmp_strip_cause",
+        "rda_cmp_tracking_cause",
+    ],
+    "dataset_lumis": [
+        "rdr_run_number",
+        "rdr_rda_name",
+        "rdr_range",
+        "lhcfill",
+        "rdr_section_from",
+        "rdr_section_to",
+        "rdr_section_count",
+        "cms_active",
+        "beam1_stable",
+        "beam2_stable",
+        "beam1_present",
+        "beam2_present",
+        "tibtid_ready",
+        "tob_ready",
+        "tecp_ready",
+        "tecm_ready",
+        "bpix_ready",
+        "fpix_ready",
+    ],
+}
+
+RUN_NUMBER_COLUMNS = {
+    "runs": "runnumber",
+    "datasets": "run_number",
+    "dataset_lumis": "rdr_run_number",
+}
+
+INTEGER_COLUMNS = {
+    "runnumber",
+    "run_number",
+    "rdr_run_number",
+    "rdr_range",
+    "lhcfill",
+    "rdr_section_from",
+    "rdr_section_to",
+    "rdr_section_count",
+}
+
+FINAL_STATES = ["COMPLETED"]
+
+
+def mirror_query(table, where_clause):
+    """
+    Example:
+    >>> mirror_query("runs", "r.runnumber > '323470'")
+    "select r.runnumber, r.lhcfill from runreg_tracker.runs r where r.runnumber > '323470'"
+
+    :param table: name of the mirrored table
+    :param where_clause: where clause
+    :return: SQL query selecting the mirrored columns of the table
+    """
+    return "select {} from runreg_tracker.{} r where {}".format(
+        ", ".join("r.{}".format(column) for column in TABLES[table]),
+        table,
+        where_clause,
+    )
+
+
+class TrackerMirror:
+    """
+    Incrementally synchronized local copy of the runreg_tracker tables
+
+    The first sync downloads all runs from min_run_number on. Later syncs
+    only download runs above the high-water mark (the highest mirrored run
+    number) and refresh runs that are still changing: runs with a dataset
+    whose state is not final yet and recent runs without any dataset.
+
+    Downloaded pages are written into staging tables as they arrive and
+    replace the mirrored runs at the end of the sync in one transaction.
+
+    Example:
+    >>> import tempfile
+    >>> from runregistry.tracker.client import TrackerRunRegistryClient
+    >>> mirror = TrackerMirror(tempfile.mkdtemp(), min_run_number=323400)
+    >>> client = TrackerRunRegistryClient()
+    >>> mirror.sync(client) > 0
+    True
+    >>> client.mirror = mirror
+    >>> client.get_runs_by_range("323471", "323475")[0]["run_class"]
+    'Collisions18'
+    """
+
+    DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "runregistry")
+
+    def __init__(
+        self, directory=DEFAULT_DIRECTORY, min_run_number=0, pending_window=1000
+    ):
+        """
+        :param directory: directory containing the mirror database
+        :param min_run_number: first run number of the mirror
+        :param pending_window: runs without dataset are refreshed while they
+        are at most this many run numbers below the high-water mark,
+        None refreshes all of them
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "runreg_tracker.sqlite")
+        self.min_run_number = min_run_number
+        self.pending_window = pending_window
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(":memory:", check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "attach database ? as runreg_tracker", (self.path,)
+            )
+            for table, columns in TABLES.items():
+                definition = ", ".join(
+                    column + " integer" if column in INTEGER_COLUMNS else column
+                    for column in columns
+                )
+                for name in [table, "sync_" + table]:
+                    self._connection.execute(
+                        "create table if not exists runreg_tracker.{} ({})".format(
+                            name, definition
+                        )
+                    )
+                self._connection.execute(
+                    "create index if not exists runreg_tracker.{0}_run "
+                    "on {0} ({1})".format(table, RUN_NUMBER_COLUMNS[table])
+                )
+
+    def high_water_mark(self):
+        """
+        :return: highest mirrored run number or None if the mirror is empty
+        """
+        with self._lock:
+            return self._connection.execute(
+                "select max(runnumber) from runreg_tracker.runs"
+            ).fetchone()[0]
+
+    def pending_runs(self):
+        """
+        Runs without dataset further below the high-water mark than the
+        pending_window are not pending anymore, e.g. runs that are never
+        certified by the tracker.
+
+        :return: sorted list of mirrored run numbers that can still change
+        """
+        parameters = list(FINAL_STATES)
+        window_clause = ""
+        if self.pending_window is not None:
+            window_clause = (
+                "runnumber >= (select max(runnumber) from runreg_tracker.runs) - ? "
+                "and "
+            )
+            parameters.append(self.pending_window)
+        with self._lock:
+            rows = self._connection.execute(
+                "select run_number from runreg_tracker.datasets "
+                "where rda_state is null or rda_state not in ({}) "
+                "union select runnumber from runreg_tracker.runs "
+                "where {}runnumber not in "
+                "(select run_number from runreg_tracker.datasets)".format(
+                    ", ".join("?" for _ in FINAL_STATES), window_clause
+                ),
+                parameters,
+            ).fetchall()
+        return sorted(row[0] for row in rows)
+
+    def _stage(self, client, table, where_clauses):
+        """
+        Writes the downloaded rows of the table into its staging table
+        page by page
+
+        :return: amount of downloaded rows
+        :raises requests.ConnectionError: if a query could not be executed
+        """
+        insert = "insert into runreg_tracker.sync_{} values ({})".format(
+            table, ", ".join("?" for _ in TABLES[table])
+        )
+        count = 0
+        for where_clause in where_clauses:
+            for page in client.iter_query_pages(mirror_query(table, where_clause)):
+                with self._lock, self._connection:
+                    self._connection.executemany(insert, page)
+                count += len(page)
+            if client.last_query_plan.error is not None:
+                raise client.last_query_plan.error
+        return count
+
+    def sync(self, client):
+        """
+        Downloads new and changing runs from the Run Registry
+
+        The mirrored runs are left unchanged if a download fails.
+
+        :param client: RunRegistryClient used to download the runs
+        :return: amount of downloaded rows
+        :raises requests.ConnectionError: if the Run Registry is not reachable
+        :raises runregistry.client.PageNotAvailable: if a page failed
+        """
+        high_water_mark = self.high_water_mark()
+        pending_runs = self.pending_runs()
+        with self._lock, self._connection:
+            for table in TABLES:
+                self._connection.execute("delete from runreg_tracker.sync_" + table)
+
+        count = 0
+        for table, column in RUN_NUMBER_COLUMNS.items():
+            attribute = "r.{}".format(column)
+            if high_water_mark is None:
+                where_clauses = ["{} >= '{}'".format(attribute, self.min_run_number)]
+            else:
+                where_clauses = ["{} > '{}'".format(attribute, high_water_mark)]
+            where_clauses += build_chunked_where_clauses(pending_runs, attribute)
+            count += self._stage(client, table, where_clauses)
+
+        with self._lock, self._connection:
+            for table, column in RUN_NUMBER_COLUMNS.items():
+                self._connection.executemany(
+                    "delete from runreg_tracker.{} where {} = ?".format(table, column),
+                    [(run_number,) for run_number in pending_runs],
+                )
+                self._connection.execute(
+                    "insert into runreg_tracker.{0} "
+                    "select * from runreg_tracker.sync_{0}".format(table)
+                )
+                self._connection.execute("delete from runreg_tracker.sync_" + table)
+        return count
+
+    def execute(self, query, parameters=None):
+        """
+        Answers a query on the runreg_tracker tables from the mirror
+
+        :param query: SQL query string
+        :param parameters: dictionary of the values of named query parameters
+        :return: list of rows
+        """
+        with self._lock:
+            rows = self._connection.execute(query, parameters or {})
+            return [list(row) for row in rows]
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,163 @@
+"""
+SQL queries and result keys of the Tracker Workspace of the Run Registry
+
+Shared by the synchronous and the asynchronous tracker clients.
+"""
+from runregistry.tracker.utilities import build_dcs_query_string
+from runregistry.utilities import record_class
+
+DATASET_RUNS_KEYS = [
+    "run_number",
+    "run_class",
+    "dataset",
+    "state",
+    "shifter",
+    "pixel",
+    "sistrip",
+    "tracking",
+    "pixel_lowstat",
+    "sistrip_lowstat",
+    "tracking_lowstat",
+]
+
+DATASET_LUMIS_KEYS = [
+    "run_number",
+    "lhcfill",
+    "dataset",
+    "section_from",
+    "section_to",
+    "section_count",
+    "cms_active",
+    "beam1_stable",
+    "beam2_stable",
+    "beam1_present",
+    "beam2_present",
+    "tibtid",
+    "tob",
+    "tecp",
+    "tecm",
+    "bpix",
+    "fpix",
+]
+
+ACTIVE_LUMI_RUNS_KEYS = [
+    "run_number",
+    "run_class",
+    "dataset",
+    "lumi_sections",
+    "state",
+    "shifter",
+    "pixel",
+    "sistrip",
+    "tracking",
+    "pixel_lowstat",
+    "sistrip_lowstat",
+    "tracking_lowstat",
+]
+
+FILL_NUMBER_KEYS = ["run_number", "fill_number"]
+
+DATASET_LUMIS_DTYPES = {
+    "run_number": "int64",
+    "lhcfill": "int64",
+    "section_from": "int64",
+    "section_to": "int64",
+    "section_count": "int64",
+    "cms_active": "bool",
+    "beam1_stable": "bool",
+    "beam2_stable": "bool",
+    "beam1_present": "bool",
+    "beam2_present": "bool",
+    "tibtid": "bool",
+    "tob": "bool",
+    "tecp": "bool",
+    "tecm": "bool",
+    "bpix": "bool",
+    "fpix": "bool",
+}
+
+ACTIVE_LUMI_RUNS_DTYPES = {"run_number": "int64", "lumi_sections": "int64"}
+
+DatasetRun = record_class("DatasetRun", DATASET_RUNS_KEYS)
+DatasetLumis = record_class("DatasetLumis", DATASET_LUMIS_KEYS)
+ActiveLumiRun = record_class("ActiveLumiRun", ACTIVE_LUMI_RUNS_KEYS)
+FillNumber = record_class("FillNumber", FILL_NUMBER_KEYS)
+
+TRACKER_DCS_LIST = ["Tibtid", "TecM", "TecP", "Tob", "Bpix", "Fpix"]
+
+
+def dataset_runs_query(where_clause):
+    return (
+        "select r.run_number, r.run_class_name, r.rda_name, r.rda_state, "
+        "r.rda_last_shifter, r.rda_cmp_pixel, r.rda_cmp_strip, "
+        "r.rda_cmp_tracking, r.rda_cmp_pixel_cause, r.rda_cmp_strip_cause, "
+        "r.rda_cmp_tracking_cause "
+        "from runreg_tracker.datasets r "
+        "where {} "
+        "and r.rda_name != '/Global/Online/ALL'".format(where_clause)
+    )
+
+
+def dataset_lumis_query(where_clause):
+    return (
+        "select r.rdr_run_number, r.lhcfill, r.rdr_rda_name, r.rdr_section_from, "
+        "r.rdr_section_to, r.rdr_section_count, "
+        "r.cms_active, r.beam1_stable, r.beam2_stable, r.beam1_present, "
+        "r.beam2_present, r.tibtid_ready, r.tob_ready, r.tecp_ready, "
+        "r.tecm_ready, r.bpix_ready, r.fpix_ready "
+        "from runreg_tracker.dataset_lumis r "
+        "where r.rdr_rda_name != '/Global/Online/ALL' "
+        "and {} "
+        "order by r.rdr_run_number, r.rdr_rda_name, r.rdr_range".format(where_clause)
+    )
+
+
+def active_lumi_runs_query(where_clause):
+    return (
+        "select r.run_number, r.run_class_name, r.rda_name, "
+        "sum(l.rdr_section_count) as lumi_sections, "
+        "r.rda_state, r.rda_last_shifter, r.rda_cmp_pixel, r.rda_cmp_strip, "
+        "r.rda_cmp_tracking, r.rda_cmp_pixel_cause, r.rda_cmp_strip_cause, "
+        "r.rda_cmp_tracking_cause "
+        "from runreg_tracker.dataset_lumis l, runreg_tracker.datasets r "
+        "where l.rdr_run_number = r.run_number "
+        "and l.rdr_rda_name = r.rda_name "
+        "and l.rdr_rda_name != '/Global/Online/ALL' "
+        "and l.cms_active = 1 "
+        "and (l.beam1_stable = 1 "
+        "and l.beam2_stable = 1 "
+        "or l.rdr_rda_name LIKE '%Cosmics%') "
+        "and ({}) ".format(build_dcs_query_string(TRACKER_DCS_LIST, "l", "or"))
+        + "and {} ".format(where_clause)
+        + "group by r.run_number, r.rda_name, r.run_class_name, "
+        "r.rda_state, r.rda_last_shifter, r.rda_cmp_pixel, r.rda_cmp_strip, "
+        "r.rda_cmp_tracking, r.rda_cmp_pixel_cause, r.rda_cmp_strip_cause, "
+        "r.rda_cmp_tracking_cause "
+    )
+
+
+def fill_numbers_query(where_clause):
+    return (
+        "select r.runnumber, r.lhcfill "
+        "from runreg_tracker.runs r "
+        "where {} "
+        "order by r.runnumber".format(where_clause)
+    )
+
+
+def unique_fill_numbers_query(where_clause):
+    return (
+        "select r.lhcfill "
+        "from runreg_tracker.runs r "
+        "where {} "
+        "order by r.runnumber".format(where_clause)
+    )
+
+
+def grouped_fill_numbers_query(where_clause):
+    return (
+        "select r.lhcfill, r.runnumber "
+        "from runreg_tracker.runs r "
+        "where {} "
+        "order by r.runnumber".format(where_clause)
+    )
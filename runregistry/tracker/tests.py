@@ -1,6 +1,33 @@
+import os
+import re
+import tempfile
 import unittest
+from unittest.mock import MagicMock, patch
 
+import requests
+
+try:
+    import numpy
+    from runregistry.columnar import rows_to_columns
+    from runregistry.tracker.flags import LumiFlags
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+from runregistry.client import QueryPlan
+from runregistry.tests import async_mock, run_async
+from runregistry.tracker.aio import AsyncTrackerRunRegistryClient
+from runregistry.tracker.client import TrackerRunRegistryClient
+from runregistry.tracker.fills import FillRunIndex
+from runregistry.tracker.lumis import LumiIndex
+from runregistry.tracker.mirror import TABLES, TrackerMirror
+from runregistry.tracker.queries import DATASET_LUMIS_DTYPES, DATASET_LUMIS_KEYS
 from runregistry.tracker.utilities import transform_lowstat_to_boolean
+from runregistry.utilities import build_list_where_clause
 
 
 class TestTrackerUtilities(unittest.TestCase):
@@ -28,3 +55,444 @@ class TestTrackerUtilities(unittest.TestCase):
         self.assertFalse(run_dict["pixel_lowstat"])
         self.assertTrue(run_dict["sistrip_lowstat"])
         self.assertFalse(run_dict["tracking_lowstat"])
+
+
+class TestLumiIndex(unittest.TestCase):
+    def test_lookups(self):
+        index = LumiIndex({323472: [[20, 30], [1, 10], [11, 15], [40, 40]]})
+
+        self.assertEqual([(1, 15), (20, 30), (40, 40)], index.ranges(323472))
+        self.assertIn((323472, 15), index)
+        self.assertNotIn((323472, 16), index)
+        self.assertNotIn((323473, 1), index)
+        self.assertEqual([(5, 15), (20, 25)], index.lookup(323472, 5, 25))
+        self.assertEqual(27, index.count())
+
+    def test_set_operations(self):
+        lumis = [
+            [1, 7000, "/A", 1, 50, 50, True, True, True, True, True, True],
+            [1, 7000, "/A", 51, 99, 49, True, False, True, True, True, True],
+            [1, 7000, "/B", 20, 80, 61, True, True, True, True, True, True],
+            [2, 7000, "/B", 1, 9, 9, True, True, True, True, True, True],
+        ]
+        keys = ["run_number", "lhcfill", "dataset", "section_from", "section_to"]
+        keys += ["section_count", "cms_active", "beam1_stable", "beam2_stable"]
+        keys += ["beam1_present", "beam2_present", "tob"]
+        records = [dict(zip(keys, lumi)) for lumi in lumis]
+
+        dataset_a = LumiIndex.from_records(records, datasets=["/A"])
+        dataset_b = LumiIndex.from_records(records, datasets=["/B"])
+        stable = LumiIndex.from_records(records, flags=["beam1_stable"])
+        stable_a = LumiIndex.from_records(records, ["/A"], ["beam1_stable"])
+
+        self.assertEqual({"1": [[1, 99]]}, dataset_a.to_json())
+        self.assertEqual({"1": [[20, 80]]}, (dataset_a & dataset_b).to_json())
+        self.assertEqual({"1": [[1, 19], [81, 99]]}, (dataset_a - dataset_b).to_json())
+        self.assertEqual(
+            {"1": [[1, 99]], "2": [[1, 9]]}, (dataset_a | dataset_b).to_json()
+        )
+        self.assertEqual({"1": [[81, 99]]}, (dataset_a - stable).to_json())
+        self.assertEqual({"1": [[51, 99]]}, (dataset_a - stable_a).to_json())
+
+    def test_many_sections(self):
+        ranges = {
+            run: [[lumi, lumi] for lumi in range(1, 2001, 2)] for run in range(500)
+        }
+
+        index = LumiIndex(ranges)
+
+        self.assertEqual(500 * 1000, index.count())
+        self.assertIn((499, 1999), index)
+        self.assertNotIn((499, 1998), index)
+
+
+@unittest.skipIf(numpy is None, "requires numpy")
+class TestLumiFlags(unittest.TestCase):
+    def setUp(self):
+        lumis = [
+            [1, 7000, "/Express/Collisions/DQM", 1, 50, 50] + [True] * 11,
+            [1, 7000, "/Express/Collisions/DQM", 51, 60, 10] + [True] * 8 + [False] * 3,
+            [1, 7000, "/Express/Collisions/DQM", 61, 70, 10] + [True] + [False] * 10,
+            [2, 7001, "/Express/Cosmics/DQM", 1, 9, 9]
+            + [True]
+            + [False] * 4
+            + [True] * 6,
+        ]
+        columns = rows_to_columns([lumis], DATASET_LUMIS_KEYS, DATASET_LUMIS_DTYPES)
+        self.lumi_flags = LumiFlags(columns)
+
+    def test_masks(self):
+        self.assertEqual(4, len(self.lumi_flags))
+        self.assertEqual(
+            [True, True, False, True],
+            self.lumi_flags.all_of(["cms_active", "tob"]).tolist(),
+        )
+        self.assertEqual(
+            [False, True, True, False],
+            self.lumi_flags.none_of(["Bpix", "Fpix"]).tolist(),
+        )
+
+    def test_tracker_selection(self):
+        any_dcs = self.lumi_flags.tracker_selection()
+        all_dcs = self.lumi_flags.tracker_selection(logical_connector="and")
+
+        self.assertEqual([True, True, False, True], any_dcs.tolist())
+        self.assertEqual([True, False, False, True], all_dcs.tolist())
+
+    def test_active_lumi_sections(self):
+        selection = self.lumi_flags.tracker_selection()
+
+        expected = [
+            {
+                "run_number": 1,
+                "dataset": "/Express/Collisions/DQM",
+                "lumi_sections": 60,
+            },
+            {"run_number": 2, "dataset": "/Express/Cosmics/DQM", "lumi_sections": 9},
+        ]
+        self.assertEqual(expected, self.lumi_flags.active_lumi_sections(selection))
+
+
+class TestFillRunIndex(unittest.TestCase):
+    def test_fill_helpers_use_index(self):
+        tracker = TrackerRunRegistryClient()
+        tracker.fill_index = FillRunIndex()
+        responses = {
+            "r.runnumber >= '0'": [
+                [321171, 7048],
+                [321179, 7048],
+                [321182, 7049],
+                [321185, None],
+            ],
+            "r.runnumber > '321185'": [[321190, 7050]],
+            "r.runnumber in ('321185')": [[321185, 7049]],
+        }
+
+        def execute_query(query, parameters=None, refresh=False):
+            where_clause = re.search(r"where (.*) order by", query).group(1)
+            return {"data": responses[where_clause]}
+
+        tracker.execute_query = MagicMock(side_effect=execute_query)
+
+        fills = [tracker.get_fill_number_by_run_number([run]) for run in [321171] * 50]
+        unique_fills = tracker.get_unique_fill_numbers_by_run_number([321185, 321179])
+        runs = tracker.get_run_numbers_by_fill_number([7049, 7048])
+        grouped = tracker.get_grouped_fill_numbers_by_run_number([321190, 321182])
+        queries = [call[0][0] for call in tracker.execute_query.call_args_list]
+        tracker.fill_index = None
+        del tracker.execute_query
+
+        self.assertEqual([{"run_number": 321171, "fill_number": 7048}], fills[-1])
+        self.assertEqual([7048], unique_fills)
+        expected_runs = [
+            {"fill_number": 7048, "run_number": [321171, 321179]},
+            {"fill_number": 7049, "run_number": [321182, 321185]},
+        ]
+        self.assertEqual(expected_runs, runs)
+        expected_grouped = [
+            {"fill_number": 7049, "run_number": [321182]},
+            {"fill_number": 7050, "run_number": [321190]},
+        ]
+        self.assertEqual(expected_grouped, grouped)
+        self.assertEqual(3, len(queries))
+
+
+class TestTrackerMirror(unittest.TestCase):
+    def setUp(self):
+        self.server = TrackerMirror(tempfile.mkdtemp())
+        self.queries = []
+
+        def iter_query_pages(query):
+            self.queries.append(query)
+            self.client.last_query_plan = QueryPlan(query)
+            rows = self.server.execute(query)
+            return iter([rows[:1], rows[1:]] if rows else [])
+
+        self.client = MagicMock(iter_query_pages=iter_query_pages)
+        self.insert_run(1, 7000, "COMPLETED")
+        self.insert_run(2, 7000, "OPEN")
+        self.insert_run(3, 7001, None)
+
+    def insert_run(self, run_number, fill_number, state):
+        rows = {
+            "runs": [[run_number, fill_number]],
+            "datasets": [],
+            "dataset_lumis": [],
+        }
+        if state is not None:
+            rows["datasets"].append(
+                [run_number, "Collisions18", "/Express/DQM", state, "shifter"]
+                + ["GOOD"] * 3
+                + [None] * 3
+            )
+            rows["dataset_lumis"].append(
+                [run_number, "/Express/DQM", 1, fill_number, 1, 10, 10] + [1] * 11
+            )
+        with self.server._connection as connection:
+            for table, table_rows in rows.items():
+                connection.execute(
+                    "delete from runreg_tracker.{} where {} = ?".format(
+                        table, TABLES[table][0]
+                    ),
+                    (run_number,),
+                )
+                connection.executemany(
+                    "insert into runreg_tracker.{} values ({})".format(
+                        table, ", ".join("?" for _ in TABLES[table])
+                    ),
+                    table_rows,
+                )
+
+    def test_incremental_sync(self):
+        mirror = TrackerMirror(tempfile.mkdtemp())
+
+        self.assertEqual(7, mirror.sync(self.client))
+        self.assertEqual(3, mirror.high_water_mark())
+        self.assertEqual([2, 3], mirror.pending_runs())
+
+        self.insert_run(2, 7000, "COMPLETED")
+        self.insert_run(3, 7001, "OPEN")
+        self.insert_run(4, 7002, "OPEN")
+        self.queries.clear()
+
+        self.assertEqual(3 * 3, mirror.sync(self.client))
+        self.assertIn("r.runnumber > '3'", self.queries[0])
+        self.assertIn("r.runnumber in ('2', '3')", self.queries[1])
+        self.assertEqual(4, mirror.high_water_mark())
+        self.assertEqual([3, 4], mirror.pending_runs())
+
+        self.insert_run(5, 7003, None)
+        self.insert_run(6, 7003, "OPEN")
+        self.assertEqual(1 + 3 + 2 * 3, mirror.sync(self.client))
+        self.assertEqual([3, 4, 5, 6], mirror.pending_runs())
+
+        self.insert_run(5, 7003, "OPEN")
+        self.queries.clear()
+        self.assertEqual(4 * 3, mirror.sync(self.client))
+        self.assertIn("r.runnumber >= '3' and r.runnumber <= '6'", self.queries[1])
+        self.assertEqual([3, 4, 5, 6], mirror.pending_runs())
+
+        self.insert_run(7, 7004, None)
+        self.insert_run(8, 7004, "COMPLETED")
+        mirror.sync(self.client)
+        directory = os.path.dirname(mirror.path)
+        self.assertEqual([3, 4, 5, 6, 7], mirror.pending_runs())
+        self.assertEqual(
+            [3, 4, 5, 6], TrackerMirror(directory, pending_window=0).pending_runs()
+        )
+
+    def test_failed_sync(self):
+        mirror = TrackerMirror(tempfile.mkdtemp())
+        mirror.sync(self.client)
+        query = "select r.rdr_run_number from runreg_tracker.dataset_lumis r"
+        self.insert_run(4, 7002, "OPEN")
+
+        def iter_query_pages(query):
+            if "dataset_lumis" in query:
+                self.client.last_query_plan = QueryPlan(query)
+                self.client.last_query_plan.error = requests.ConnectionError()
+                return iter([])
+            return original_iter_query_pages(query)
+
+        original_iter_query_pages = self.client.iter_query_pages
+        self.client.iter_query_pages = iter_query_pages
+        with self.assertRaises(requests.ConnectionError):
+            mirror.sync(self.client)
+        self.client.iter_query_pages = original_iter_query_pages
+
+        self.assertEqual([[1], [2]], mirror.execute(query))
+        self.assertEqual(3, mirror.high_water_mark())
+        self.assertEqual(3 + 3 + 1, mirror.sync(self.client))
+        self.assertEqual([[1], [2], [4]], mirror.execute(query))
+
+    def test_getters_answer_from_mirror(self):
+        mirror = TrackerMirror(tempfile.mkdtemp())
+        mirror.sync(self.client)
+        tracker = TrackerRunRegistryClient()
+        tracker.mirror = mirror
+        tracker.execute_query = MagicMock()
+
+        runs = tracker.get_runs_by_range("2", "3")
+        active_runs = tracker.get_active_lumi_runs_by_list([1, 2])
+        fills = tracker.get_grouped_fill_numbers_by_run_number([1, 2, 3])
+        call_count = tracker.execute_query.call_count
+        tracker.mirror = None
+        del tracker.execute_query
+
+        self.assertEqual(0, call_count)
+        self.assertEqual([2], [run["run_number"] for run in runs])
+        self.assertEqual("OPEN", runs[0]["state"])
+        self.assertEqual([10, 10], [run["lumi_sections"] for run in active_runs])
+        self.assertEqual([1, 2, 3], fills[0]["run_number"][:2] + fills[1]["run_number"])
+
+
+class TestTrackerRunRegistryClient(unittest.TestCase):
+    def test_iter_lumi_sections_by_range(self):
+        tracker = TrackerRunRegistryClient()
+        row = [323472, 7217, "/PromptReco/Collisions2018D/DQM", 1, 94, 94]
+        row += [True] * 11
+        tracker.iter_query = MagicMock(return_value=iter([row, row]))
+
+        lumis = tracker.iter_lumi_sections_by_range("323472", "323485")
+        first = next(lumis)
+
+        self.assertEqual(94, first["section_count"])
+        self.assertEqual(7217, first["lhcfill"])
+        self.assertEqual(1, len(list(lumis)))
+        query = tracker.iter_query.call_args[0][0]
+        parameters = tracker.iter_query.call_args[1]["parameters"]
+        self.assertIn("r.rdr_run_number >= :n__min_run_number", query)
+        self.assertEqual(
+            {"n__min_run_number": 323472, "n__max_run_number": 323485}, parameters
+        )
+
+    def test_get_active_lumi_runs_by_range(self):
+        tracker = TrackerRunRegistryClient()
+        row = [323472, "Collisions18", "/Express/DQM", 10, "OPEN", "shifter"]
+        row += ["GOOD", "GOOD", "GOOD", "LOW_STATS", None, None]
+        tracker.execute_query = MagicMock(return_value={"data": [row]})
+
+        runs = tracker.get_active_lumi_runs_by_range("323472", "323485")
+        query = tracker.execute_query.call_args[0][0]
+        parameters = tracker.execute_query.call_args[1]["parameters"]
+        del tracker.execute_query
+
+        self.assertEqual(10, runs[0]["lumi_sections"])
+        self.assertTrue(runs[0]["pixel_lowstat"])
+        self.assertIn("r.run_number >= :n__min_run_number", query)
+        self.assertEqual(
+            {"n__min_run_number": 323472, "n__max_run_number": 323485}, parameters
+        )
+
+    def test_get_lumi_sections_by_list_chunked(self):
+        tracker = TrackerRunRegistryClient()
+
+        def execute_query(query, parameters=None):
+            runs = [int(run) for run in re.findall(r"'(\d+)'", query)]
+            return {"data": [[run, 1, "/Express/DQM"] for run in runs]}
+
+        tracker.execute_query = MagicMock(side_effect=execute_query)
+        with patch(
+            "runregistry.tracker.client.build_chunked_where_clauses",
+            lambda items, attribute: [
+                build_list_where_clause(items[:2], attribute),
+                build_list_where_clause(items[2:], attribute),
+            ],
+        ):
+            lumis = tracker.get_lumi_sections_by_list([5, 3, 4, 1])
+        call_count = tracker.execute_query.call_count
+        del tracker.execute_query
+
+        self.assertEqual(2, call_count)
+        self.assertEqual([1, 3, 4, 5], [lumi["run_number"] for lumi in lumis])
+
+    def test_get_run_report(self):
+        tracker = TrackerRunRegistryClient()
+        run = [2, "Collisions18", "/Express/DQM", "OPEN", "shifter", "GOOD"]
+        run += ["GOOD", "GOOD", "LOW_STATS", None, None]
+        lumi = [2, 7000, "/Express/DQM", 1, 10, 10] + [True] * 11
+        responses = {
+            "from runreg_tracker.datasets r": [run],
+            "sum(l.rdr_section_count)": [run[:3] + [10] + run[3:]],
+            "from runreg_tracker.dataset_lumis r": [lumi, lumi],
+            "from runreg_tracker.runs r": [[1, 6999], [2, 7000]],
+        }
+
+        def execute_query(query, parameters=None, refresh=False):
+            key = next(key for key in responses if key in query)
+            return {"data": [list(row) for row in responses[key]]}
+
+        tracker.execute_query = MagicMock(side_effect=execute_query)
+        report = tracker.get_run_report([2, "1", 2])
+        fills = tracker.get_run_report([1, 2], ["fills"])
+        call_count = tracker.execute_query.call_count
+        del tracker.execute_query
+
+        self.assertEqual(5, call_count)
+        self.assertEqual([(2, "/Express/DQM")], list(report))
+        record = report[(2, "/Express/DQM")]
+        self.assertEqual(
+            ("OPEN", 10, 7000),
+            (record["state"], record["lumi_sections"], record["fill_number"]),
+        )
+        self.assertTrue(record["pixel_lowstat"])
+        self.assertEqual(2, len(record["lumis"]))
+        self.assertEqual([(1, None), (2, None)], list(fills))
+        self.assertEqual(6999, fills[(1, None)]["fill_number"])
+        with self.assertRaises(ValueError):
+            tracker.get_run_report([1], ["runs", "flags"])
+        self.assertEqual({}, tracker.get_run_report([1], []))
+
+    def test_get_runs_by_list_compact(self):
+        tracker = TrackerRunRegistryClient()
+        row = [323423, "Collisions18", "/Express/Collisions2018/DQM", "COMPLETED"]
+        row += ["shifter", "GOOD", "GOOD", "GOOD", "LOW_STATS", None, None]
+        tracker.execute_query = MagicMock(return_value={"data": [row]})
+
+        events = []
+        hook = tracker.instrumentation.add_hook(events.append)
+        runs = tracker.get_runs_by_list(["323423"], compact=True)
+        tracker.instrumentation.remove_hook(hook)
+        del tracker.execute_query
+
+        self.assertEqual(["list_to_records"], [event.name for event in events])
+        self.assertEqual(1, events[0].rows)
+        self.assertEqual("COMPLETED", runs[0].state)
+        self.assertEqual("COMPLETED", runs[0]["state"])
+        self.assertTrue(runs[0]["pixel_lowstat"])
+        self.assertFalse(runs[0].sistrip_lowstat)
+
+    @unittest.skipIf(pandas is None, "requires pandas")
+    def test_get_lumi_sections_by_list_as_frame(self):
+        tracker = TrackerRunRegistryClient()
+
+        def execute_query_columnar(query, keys, dtypes, parameters=None):
+            run = int(re.findall(r"'(\d+)'", query)[0])
+            row = [run, None, "/Express/DQM", 1, 10, 10] + [1] * 11
+            return rows_to_columns([[row]], keys, dtypes)
+
+        tracker.execute_query_columnar = MagicMock(side_effect=execute_query_columnar)
+        with patch(
+            "runregistry.tracker.client.build_chunked_where_clauses",
+            lambda items, attribute: [
+                build_list_where_clause([item], attribute) for item in items
+            ],
+        ):
+            frame = tracker.get_lumi_sections_by_list([5, 3], as_frame=True)
+        del tracker.execute_query_columnar
+
+        self.assertEqual([3, 5], frame["run_number"].tolist())
+        self.assertEqual([-1, -1], frame["lhcfill"].tolist())
+        self.assertEqual("bool", frame["tob"].dtype.name)
+
+
+class TestAsyncTrackerRunRegistryClient(unittest.TestCase):
+    def test_get_runs_by_list(self):
+        tracker = AsyncTrackerRunRegistryClient()
+        row = [323423, "Collisions18", "/Express/Collisions2018/DQM", "COMPLETED"]
+        row += ["shifter", "GOOD", "GOOD", "GOOD", "LOW_STATS", None, None]
+        tracker.execute_query = async_mock(return_value={"data": [row]})
+
+        runs = run_async(tracker.get_runs_by_list(["323423"]))
+
+        self.assertEqual(1, len(runs))
+        self.assertEqual("COMPLETED", runs[0]["state"])
+        self.assertTrue(runs[0]["pixel_lowstat"])
+        self.assertFalse(runs[0]["sistrip_lowstat"])
+        query = tracker.execute_query.mock.call_args[0][0]
+        self.assertIn("r.run_number in ('323423')", query)
+
+    def test_get_grouped_fill_numbers_by_run_number(self):
+        tracker = AsyncTrackerRunRegistryClient()
+        rows = [[7048, 321171], [7048, 321179], [7049, 321182]]
+        tracker.execute_query = async_mock(return_value={"data": rows})
+
+        fills = run_async(
+            tracker.get_grouped_fill_numbers_by_run_number([321171, 321179, 321182])
+        )
+
+        expected_fills = [
+            {"fill_number": 7048, "run_number": [321171, 321179]},
+            {"fill_number": 7049, "run_number": [321182]},
+        ]
+        self.assertEqual(expected_fills, fills)
@@ -1,3 +1,7 @@
+from itertools import chain, groupby
+from operator import itemgetter
+
+
 def transform_lowstat_to_boolean(list_of_run_dict):
     """
     Converts the low_stat properties of the list of run dictionaries into
@@ -17,6 +21,25 @@ def transform_lowstat_to_boolean(list_of_run_dict):
     return list_of_run_dict
 
 
+def transform_lowstat_rows_to_boolean(rows, keys):
+    """
+    Converts the low_stat columns of a list of rows into a boolean form
+
+    Example:
+    >>> transform_lowstat_rows_to_boolean([[1, "LOW_STATS"], [2, None]], ["run", "pixel_lowstat"])
+    [[1, True], [2, False]]
+
+    :param rows: list of rows (as list)
+    :param keys: column names of the rows
+    :return: rows
+    """
+    indices = [index for index, key in enumerate(keys) if key.endswith("_lowstat")]
+    for row in rows:
+        for index in indices:
+            row[index] = row[index] == "LOW_STATS"
+    return rows
+
+
 def build_dcs_query_string(dcs_list, table, logical_connector="and"):
     """
     Example:
@@ -33,3 +56,62 @@ def build_dcs_query_string(dcs_list, table, logical_connector="and"):
     return " {} ".format(logical_connector).join(
         ["{}.{}_ready = 1".format(table.lower(), dcs.lower()) for dcs in dcs_list]
     )
+
+
+def group_runs_by_fill_number(rows):
+    """
+    Groups (fill_number, run_number) rows, ordered by run number, by fill number
+
+    Example:
+    >>> group_runs_by_fill_number([[7048, 321171], [7048, 321179], [7049, 321182]])
+    [{'fill_number': 7048, 'run_number': [321171, 321179]}, {'fill_number': 7049, 'run_number': [321182]}]
+
+    :param rows: list of [fill_number, run_number] rows
+    :return: list of dictionaries containing fill number and list of run numbers
+    """
+    groups = groupby(rows, itemgetter(0))
+    return [
+        {"fill_number": key, "run_number": [item[1] for item in value]}
+        for key, value in groups
+    ]
+
+
+def join_run_report(runs=(), active_lumis=(), lumis=(), fills=None):
+    """
+    Joins the views of a run report by hash joins on (run_number, dataset)
+    and on run_number for the fill numbers
+
+    Example:
+    >>> runs = [{"run_number": 1, "dataset": "/Express/DQM", "state": "OPEN"}]
+    >>> active_lumis = [{"run_number": 1, "dataset": "/Express/DQM", "lumi_sections": 5}]
+    >>> fills = [{"run_number": 1, "fill_number": 7048}]
+    >>> join_run_report(runs, active_lumis, fills=fills)
+    {(1, '/Express/DQM'): {'run_number': 1, 'dataset': '/Express/DQM', 'state': 'OPEN', 'lumi_sections': 5, 'fill_number': 7048}}
+
+    :param runs: list of run dictionaries of the datasets
+    :param active_lumis: list of run dictionaries with active lumi sections
+    :param lumis: list of lumi section dictionaries, collected as "lumis"
+    :param fills: list of run and fill number dictionaries, None to not join them
+    :return: dictionary of (run_number, dataset) to joined dictionary,
+    ordered by run number and dataset
+    """
+    report = {}
+    for run in chain(runs, active_lumis):
+        key = (run["run_number"], run["dataset"])
+        report.setdefault(key, {}).update(run)
+    for lumi in lumis:
+        key = (lumi["run_number"], lumi["dataset"])
+        record = report.setdefault(key, {"run_number": key[0], "dataset": key[1]})
+        record.setdefault("lumis", []).append(lumi)
+
+    if fills is not None:
+        fill_numbers = {fill["run_number"]: fill["fill_number"] for fill in fills}
+        if not report:
+            report = {(run, None): {"run_number": run} for run in fill_numbers}
+        for (run_number, _), record in report.items():
+            record["fill_number"] = fill_numbers.get(run_number)
+    return {key: report[key] for key in sorted(report, key=_report_order)}
+
+
+def _report_order(key):
+    return key[0], key[1] or ""
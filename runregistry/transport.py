@@ -0,0 +1,398 @@
+"""
+HTTP transports used by the Run Registry clients
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from runregistry.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout)
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+QUERY_ID_RESOURCE = re.compile(r"^/query/(\w+)")
+
+
+class Transport:
+    """
+    Pooled HTTP transport based on a requests.Session
+
+    Connections are kept alive and reused by all requests sent through the same
+    transport, responses are negotiated with gzip/deflate compression.
+
+    Any object implementing get(url, headers, timeout) and
+    post(url, data, headers, timeout) can be used as transport by the clients.
+    """
+
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_TIMEOUT = (10, 300)
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        """
+        :param pool_size: maximum number of connections kept open per host
+        :param timeout: default (connect, read) timeout in seconds
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(
+            {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, headers=None, timeout=None):
+        """
+        :param url: requested url
+        :param headers: additional request headers
+        :param timeout: timeout overriding the default timeout of the transport
+        :return: requests.Response
+        """
+        return self.session.get(url, headers=headers, timeout=timeout or self.timeout)
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        """
+        :param url: requested url
+        :param data: request body
+        :param headers: additional request headers
+        :param timeout: timeout overriding the default timeout of the transport
+        :return: requests.Response
+        """
+        return self.session.post(
+            url, data=data, headers=headers, timeout=timeout or self.timeout
+        )
+
+    def close(self):
+        """
+        Close all pooled connections
+        """
+        self.session.close()
+
+
+class RetryableStatus(requests.RequestException):
+    """
+    The endpoint answered with a server error, the request can be retried
+    """
+
+
+class EndpointStats:
+    """
+    Recently observed latencies and failures of one endpoint
+    """
+
+    def __init__(self, url, window=100):
+        """
+        :param url: url of the endpoint
+        :param window: number of latencies kept
+        """
+        self.url = url
+        self.latencies = deque(maxlen=window)
+        self.failures = 0
+        self.unavailable_until = 0.0
+        self._lock = threading.Lock()
+
+    def record_success(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+            self.failures = 0
+            self.unavailable_until = 0.0
+
+    def record_failure(self, backoff):
+        """
+        Excludes the endpoint from the first ranks for an exponentially
+        growing time after consecutive failures
+        """
+        with self._lock:
+            self.failures += 1
+            delay = backoff * 2 ** (self.failures - 1)
+            self.unavailable_until = time.monotonic() + delay
+
+    def percentile(self, percent):
+        """
+        :param percent: percentile between 0 and 100
+        :return: latency percentile in seconds or None without observations
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        index = max(0, int(math.ceil(percent / 100 * len(latencies))) - 1)
+        return latencies[index]
+
+    def rank(self):
+        """
+        :return: sort key, available endpoints with low median latency first,
+        endpoints without observations last
+        """
+        median = self.percentile(50)
+        return (
+            self.unavailable_until > time.monotonic(),
+            median if median is not None else float("inf"),
+        )
+
+
+class HedgedTransport(Transport):
+    """
+    Transport spreading requests over several equivalent Run Registry endpoints
+
+    Requests go to the endpoint with the lowest observed latency. When a GET
+    request failed or has not been answered within the hedge_percentile of the
+    latencies of that endpoint, a second request is sent to the next endpoint
+    and whichever answers first is used. POST requests register queries and
+    are sent to all endpoints. The query id answered first is returned, GET
+    requests of it are sent to every endpoint with the query id that endpoint
+    issued. Endpoints that did not register the query are not asked for it.
+
+    Failed attempts are retried with exponential backoff until the deadline
+    of the request is reached.
+
+    Example:
+    >>> from runregistry.client import RunRegistryClient
+    >>> transport = HedgedTransport(
+    ...     [RunRegistryClient.DEFAULT_URL, RunRegistryClient.ALTERNATIVE_URL]
+    ... )
+    >>> client = RunRegistryClient(transport=transport)
+    """
+
+    DEFAULT_DEADLINE = 300
+    DEFAULT_HEDGE_PERCENTILE = 95
+    DEFAULT_HEDGE_DELAY = 1.0
+    MIN_OBSERVATIONS = 10
+
+    def __init__(
+        self,
+        urls,
+        pool_size=Transport.DEFAULT_POOL_SIZE,
+        timeout=Transport.DEFAULT_TIMEOUT,
+        deadline=DEFAULT_DEADLINE,
+        retries=3,
+        backoff=0.5,
+        hedge_percentile=DEFAULT_HEDGE_PERCENTILE,
+        hedge_delay=DEFAULT_HEDGE_DELAY,
+    ):
+        """
+        :param urls: urls of the equivalent endpoints, in order of preference
+        :param pool_size: maximum number of connections kept open per host
+        :param timeout: default (connect, read) timeout of an attempt in seconds
+        :param deadline: maximum duration of a request including retries in seconds
+        :param retries: maximum number of retries of a request
+        :param backoff: delay before the first retry in seconds, doubled per retry
+        :param hedge_percentile: latency percentile after which a GET is hedged
+        :param hedge_delay: hedge delay used until enough latencies are observed
+        """
+        super().__init__(pool_size, timeout)
+        self.endpoints = [EndpointStats(url.rstrip("/")) for url in urls]
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.query_ids = LRUCache(maxsize=1024)  # query id -> {url: query id}
+        self._executor = ThreadPoolExecutor(max_workers=2 * pool_size)
+
+    def ranked_endpoints(self):
+        """
+        :return: endpoints ordered by availability and median latency
+        """
+        return sorted(self.endpoints, key=EndpointStats.rank)
+
+    def _hedge_delay(self, endpoint):
+        if len(endpoint.latencies) < self.MIN_OBSERVATIONS:
+            return self.hedge_delay
+        return endpoint.percentile(self.hedge_percentile)
+
+    def _resource(self, url):
+        for endpoint in self.endpoints:
+            if url.startswith(endpoint.url):
+                return url[len(endpoint.url) :]
+        return None
+
+    def _endpoint_resource(self, endpoint, resource):
+        """
+        :param endpoint: EndpointStats
+        :param resource: resource containing the query id returned by post
+        :return: resource containing the query id issued by the endpoint,
+        None if the endpoint did not register the query
+        """
+        match = QUERY_ID_RESOURCE.match(resource)
+        query_ids = self.query_ids.get(match.group(1)) if match else None
+        if query_ids is None:
+            return resource  # Not a query registered through this transport
+        query_id = query_ids.get(endpoint.url)
+        if query_id is None:
+            return None
+        return "/query/" + query_id + resource[match.end(1) :]
+
+    @staticmethod
+    def _record_query_id(query_ids, endpoint, future):
+        if future.exception() is None and future.result().status_code == 200:
+            query_ids[endpoint.url] = future.result().text
+
+    def _attempt(self, method, endpoint, resource, deadline, **kwargs):
+        """
+        Sends one request to one endpoint and records its latency
+
+        :return: requests.Response
+        """
+        timeout = kwargs.pop("timeout", None) or self.timeout
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+        else:
+            connect_timeout = read_timeout = timeout
+        remaining = max(deadline - time.monotonic(), 0.001)
+        timeout = (min(connect_timeout, remaining), min(read_timeout, remaining))
+        start = time.monotonic()
+        try:
+            response = method(endpoint.url + resource, timeout=timeout, **kwargs)
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                raise RetryableStatus(
+                    "{} answered {}".format(endpoint.url, response.status_code),
+                    response=response,
+                )
+        except (RetryableStatus,) + RETRYABLE_ERRORS:
+            endpoint.record_failure(self.backoff)
+            raise
+        endpoint.record_success(time.monotonic() - start)
+        return response
+
+    def _first_answer(self, futures):
+        """
+        :param futures: futures of concurrent attempts
+        :return: first successful response, a 404 only if no endpoint found
+        the resource
+        """
+        error = not_found = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except (RetryableStatus,) + RETRYABLE_ERRORS as e:
+                    error = e
+                    continue
+                if response.status_code != 404:
+                    return response
+                not_found = response
+        if not_found is not None:
+            return not_found
+        raise error
+
+    def _hedged(self, method, resource, deadline, **kwargs):
+        candidates = [
+            (endpoint, self._endpoint_resource(endpoint, resource))
+            for endpoint in self.ranked_endpoints()
+        ]
+        candidates = [candidate for candidate in candidates if candidate[1]]
+        if not candidates:
+            raise requests.ConnectionError(
+                "No endpoint registered the query of {}".format(resource)
+            )
+        futures = [
+            self._executor.submit(
+                self._attempt, method, *candidates[0], deadline, **kwargs
+            )
+        ]
+        done, _ = wait(futures, timeout=self._hedge_delay(candidates[0][0]))
+        failed = done and futures[0].exception() is not None
+        if len(candidates) > 1 and (not done or failed):
+            logger.debug("Hedging {} to {}".format(resource, candidates[1][0].url))
+            futures.append(
+                self._executor.submit(
+                    self._attempt, method, *candidates[1], deadline, **kwargs
+                )
+            )
+        return self._first_answer(futures)
+
+    def _broadcast(self, method, resource, deadline, **kwargs):
+        futures = [
+            self._executor.submit(
+                self._attempt, method, endpoint, resource, deadline, **kwargs
+            )
+            for endpoint in self.ranked_endpoints()
+        ]
+        return self._first_answer(futures)
+
+    def _register(self, method, resource, deadline, **kwargs):
+        """
+        Registers a query at all endpoints and records the query id issued by
+        every endpoint under the query id answered first
+        """
+        endpoints = self.ranked_endpoints()
+        futures = [
+            self._executor.submit(
+                self._attempt, method, endpoint, resource, deadline, **kwargs
+            )
+            for endpoint in endpoints
+        ]
+        response = self._first_answer(futures)
+        if response.status_code == 200:
+            query_ids = {}
+            self.query_ids.set(response.text, query_ids)
+            for endpoint, future in zip(endpoints, futures):
+                future.add_done_callback(
+                    partial(self._record_query_id, query_ids, endpoint)
+                )
+        return response
+
+    def _send(self, method, url, send, **kwargs):
+        """
+        Retries a request with exponential backoff until its deadline
+
+        :param method: session method
+        :param url: requested url
+        :param send: function sending one attempt to the endpoints
+        :return: requests.Response
+        """
+        resource = self._resource(url)
+        if resource is None:
+            return method(
+                url, timeout=kwargs.pop("timeout", None) or self.timeout, **kwargs
+            )
+
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.retries + 1):
+            try:
+                return send(method, resource, deadline, **kwargs)
+            except (RetryableStatus,) + RETRYABLE_ERRORS as e:
+                error = e
+            delay = self.backoff * 2 ** attempt
+            if attempt == self.retries or time.monotonic() + delay >= deadline:
+                break
+            logger.info("Retrying {} in {:.1f}s: {}".format(resource, delay, error))
+            time.sleep(delay)
+
+        if isinstance(error, RetryableStatus):
+            return error.response
+        raise requests.ConnectionError(
+            "No endpoint answered {} within the deadline: {}".format(resource, error)
+        )
+
+    def get(self, url, headers=None, timeout=None):
+        send = self._hedged if len(self.endpoints) > 1 else self._broadcast
+        return self._send(self.session.get, url, send, headers=headers, timeout=timeout)
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        send = self._register if self._resource(url) == "/query?" else self._broadcast
+        return self._send(
+            self.session.post,
+            url,
+            send,
+            data=data,
+            headers=headers,
+            timeout=timeout,
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        super().close()
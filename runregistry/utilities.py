@@ -1,3 +1,7 @@
+import re
+from collections import namedtuple
+from urllib.parse import urlencode
+
 media_type_dict = {
     "json": "application/json",
     "json2": "application/json2",
@@ -28,6 +32,67 @@ def list_to_dict(list_of_lists, keys):
     return [dict(zip(keys, item)) for item in list_of_lists]
 
 
+class RecordMixin:
+    """
+    Dictionary-like key access for the named tuples created by record_class
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return zip(self._fields, self)
+
+
+def record_class(name, keys):
+    """
+    Creates a compact record type for rows with the given keys.
+
+    Records are (immutable) named tuples and need only a fraction of the memory
+    of a dictionary per row. Fields can be accessed as attributes and as keys.
+
+    Example:
+    >>> Run = record_class("Run", ["run_number", "state"])
+    >>> run = Run._make([323423, "COMPLETED"])
+    >>> run.state, run["state"], run.get("shifter")
+    ('COMPLETED', 'COMPLETED', None)
+    >>> dict(run.items())
+    {'run_number': 323423, 'state': 'COMPLETED'}
+
+    :param name: name of the record type
+    :param keys: field names
+    :return: record type
+    """
+    return type(name, (RecordMixin, namedtuple(name, keys)), {"__slots__": ()})
+
+
+def list_to_records(list_of_lists, record_type):
+    """
+    Turns a list of lists into a list of records
+
+    :param list_of_lists: list of lists
+    :param record_type: type created by record_class
+    :return: list of records
+    """
+    return list(map(record_type._make, list_of_lists))
+
+
 def build_list_where_clause(item_list, attribute):
     items = list_as_comma_separated_string(item_list)
     return "{} in ({})".format(attribute, items)
@@ -37,3 +102,152 @@ def build_range_where_clause(range_from, range_to, attribute):
     return "{} >= '{}' and {} <= '{}'".format(
         attribute, range_from, attribute, range_to
     )
+
+
+def build_parameterized_range_where_clause(
+    range_from, range_to, attribute, name="run_number"
+):
+    """
+    Builds a range where clause with named number parameters instead of
+    literal values, so that the query is the same for every range
+
+    Example:
+    >>> build_parameterized_range_where_clause("323472", "323485", "r.run_number")
+    ('r.run_number >= :n__min_run_number and r.run_number <= :n__max_run_number', {'n__min_run_number': 323472, 'n__max_run_number': 323485})
+
+    :param range_from: first value
+    :param range_to: last value
+    :param attribute: attribute that has to be within the range
+    :param name: name of the parameters
+    :return: tuple of where clause and dictionary of parameter values
+    """
+    where_clause = "{0} >= :n__min_{1} and {0} <= :n__max_{1}".format(attribute, name)
+    parameters = {
+        "n__min_" + name: int(range_from),
+        "n__max_" + name: int(range_to),
+    }
+    return where_clause, parameters
+
+
+def query_parameters(query):
+    """
+    Example:
+    >>> query_parameters("select r.a from t r where r.b >= :n__min and r.c = ':d' and r.e = :name")
+    ['n__min', 'name']
+
+    :param query: SQL query string
+    :return: sorted names of the named parameters of the query
+    """
+    parts = re.split("('[^']*')", query)
+    return sorted(
+        {name for part in parts[::2] for name in re.findall(r"(?<![:\w]):(\w+)", part)}
+    )
+
+
+def encode_parameters(parameters):
+    """
+    Example:
+    >>> encode_parameters({"n__min_run_number": 323472, "s__dataset": "/Express/DQM"})
+    '?n__min_run_number=323472&s__dataset=%2FExpress%2FDQM'
+    >>> encode_parameters(None)
+    ''
+
+    :param parameters: dictionary of parameter names and values
+    :return: query string appended to the resources of a query
+    """
+    if not parameters:
+        return ""
+    return "?" + urlencode(sorted(parameters.items()))
+
+
+def compress_to_ranges(numbers, min_range_length=3):
+    """
+    Splits numbers into ranges of consecutive numbers and single numbers
+
+    Example:
+    >>> compress_to_ranges([9, 1, 2, 3, 4, 7, 10, 11, 4])
+    ([(1, 4), (9, 11)], [7])
+
+    :param numbers: list of integers
+    :param min_range_length: minimum amount of numbers compressed into a range
+    :return: tuple of list of (first, last) ranges and list of remaining numbers
+    """
+    ranges = []
+    singles = []
+    sorted_numbers = sorted(set(numbers))
+    start = 0
+    for index in range(1, len(sorted_numbers) + 1):
+        if (
+            index < len(sorted_numbers)
+            and sorted_numbers[index] == sorted_numbers[index - 1] + 1
+        ):
+            continue
+        if index - start >= min_range_length:
+            ranges.append((sorted_numbers[start], sorted_numbers[index - 1]))
+        else:
+            singles.extend(sorted_numbers[start:index])
+        start = index
+    return ranges, singles
+
+
+def build_chunked_where_clauses(
+    item_list, attribute, chunk_size=500, ranges_per_clause=50
+):
+    """
+    Builds where clauses of bounded size that together select all items.
+
+    Consecutive numbers are compressed into range predicates,
+    the remaining items are split into in-lists of at most chunk_size items.
+    Every where clause can be used in a separate query.
+
+    Example:
+    >>> build_chunked_where_clauses(["100", "101", "102", "105"], "r.run_number")
+    ["(r.run_number >= '100' and r.run_number <= '102' or r.run_number in ('105'))"]
+    >>> build_chunked_where_clauses([1, 5, 9], "r.run_number", chunk_size=2)
+    ["r.run_number in ('1', '5')", "r.run_number in ('9')"]
+
+    :param item_list: list of items, e.g. run numbers
+    :param attribute: attribute that has to be one of the items
+    :param chunk_size: maximum amount of items in an in-list
+    :param ranges_per_clause: maximum amount of range predicates in a where clause
+    :return: list of where clauses
+    """
+    try:
+        ranges, singles = compress_to_ranges([int(item) for item in item_list])
+    except (TypeError, ValueError):
+        ranges, singles = [], list(dict.fromkeys(item_list))
+
+    range_predicates = [
+        build_range_where_clause(first, last, attribute) for first, last in ranges
+    ]
+    in_predicates = [
+        build_list_where_clause(singles[index : index + chunk_size], attribute)
+        for index in range(0, len(singles), chunk_size)
+    ]
+
+    clauses = []
+    for index in range(0, len(range_predicates), ranges_per_clause):
+        predicates = range_predicates[index : index + ranges_per_clause]
+        if not clauses and in_predicates:
+            predicates.append(in_predicates.pop(0))
+        clauses.append("({})".format(" or ".join(predicates)))
+    return clauses + in_predicates
+
+
+def normalize_query(query):
+    """
+    Collapses whitespace outside of string literals, so that equivalent
+    SQL query strings can share the same query id
+
+    Example:
+    >>> normalize_query(" select  r.runnumber   from runreg_global.runs r  where r.x = 'a  b' ")
+    "select r.runnumber from runreg_global.runs r where r.x = 'a  b'"
+
+    :param query: SQL query string
+    :return: normalized SQL query string
+    """
+    parts = re.split("('[^']*')", query.strip())
+    return "".join(
+        part if index % 2 else re.sub(r"\s+", " ", part)
+        for index, part in enumerate(parts)
+    )
@@ -9,6 +9,11 @@ setup(
     author_email="peterstein@cern.ch",
     packages=["runregistry"],
     install_requires=["requests"],
+    extras_require={
+        "async": ["aiohttp"],
+        "columnar": ["numpy", "pandas"],
+        "fast": ["orjson"],
+    },
     zip_safe=False,
     entry_points={"console_scripts": ["runreg=runregistry.cli:main"]},
 )